@@ -7,13 +7,20 @@ from win32more.Microsoft.UI.Dispatching import DispatcherQueue
 from win32more.Windows.System import VirtualKey
 
 from modules.api import Api
-import threading
+from modules.async_api import AsyncApi, aio_session
+from modules.ws import connect_from_config, ws_msg_to_dict, ws_msg_chat_id
+from modules.stream import StreamAssembler
+from modules.sync import HistorySync
+from modules.media_scheduler import get_media_scheduler, VISIBLE, NEAR_VIEWPORT, PREFETCH
+from modules import thumbnail
+from modules.send_pipeline import get_send_pipeline, image_to_png_bytes
+from modules.boot import get_boot_fetches
+import asyncio
 import datetime
+from collections.abc import Mapping
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
 
 class ChatPage(Page):
-    _avatar_executor = ThreadPoolExecutor(max_workers=8)
 
     def __init__(self, app=None):
         super().__init__()
@@ -150,6 +157,9 @@ class ChatPage(Page):
         self._msg_ccc_handler = None
         self._is_user_interacting = False
         self._last_interaction_time = 0
+        self._ws_unsubscribe = None
+        self._stream_assembler = None
+        self._stream_items = {} # msg_id -> ListViewItem of a streaming bot reply
         import time
 
         def on_send_click(sender, args):
@@ -160,9 +170,9 @@ class ChatPage(Page):
             chat_type = self._current_chat.get("chatType") or self._current_chat.get("chat_type")
             text = self._msg_input.Text
             
-            def bg_send():
+            async def bg_send():
                 try:
-                    Api.SendMessageFromConfig(chat_id, int(chat_type), text)
+                    await AsyncApi.SendMessageFromConfig(chat_id, int(chat_type), text)
                     def clear_ui():
                         self._msg_input.Text = ""
                         self._load_messages(self._current_chat)
@@ -170,7 +180,7 @@ class ChatPage(Page):
                 except Exception as e:
                     print(f"[ChatPage] send failed: {e}")
             
-            threading.Thread(target=bg_send, daemon=True).start()
+            aio_session.submit(bg_send())
 
         self._send_btn.add_Click(on_send_click)
 
@@ -201,17 +211,19 @@ class ChatPage(Page):
                 self._is_loading_more = False
 
                 # Bump token to invalidate in-flight loads from previous chat
+                get_media_scheduler().cancel(self._chat_media_group())
                 self._active_load_token += 1
                 token = self._active_load_token
 
                 self._msg_list.Items.Clear()
+                self._stream_items.clear()
                 try:
                     placeholder = XamlReader.Load('<ListViewItem xmlns="http://schemas.microsoft.com/winfx/2006/xaml/presentation"><TextBlock Text="加载中..." Opacity="0.6" Margin="0,8" /></ListViewItem>').as_(ListViewItem)
                     self._msg_list.Items.Append(placeholder)
                 except:
                     pass
 
-                self._load_messages(conv_data, load_token=token)
+                self._load_messages(conv_data, load_token=token, from_store=True)
             except Exception as e:
                 print(f"[ChatPage] selection changed error: {e}")
 
@@ -260,23 +272,23 @@ class ChatPage(Page):
         def on_window_pasting(sender, args):
             try:
                 from PIL import ImageGrab
-                import io
                 
                 img = ImageGrab.grabclipboard()
                 if img:
                     from PIL import Image
+                    # 编码/读文件放到后台，与确认对话框同时进行，不阻塞 UI 线程
                     img_bytes = None
                     if isinstance(img, Image.Image):
-                        buf = io.BytesIO()
-                        img.save(buf, format="PNG")
-                        img_bytes = buf.getvalue()
+                        img_bytes = Api._background_executor.submit(image_to_png_bytes, img)
                     elif isinstance(img, list) and len(img) > 0:
                         file_path = img[0]
                         if file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')):
-                            with open(file_path, "rb") as f:
-                                img_bytes = f.read()
+                            img_bytes = Api._background_executor.submit(Path(file_path).read_bytes)
                     
                     if img_bytes:
+                        # 用户确认期间提前准备好上传凭证
+                        Api._background_executor.submit(Api.PrewarmUploadToken)
+
                         def show_confirm():
                             try:
                                 dialog = ContentDialog()
@@ -293,7 +305,7 @@ class ChatPage(Page):
                                         if async_status == AsyncStatus.Completed:
                                             res = async_op.GetResults()
                                             if res == ContentDialogResult.Primary:
-                                                self._upload_and_send_image(img_bytes)
+                                                self._upload_and_send_image(img_bytes.result)
                                     except Exception as ce:
                                         print(f"[ChatPage] Dialog completed error: {ce}")
                                 
@@ -355,6 +367,15 @@ class ChatPage(Page):
 
         def _on_unloaded(sender, args):
             self._is_active = False
+            get_media_scheduler().cancel(self._chat_media_group())
+            get_media_scheduler().cancel("conversations")
+            if self._ws_unsubscribe:
+                self._ws_unsubscribe()
+                self._ws_unsubscribe = None
+            if self._stream_assembler:
+                assembler = self._stream_assembler
+                self._stream_assembler = None
+                aio_session.loop.call_soon_threadsafe(assembler.detach)
             print("[ChatPage] unloaded")
 
         self.Unloaded += _on_unloaded
@@ -371,33 +392,123 @@ class ChatPage(Page):
 
         self.Content = root
         self._load_conversations()
+        self._connect_ws()
+
+    def _connect_ws(self):
+        async def bg_task():
+            try:
+                client = await connect_from_config()
+            except Exception as e:
+                print(f"[ChatPage] ws connect failed: {e}")
+                return
+            if not self._is_active:
+                return
+            self._ws_unsubscribe = client.subscribe(
+                "push_message", lambda event: self._on_ws_push(event, client.user_id)
+            )
+            self._stream_assembler = StreamAssembler(self._on_stream_update)
+            self._stream_assembler.attach(client)
+
+        aio_session.submit(bg_task())
+
+    def _on_ws_push(self, event, user_id):
+        m = ws_msg_to_dict(event.msg.data.msg, user_id)
+        # 自己发送的消息在发送成功后会整体刷新，这里不重复插入
+        if m.get("direction") == "right":
+            return
+        chat_id = ws_msg_chat_id(m, user_id)
+
+        def update_ui():
+            if not self._is_active or not self._current_chat:
+                return
+            current_id = self._current_chat.get("chatId") or self._current_chat.get("chat_id")
+            if current_id != chat_id:
+                return
+            stream_lvi = self._stream_items.pop(m.get("msgId"), None)
+            if stream_lvi is not None:
+                # 流式回复已经显示，只需替换为最终文本
+                self._set_msg_text(stream_lvi, (m.get("content") or {}).get("text") or "")
+                return
+            self._render_single_msg(m)
+            count = self._msg_list.Items.Size
+            if count > 0:
+                self._msg_list.ScrollIntoView(self._msg_list.Items.GetAt(count - 1))
 
-    def _upload_and_send_image(self, img_bytes):
+        self._dispatcher.TryEnqueue(update_ui)
+
+    def _on_stream_update(self, msg_id, chat_id, text):
+        def update_ui():
+            if not self._is_active or not self._current_chat:
+                return
+            current_id = self._current_chat.get("chatId") or self._current_chat.get("chat_id")
+            if current_id != chat_id:
+                return
+            lvi = self._stream_items.get(msg_id)
+            if lvi is not None:
+                self._set_msg_text(lvi, text)
+                return
+            lvi = self._render_single_msg({"msgId": msg_id, "content": {"text": text}})
+            if lvi is not None:
+                self._stream_items[msg_id] = lvi
+                self._msg_list.ScrollIntoView(lvi)
+
+        self._dispatcher.TryEnqueue(update_ui)
+
+    def _set_msg_text(self, lvi, text):
+        try:
+            lvi.as_(FrameworkElement).FindName("MsgText").as_(TextBlock).Text = text
+        except Exception as e:
+            print(f"[ChatPage] update msg text error: {e}")
+
+    def _set_image_path(self, target_img, path):
+        if not self._is_active: return
+        try:
+            file_uri = Path(path).absolute().as_uri()
+            img_xaml = f"<Image xmlns=\"http://schemas.microsoft.com/winfx/2006/xaml/presentation\"><Image.Source><BitmapImage UriSource=\"{file_uri}\" /></Image.Source></Image>"
+            target_img.Source = XamlReader.Load(img_xaml).as_(Image).Source
+        except: pass
+
+    def _load_image_into(self, target_img, url, priority=VISIBLE, group=None):
+        """内存缓存命中时直接在 UI 线程设置图片，否则交给媒体调度器加载后回到 UI 线程设置"""
+        path = Api.PeekCachedImage(url)
+        if path:
+            self._set_image_path(target_img, path)
+            return
+
+        def on_done(future):
+            if future.cancelled() or not self._is_active:
+                return
+            path = future.result()
+            if path:
+                self._dispatcher.TryEnqueue(lambda: self._set_image_path(target_img, path))
+        get_media_scheduler().submit(url, priority, group).add_done_callback(on_done)
+
+    def _chat_media_group(self, token=None):
+        return ("chat", self._active_load_token if token is None else token)
+
+    def _upload_and_send_image(self, img_source):
+        """img_source 为图片数据或返回图片数据的函数；多张图片并行上传，按粘贴顺序发送"""
         if not self._current_chat:
             return
             
-        chat_id = self._current_chat.get("chatId") or self._current_chat.get("chat_id")
-        chat_type = self._current_chat.get("chatType") or self._current_chat.get("chat_type")
+        conv_data = self._current_chat
+        chat_id = conv_data.get("chatId") or conv_data.get("chat_id")
+        chat_type = conv_data.get("chatType") or conv_data.get("chat_type")
         
-        def bg_task():
-            try:
-                print(f"[ChatPage] Uploading image ({len(img_bytes)} bytes)...")
-                # Upload to Qiniu via our new Api method
-                img_meta = Api.UploadImage(None, img_bytes, "pasted_image.png")
-                
-                print(f"[ChatPage] Upload success, sending msg...")
-                # Send the Protobuf message
-                Api.SendImageMessageFromConfig(chat_id, int(chat_type), img_meta)
-                
-                def on_done():
-                    self._load_messages(self._current_chat)
-                self._dispatcher.TryEnqueue(on_done)
-            except Exception as e:
-                print(f"[ChatPage] Image upload/send failed: {e}")
-                
-        threading.Thread(target=bg_task, daemon=True).start()
+        print(f"[ChatPage] Queue image for {chat_id}")
+        future = get_send_pipeline().enqueue(chat_id, int(chat_type), img_source)
 
-    def _load_messages(self, conv_data, is_load_more=False, load_token=None):
+        def on_sent(f):
+            if f.exception() is not None:
+                print(f"[ChatPage] Image upload/send failed: {f.exception()}")
+                return
+            def on_done():
+                if self._is_active and self._current_chat is conv_data:
+                    self._load_messages(conv_data)
+            self._dispatcher.TryEnqueue(on_done)
+        future.add_done_callback(on_sent)
+
+    def _load_messages(self, conv_data, is_load_more=False, load_token=None, from_store=False):
         chat_id = conv_data.get("chatId") or conv_data.get("chat_id")
         chat_type = conv_data.get("chatType") or conv_data.get("chat_type")
         
@@ -423,10 +534,22 @@ class ChatPage(Page):
         if load_token is None:
             load_token = self._active_load_token
 
-        def bg_task():
+        if from_store and not is_load_more:
+            # 先用本地缓存渲染，服务器结果返回后整体替换
+            cached = Api.CachedMessageList(chat_id).get("msg") or []
+            if cached:
+                self._msg_list.Items.Clear()
+                for m in reversed(cached):
+                    self._render_single_msg(m)
+                self._oldest_msg_id = cached[-1].get("msgId") or cached[-1].get("msg_id")
+                count = self._msg_list.Items.Size
+                if count > 0:
+                    self._msg_list.ScrollIntoView(self._msg_list.Items.GetAt(count - 1))
+
+        async def bg_task():
             try:
                 print(f"[ChatPage] Fetching: load_more={is_load_more}, msg_id='{msg_id}'")
-                data = Api.MessageListFromConfig(chat_id=chat_id, chat_type=int(chat_type), msg_id=msg_id)
+                data = await AsyncApi.MessageListFromConfig(chat_id=chat_id, chat_type=int(chat_type), msg_id=msg_id)
                 msgs = data.get("msg") or []
                 
                 def update_ui():
@@ -471,13 +594,17 @@ class ChatPage(Page):
                         self._is_loading_more = False
                 
                 self._dispatcher.TryEnqueue(update_ui)
+
+                if not is_load_more and msgs:
+                    # 后台补齐本地缓存中的历史空洞，之后翻页可直接读本地
+                    aio_session.submit(HistorySync().sync(chat_id, int(chat_type)))
             except Exception as e:
                 print(f"[ChatPage] msg load failed: {e}")
                 def reset_loading():
                     self._is_loading_more = False
                 self._dispatcher.TryEnqueue(reset_loading)
 
-        threading.Thread(target=bg_task, daemon=True).start()
+        aio_session.submit(bg_task())
 
     def _render_single_msg(self, m, prepend=False):
         try:
@@ -522,7 +649,7 @@ class ChatPage(Page):
             tags_list = sender.get("tag")
             if tags_list and isinstance(tags_list, list):
                 for tag_data in tags_list:
-                    if not isinstance(tag_data, dict): continue
+                    if not isinstance(tag_data, Mapping): continue
                     tag_text = tag_data.get("text")
                     tag_color_str = tag_data.get("color")
                     if not tag_text: continue
@@ -570,19 +697,15 @@ class ChatPage(Page):
                 img_control.Stretch = win32more.Microsoft.UI.Xaml.Media.Stretch.Uniform
                 bubble_border.Child = img_control.as_(FrameworkElement)
                 
-                def load_msg_image():
-                    thumb_img = image_url + ("&" if "?" in image_url else "?") + "imageView2/2/w/400"
-                    path = Api.GetCachedImage(thumb_img)
-                    if path and self._is_active:
-                        file_uri = Path(path).absolute().as_uri()
-                        def set_msg_img():
-                            if not self._is_active: return
-                            try:
-                                img_source_xaml = f"<BitmapImage xmlns=\"http://schemas.microsoft.com/winfx/2006/xaml/presentation\" UriSource=\"{file_uri}\" />"
-                                img_control.Source = XamlReader.Load(img_source_xaml).as_(Image).Source
-                            except: pass
-                        self._dispatcher.TryEnqueue(set_msg_img)
-                self._avatar_executor.submit(load_msg_image)
+                thumb_img = thumbnail.message_image_url(image_url, content)
+                self._load_image_into(img_control, thumb_img, NEAR_VIEWPORT if prepend else VISIBLE, self._chat_media_group())
+
+                # 缩略图只按显示尺寸请求，点击时再加载原图
+                original_img = thumbnail.original_url(image_url)
+                if original_img != thumb_img:
+                    def on_image_tapped(sender_obj, args):
+                        self._load_image_into(img_control, original_img, VISIBLE, self._chat_media_group())
+                    img_control.add_Tapped(on_image_tapped)
             else:
                 text_tb.Text = text
 
@@ -642,27 +765,24 @@ class ChatPage(Page):
                 self._msg_list.Items.Append(lvi)
             
             if avatar_url:
-                thumb_url = avatar_url + ("&" if "?" in avatar_url else "?") + "imageView2/2/w/60/h/60"
-                def load_avatar_task():
-                    path = Api.GetCachedImage(thumb_url)
-                    if path and self._is_active:
-                        file_uri = Path(path).absolute().as_uri()
-                        def set_img():
-                            if not self._is_active: return
-                            try:
-                                img_xaml = f"<Image xmlns=\"http://schemas.microsoft.com/winfx/2006/xaml/presentation\"><Image.Source><BitmapImage UriSource=\"{file_uri}\" /></Image.Source></Image>"
-                                avatar_img.Source = XamlReader.Load(img_xaml).as_(Image).Source
-                            except: pass
-                        self._dispatcher.TryEnqueue(set_img)
-                self._avatar_executor.submit(load_avatar_task)
+                thumb_url = thumbnail.avatar_url(avatar_url, thumbnail.MESSAGE_AVATAR)
+                self._load_image_into(avatar_img, thumb_url, NEAR_VIEWPORT if prepend else VISIBLE, self._chat_media_group())
+            return lvi
         except Exception as e:
             print(f"[ChatPage] render msg error: {e}")
 
     def _load_conversations(self):
-        def bg_task():
+        # 首次加载使用启动时已发出的请求
+        boot = get_boot_fetches()
+        prefetched = boot.take_conversations() if boot is not None else None
+
+        async def bg_task():
             try:
                 print("[ChatPage] loading conversations in bg...")
-                data = Api.ConversationListFromConfig()
+                if prefetched is not None:
+                    data = await asyncio.wrap_future(prefetched)
+                else:
+                    data = await AsyncApi.ConversationListFromConfig()
                 items = data.get("data") or []
                 def update_ui():
                     self._conversations = items
@@ -672,7 +792,7 @@ class ChatPage(Page):
             except Exception as e:
                 print(f"[ChatPage] bg conversation load failed: {e}")
 
-        threading.Thread(target=bg_task, daemon=True).start()
+        aio_session.submit(bg_task())
 
     def _apply_filter(self, query: str):
         q = (query or "").strip().lower()
@@ -682,6 +802,8 @@ class ChatPage(Page):
         except Exception:
             pass
 
+        get_media_scheduler().cancel("conversations")
+        shown = 0
         for conv in (self._conversations or []):
             name = (conv.get("name") or "").strip()
             content = (conv.get("chatContent") or conv.get("chat_content") or "").strip()
@@ -719,20 +841,9 @@ class ChatPage(Page):
             except: pass
 
             self._list_view.Items.Append(lvi)
+            shown += 1
 
             if avatar_url:
-                thumb = avatar_url + ("&" if "?" in avatar_url else "?") + "imageView2/2/w/80/h/80"
-                def load_avatar_bg(url, target_img):
-                    try:
-                        local_path = Api.GetCachedImage(url)
-                        if local_path and self._is_active:
-                            file_uri = Path(local_path).absolute().as_uri()
-                            def update_avatar_ui():
-                                if not self._is_active: return
-                                try:
-                                    img_xaml = f"<Image xmlns=\"http://schemas.microsoft.com/winfx/2006/xaml/presentation\" Width=\"36\" Height=\"36\" Stretch=\"UniformToFill\"><Image.Source><BitmapImage UriSource=\"{file_uri}\" /></Image.Source></Image>"
-                                    target_img.Source = XamlReader.Load(img_xaml).as_(Image).Source
-                                except: pass
-                            self._dispatcher.TryEnqueue(update_avatar_ui)
-                    except: pass
-                self._avatar_executor.submit(load_avatar_bg, thumb, avatar_img)
+                thumb = thumbnail.avatar_url(avatar_url, thumbnail.CONVERSATION_AVATAR)
+                # 列表首屏以外的头像作为预取，排在消息图片之后
+                self._load_image_into(avatar_img, thumb, VISIBLE if shown <= 20 else PREFETCH, "conversations")
@@ -6,9 +6,9 @@ from win32more.Microsoft.UI.Xaml import Thickness, HorizontalAlignment, Vertical
 from win32more.Microsoft.UI.Xaml.Media import SolidColorBrush
 from win32more.Windows.UI import Colors
 from win32more.winui3 import xaml_typename
-from modules.api import Api
+from win32more.Microsoft.UI.Dispatching import DispatcherQueue
+from modules.boot import reset_boot_fetches, start_boot_fetches
 from modules.config import Config
-from chat import ChatPage
 config = Config()
 
 class HomePage(Page):  
@@ -73,15 +73,15 @@ class HomePage(Page):
         community_item = fe.FindName("CommunityItem").as_(NavigationViewItem)
         discover_item = fe.FindName("DiscoverItem").as_(NavigationViewItem)
 
-        try:
-            print("[HomePage] loading avatar...")
-            avatar_url = Api.AvatarUrlFromConfig()
-            print(f"[HomePage] avatar_url: {avatar_url}")
-            avatar_path = Api.DownloadAvatarToCache(avatar_url)
-            print(f"[HomePage] avatar_path: {avatar_path}")
-            if avatar_path:
-                file_uri = Path(avatar_path).absolute().as_uri()
-                avatar_xaml = f"""
+        # 用户信息、头像、会话列表在后台并行请求，窗口先显示，头像下载完成后再填充
+        print("[HomePage] loading avatar...")
+        dispatcher = DispatcherQueue.GetForCurrentThread()
+
+        def show_avatar(avatar_path):
+            if not avatar_path:
+                return
+            file_uri = Path(avatar_path).absolute().as_uri()
+            avatar_xaml = f"""
 <Image xmlns=\"http://schemas.microsoft.com/winfx/2006/xaml/presentation\"
        xmlns:x=\"http://schemas.microsoft.com/winfx/2006/xaml\"
        Width=\"48\" Height=\"48\" Stretch=\"Uniform\">
@@ -91,17 +91,33 @@ class HomePage(Page):
 </Image>
 """
 
-                avatar_button.Content = XamlReader.Load(avatar_xaml)
+            avatar_button.Content = XamlReader.Load(avatar_xaml)
 
-        except Exception:
-            import traceback
-
-            print("[HomePage] avatar load failed")
-            traceback.print_exc()
+        def show_avatar_failed():
             avatar_button.Background = SolidColorBrush.CreateInstanceWithColor(Colors.LightGray)
 
+        def on_avatar_done(future):
+            try:
+                avatar_path = future.result()
+                print(f"[HomePage] avatar_path: {avatar_path}")
+                dispatcher.TryEnqueue(lambda: show_avatar(avatar_path))
+            except Exception:
+                import traceback
+
+                print("[HomePage] avatar load failed")
+                traceback.print_exc()
+                dispatcher.TryEnqueue(show_avatar_failed)
+
+        start_boot_fetches().avatar.add_done_callback(on_avatar_done)
+
         def on_exit_login(params, params2):
             config.set("token", "")
+            reset_boot_fetches()
+            from modules.ws import disconnect_shared
+            disconnect_shared()
+            # 关闭本账号的消息缓存，下一个登录的账号使用自己的数据库
+            from modules.store import close_message_store
+            close_message_store()
             self.app.main_frame.Navigate(xaml_typename("App.LoginPage", TypeKind.Custom))
 
         def show_home():
@@ -191,6 +207,7 @@ class HomePage(Page):
                 return
 
             if tag == "chat":
+                from chat import ChatPage
                 self._content_host.Children.Clear()
                 self._content_host.Children.Append(ChatPage(self.app))
             elif tag == "contacts":
@@ -4,7 +4,6 @@ from win32more.Microsoft.UI.Xaml.Controls import (
 )  
 from win32more.Microsoft.UI.Xaml.Media import SolidColorBrush  
 from win32more.Windows.UI import Colors  
-from modules.api import Api
 from modules.config import Config
 config = Config()
 class LoginPage(Page):  
@@ -141,6 +140,7 @@ class LoginPage(Page):
         self.status_message.Foreground = SolidColorBrush.CreateInstanceWithColor(Colors.Blue)  
           
         try:  
+            from modules.api import Api
             response = Api.EmailLogin(email, password)  
               
             if response.status_code == 200:  
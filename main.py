@@ -3,10 +3,9 @@ from win32more.Microsoft.UI.Xaml.Controls import Frame
 from win32more.Windows.Graphics import SizeInt32  
 from win32more.Windows.UI.Xaml.Interop import TypeKind  
 from win32more.winui3 import XamlApplication, XamlType, xaml_typename  
+import threading
  
 from modules.config import Config  
-from login import LoginPage
-from home import HomePage
 config = Config()  
   
 class LoginApp(XamlApplication):  
@@ -26,15 +25,21 @@ class LoginApp(XamlApplication):
         if not token:
             self.main_frame.Navigate(xaml_typename("App.LoginPage", TypeKind.Custom))  
         else:
+            # 首屏数据的请求（以及 httpx 等模块的导入）与页面构造同时进行
+            from modules.boot import start_boot_fetches
+            threading.Thread(target=start_boot_fetches, name="BootFetch", daemon=True).start()
             self.main_frame.Navigate(xaml_typename("App.HomePage", TypeKind.Custom))
           
         self.window.Activate()  
       
     def GetXamlTypeByFullName(self, typename):  
+        # 页面模块在首次导航时才导入
         if typename == "App.LoginPage":  
+            from login import LoginPage
             return XamlType("App.LoginPage", TypeKind.Custom,   
                           activate_instance=lambda: LoginPage(self))  
         elif typename == "App.HomePage":  
+            from home import HomePage
             return XamlType("App.HomePage", TypeKind.Custom,  
                           activate_instance=lambda: HomePage(self))  
         return super().GetXamlTypeByFullName(typename)  
@@ -5,17 +5,23 @@ import uuid
 import hashlib
 import mimetypes
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
 
-import httpx
-from PIL import Image
+from modules.proto_view import wrap
 from modules.req import HTTPThreadingClient
 
 session = HTTPThreadingClient()
 
 class Api:
-    _avatar_executor = ThreadPoolExecutor(max_workers=8)
+    _background_executor = ThreadPoolExecutor(max_workers=8)
+    _media_headers = {
+        "Referer": "https://myapp.jwznb.com",
+        "User-Agent": "yhchat-winui3-app",
+    }
+    # 正在下载的图片 url -> concurrent.futures.Future，与 AsyncApi 共用，同一 url 的并发请求只下载一次
+    _image_inflight = {}
+    _image_inflight_lock = threading.Lock()
 
     @staticmethod
     def EmailLogin(email: str, password: str, deviceId: str = "yunhu-device-id-winui3-app", platform: str = "windows"):
@@ -34,14 +40,14 @@ class Api:
         def error_callback(error):
             response_result["error"] = error
         
-        session.post(
+        task_id = session.post(
             "https://chat-go.jwzhd.com/v1/user/email-login", 
             json=json_data,
             callback=success_callback,
             error_callback=error_callback
         )
         
-        session.wait_completion()
+        session.wait(task_id)
         
         if response_result["error"]:
             print(f"[Api.EmailLogin] request error: {response_result['error']}")
@@ -66,20 +72,23 @@ class Api:
         def error_callback(error):
             response_result["error"] = error
 
-        session.get(
+        task_id = session.get(
             "https://chat-go.jwzhd.com/v1/user/info",
             headers=headers,
             callback=success_callback,
             error_callback=error_callback,
         )
 
-        session.wait_completion()
+        session.wait(task_id)
 
         if response_result["error"]:
             print(f"[Api.UserInfo] request error: {response_result['error']}")
             raise Exception(f"请求失败: {response_result['error']}")
 
-        resp = response_result["response"]
+        return Api._parse_user_info(response_result["response"])
+
+    @staticmethod
+    def _parse_user_info(resp):
         if resp is None:
             print("[Api.UserInfo] empty response")
             raise Exception("请求失败: 空响应")
@@ -91,8 +100,8 @@ class Api:
         user_pb2, json_format = Api._import_user_pb2()
         msg = user_pb2.info()
         msg.ParseFromString(resp.content)
-        data = json_format.MessageToDict(msg)
-        avatar = data.get("data", {}).get("avatarUrl") or data.get("data", {}).get("avatar_url")
+        data = wrap(msg)
+        avatar = msg.data.avatar_url
         print(f"[Api.UserInfo] parsed ok, has avatar_url={bool(avatar)}")
         return data
 
@@ -126,34 +135,10 @@ class Api:
         if not avatar_url:
             return ""
 
-        from modules.config import CONFIG_FILE
-
-        cache_dir = CONFIG_FILE.parent / "cache"
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        target = cache_dir / "avatar"
-
-        headers = {
-            "Referer": "https://myapp.jwznb.com",
-            "User-Agent": "yhchat-winui3-app",
-        }
-
-        with httpx.Client(timeout=30.0) as client:
-            resp = client.get(avatar_url, headers=headers)
-            resp.raise_for_status()
-
-        content_type = (resp.headers.get("content-type") or "").lower()
-        ext = ".img"
-        if "png" in content_type:
-            ext = ".png"
-        elif "jpeg" in content_type or "jpg" in content_type:
-            ext = ".jpg"
-        elif "webp" in content_type:
-            ext = ".webp"
-
-        file_path = target.with_suffix(ext)
-        file_path.write_bytes(resp.content)
+        # 头像地址可能不变而内容更新，每次都向服务器确认；未变化时只花一次 304
+        file_path = Api.GetCachedImage(avatar_url, max_age=0)
         print(f"[Api.DownloadAvatarToCache] saved: {file_path}")
-        return str(file_path)
+        return file_path
 
     @staticmethod
     def _import_conversation_pb2():
@@ -172,7 +157,7 @@ class Api:
         def error_callback(error):
             response_result["error"] = error
 
-        session.post(
+        task_id = session.post(
             "https://chat-go.jwzhd.com/v1/conversation/list",
             headers=headers,
             data=b"",
@@ -180,13 +165,16 @@ class Api:
             error_callback=error_callback,
         )
 
-        session.wait_completion()
+        session.wait(task_id)
 
         if response_result["error"]:
             print(f"[Api.ConversationList] request error: {response_result['error']}")
             raise Exception(f"请求失败: {response_result['error']}")
 
-        resp = response_result["response"]
+        return Api._parse_conversation_list(response_result["response"])
+
+    @staticmethod
+    def _parse_conversation_list(resp):
         if resp is None:
             print("[Api.ConversationList] empty response")
             raise Exception("请求失败: 空响应")
@@ -206,12 +194,11 @@ class Api:
         conversation_pb2, json_format = Api._import_conversation_pb2()
         msg = conversation_pb2.ConversationList()
         msg.ParseFromString(resp.content)
-        data = json_format.MessageToDict(msg)
-        status = data.get("status") or {}
+        data = wrap(msg)
         print(
             "[Api.ConversationList] parsed ok, "
-            f"status.code={status.get('code')} status.msg={status.get('msg')} "
-            f"total={data.get('total')} count={len(data.get('data', []) or [])}"
+            f"status.code={msg.status.code} status.msg={msg.status.msg} "
+            f"total={msg.total} count={len(msg.data)}"
         )
         return data
 
@@ -230,8 +217,7 @@ class Api:
         return msg_pb2, json_format
 
     @staticmethod
-    def MessageList(token: str, chat_id: str, chat_type: int, msg_count: int = 50, msg_id: str = ""):
-        headers = {"token": token}
+    def _build_message_list_req(chat_id: str, chat_type: int, msg_count: int = 50, msg_id: str = "") -> bytes:
         msg_pb2, json_format = Api._import_msg_pb2()
         req = msg_pb2.list_message_send()
         req.chat_id = chat_id
@@ -239,8 +225,16 @@ class Api:
         req.msg_count = msg_count
         if msg_id:
             req.msg_id = msg_id
-            
-        data_bytes = req.SerializeToString()
+        return req.SerializeToString()
+
+    @staticmethod
+    def MessageList(token: str, chat_id: str, chat_type: int, msg_count: int = 50, msg_id: str = ""):
+        cached = Api._cached_message_page(token, chat_id, msg_count, msg_id)
+        if cached is not None:
+            return cached
+
+        headers = {"token": token}
+        data_bytes = Api._build_message_list_req(chat_id, chat_type, msg_count, msg_id)
         response_result = {"response": None, "error": None}
 
         def success_callback(response):
@@ -249,7 +243,7 @@ class Api:
         def error_callback(error):
             response_result["error"] = error
 
-        session.post(
+        task_id = session.post(
             "https://chat-go.jwzhd.com/v1/msg/list-message",
             headers=headers,
             data=data_bytes,
@@ -257,12 +251,52 @@ class Api:
             error_callback=error_callback,
         )
 
-        session.wait_completion()
+        session.wait(task_id)
 
         if response_result["error"]:
             raise Exception(f"请求失败: {response_result['error']}")
 
-        resp = response_result["response"]
+        data = Api._parse_message_list(response_result["response"])
+        Api._store_message_page(token, chat_id, data)
+        return data
+
+    @staticmethod
+    def _cached_message_page(token: str, chat_id: str, msg_count: int, msg_id: str):
+        """翻页时若本地已有连续的更早消息，直接返回，不再请求服务器"""
+        if not msg_id:
+            return None
+        try:
+            from modules.store import get_message_store
+            msgs = get_message_store(token).before(chat_id, msg_id, msg_count)
+        except Exception as e:
+            print(f"[Api.MessageList] store read failed: {e}")
+            return None
+        if msgs is None:
+            return None
+        print(f"[Api.MessageList] served from store, count={len(msgs)}")
+        return {"status": {"code": 1}, "msg": msgs}
+
+    @staticmethod
+    def _store_message_page(token: str, chat_id: str, data: dict):
+        try:
+            from modules.store import get_message_store
+            get_message_store(token).put_messages(chat_id, data.get("msg") or [])
+        except Exception as e:
+            print(f"[Api.MessageList] store write failed: {e}")
+
+    @staticmethod
+    def CachedMessageList(chat_id: str, msg_count: int = 50):
+        """本地缓存中最新的消息，格式同 MessageList，可在请求服务器前先渲染"""
+        try:
+            from modules.store import get_message_store
+            msgs = get_message_store().latest(chat_id, msg_count)
+        except Exception as e:
+            print(f"[Api.CachedMessageList] store read failed: {e}")
+            msgs = []
+        return {"status": {"code": 1}, "msg": msgs}
+
+    @staticmethod
+    def _parse_message_list(resp):
         if resp is None:
             raise Exception("请求失败: 空响应")
 
@@ -272,8 +306,8 @@ class Api:
         msg_pb2, json_format = Api._import_msg_pb2()
         msg_resp = msg_pb2.list_message()
         msg_resp.ParseFromString(resp.content)
-        data = json_format.MessageToDict(msg_resp)
-        print(f"[Api.MessageList] parsed ok, count={len(data.get('msg', []) or [])}")
+        data = wrap(msg_resp)
+        print(f"[Api.MessageList] parsed ok, count={len(msg_resp.msg)}")
         return data
 
     @staticmethod
@@ -285,8 +319,71 @@ class Api:
         return Api.MessageList(token, chat_id, chat_type, msg_count, msg_id)
 
     @staticmethod
-    def SendMessage(token: str, chat_id: str, chat_type: int, text: str):
+    def SearchMessages(query: str, chat_id: str = "", limit: int = 50):
+        """在当前账号本地缓存的消息中全文检索，返回按相关度排序的 [{chat_id, msg_id, score, msg}]"""
+        try:
+            from modules.store import get_message_store
+            store = get_message_store()
+        except Exception as e:
+            print(f"[Api.SearchMessages] store unavailable: {e}")
+            return []
+        return store.search(query, chat_id or None, limit)
+
+    @staticmethod
+    def _build_message_list_by_seq_req(chat_id: str, chat_type: int, msg_seq: int) -> bytes:
+        msg_pb2, json_format = Api._import_msg_pb2()
+        req = msg_pb2.list_message_by_seq_send()
+        req.chat_id = chat_id
+        req.chat_type = chat_type
+        req.msg_seq = msg_seq
+        return req.SerializeToString()
+
+    @staticmethod
+    def MessageListBySeq(token: str, chat_id: str, chat_type: int, msg_seq: int):
         headers = {"token": token}
+        data_bytes = Api._build_message_list_by_seq_req(chat_id, chat_type, msg_seq)
+        response_result = {"response": None, "error": None}
+
+        def success_callback(response):
+            response_result["response"] = response
+
+        def error_callback(error):
+            response_result["error"] = error
+
+        task_id = session.post(
+            "https://chat-go.jwzhd.com/v1/msg/list-message-by-seq",
+            headers=headers,
+            data=data_bytes,
+            callback=success_callback,
+            error_callback=error_callback,
+        )
+
+        session.wait(task_id)
+
+        if response_result["error"]:
+            raise Exception(f"请求失败: {response_result['error']}")
+
+        data = Api._parse_message_list_by_seq(response_result["response"])
+        Api._store_message_page(token, chat_id, data)
+        return data
+
+    @staticmethod
+    def _parse_message_list_by_seq(resp):
+        if resp is None:
+            raise Exception("请求失败: 空响应")
+
+        if resp.status_code != 200:
+            raise Exception(f"网络请求失败: {resp.status_code}")
+
+        msg_pb2, json_format = Api._import_msg_pb2()
+        msg_resp = msg_pb2.list_message_by_seq()
+        msg_resp.ParseFromString(resp.content)
+        data = wrap(msg_resp)
+        print(f"[Api.MessageListBySeq] parsed ok, count={len(msg_resp.msg)}")
+        return data
+
+    @staticmethod
+    def _build_send_message_req(chat_id: str, chat_type: int, text: str) -> bytes:
         msg_pb2, json_format = Api._import_msg_pb2()
         req = msg_pb2.send_message_send()
         req.chat_id = chat_id
@@ -295,8 +392,12 @@ class Api:
         req.content_type = 1  # Text
 
         req.msg_id = str(uuid.uuid4()).replace("-", "")
+        return req.SerializeToString()
 
-        data_bytes = req.SerializeToString()
+    @staticmethod
+    def SendMessage(token: str, chat_id: str, chat_type: int, text: str):
+        headers = {"token": token}
+        data_bytes = Api._build_send_message_req(chat_id, chat_type, text)
         response_result = {"response": None, "error": None}
 
         def success_callback(response):
@@ -305,7 +406,7 @@ class Api:
         def error_callback(error):
             response_result["error"] = error
 
-        session.post(
+        task_id = session.post(
             "https://chat-go.jwzhd.com/v1/msg/send-message",
             headers=headers,
             data=data_bytes,
@@ -313,12 +414,15 @@ class Api:
             error_callback=error_callback,
         )
 
-        session.wait_completion()
+        session.wait(task_id)
 
         if response_result["error"]:
             raise Exception(f"请求失败: {response_result['error']}")
 
-        resp = response_result["response"]
+        return Api._parse_send_message(response_result["response"])
+
+    @staticmethod
+    def _parse_send_message(resp):
         if resp is None:
             raise Exception("请求失败: 空响应")
 
@@ -349,13 +453,13 @@ class Api:
         def error_callback(error):
             response_result["error"] = error
 
-        session.get(
+        task_id = session.get(
             "https://chat-go.jwzhd.com/v1/misc/qiniu-token",
             headers=headers,
             callback=success_callback,
             error_callback=error_callback
         )
-        session.wait_completion()
+        session.wait(task_id)
         if response_result["error"]:
             raise Exception(f"获取七牛Token失败: {response_result['error']}")
         
@@ -368,6 +472,33 @@ class Api:
             raise Exception(f"获取七牛Token接口返回错误: {data}")
         return data.get("data", {}).get("token")
 
+    @staticmethod
+    def _image_size(image_bytes: bytes):
+        """只解析图片文件头得到 (宽, 高)，不解码像素"""
+        from PIL import Image
+        with Image.open(BytesIO(image_bytes)) as img:
+            return img.size
+
+    @staticmethod
+    def _cached_qiniu_upload_token(token: str):
+        """带缓存的上传凭证，快过期时在后台刷新"""
+        from modules.qiniu import get_upload_token_cache
+        return get_upload_token_cache().get_token(token, Api._get_qiniu_upload_token)
+
+    @staticmethod
+    def PrewarmUploadToken():
+        """提前获取上传凭证和上传域名（例如用户粘贴图片、确认发送之前），失败时忽略"""
+        from modules.config import Config
+        from modules.qiniu import get_upload_token_cache
+        token = Config().get("token")
+        if not token:
+            return
+        try:
+            qiniu_token = Api._cached_qiniu_upload_token(token)
+            get_upload_token_cache().get_upload_host(qiniu_token)
+        except Exception as e:
+            print(f"[Api.PrewarmUploadToken] failed: {e}")
+
     @staticmethod
     def UploadImage(token: str, image_bytes: bytes, filename: str):
         if token is None:
@@ -376,39 +507,60 @@ class Api:
             if not token:
                 raise Exception("未登录: token 为空")
 
-        # 1. 获取上传 Token
-        qiniu_token = Api._get_qiniu_upload_token(token)
-
-        # 2. 处理图片 (获取尺寸)
-        img = Image.open(BytesIO(image_bytes))
-        width, height = img.size
-        
-        # 3. 准备上传
+        # 1. 相同内容上传过则直接复用结果，不需要上传凭证
+        from modules.upload_ledger import get_upload_ledger
         md5 = hashlib.md5(image_bytes).hexdigest()
         ext = os.path.splitext(filename)[1].lstrip('.') or "jpg"
         key = f"{md5}.{ext}"
         mime_type = mimetypes.guess_type(filename)[0] or "image/jpeg"
 
-        # 4. 上传到七牛
-        upload_url = "https://upload-z2.qiniup.com"
-        files = {"file": (key, image_bytes, mime_type)}
-        data = {"token": qiniu_token, "key": key}
-
-        with httpx.Client(timeout=60.0) as client:
-            resp = client.post(upload_url, data=data, files=files)
+        ledger = get_upload_ledger()
+        cached = ledger.get(key)
+        if cached:
+            print(f"[Api.UploadImage] reuse uploaded {key}")
+            return cached
+
+        # 2. 获取上传 Token 和上传域名（均有缓存），与读取图片尺寸同时进行
+        from modules.qiniu import get_upload_token_cache
+        token_cache = get_upload_token_cache()
+
+        def acquire_token():
+            qiniu_token = Api._cached_qiniu_upload_token(token)
+            return qiniu_token, token_cache.get_upload_host(qiniu_token)
+        token_future = Api._background_executor.submit(acquire_token)
+
+        # 3. 处理图片 (获取尺寸)
+        width, height = Api._image_size(image_bytes)
+        qiniu_token, upload_host = token_future.result()
+
+        # 4. 上传到七牛，大文件分片并行上传，可断点续传
+        from modules.qiniu import MULTIPART_THRESHOLD, MultipartUploader, upload_journal_dir
+        if len(image_bytes) >= MULTIPART_THRESHOLD:
+            uploader = MultipartUploader(qiniu_token, host=upload_host, journal_dir=upload_journal_dir())
+            result = uploader.upload(image_bytes, key, mime_type=mime_type, fname=filename)
+        else:
+            upload_url = f"https://{upload_host}"
+            files = {"file": (key, image_bytes, mime_type)}
+            data = {"token": qiniu_token, "key": key}
+
+            resp = session.client.post(upload_url, data=data, files=files, timeout=60.0)
+            if resp.status_code == 401:
+                token_cache.invalidate(token)
             if resp.status_code != 200:
                 raise Exception(f"七牛上传失败: {resp.text}")
-            
             result = resp.json()
-            return {
-                "file_key": result.get("key"),
-                "file_hash": result.get("hash"),
-                "file_size": len(image_bytes),
-                "file_type": mime_type,
-                "image_width": width,
-                "image_height": height,
-                "file_suffix": ext
-            }
+
+        img_meta = {
+            "file_key": result.get("key"),
+            "file_hash": result.get("hash"),
+            "file_size": len(image_bytes),
+            "file_type": mime_type,
+            "image_width": width,
+            "image_height": height,
+            "file_suffix": ext
+        }
+        ledger.put(key, img_meta)
+        return img_meta
 
     @staticmethod
     def SendImageMessage(token: str, chat_id: str, chat_type: int, img_meta: dict):
@@ -440,18 +592,42 @@ class Api:
         def error_callback(error):
             response_result["error"] = error
 
-        session.post(
+        task_id = session.post(
             "https://chat-go.jwzhd.com/v1/msg/send-message",
             headers=headers,
             data=data_bytes,
             callback=success_callback,
             error_callback=error_callback,
         )
-        session.wait_completion()
+        session.wait(task_id)
 
         if response_result["error"]:
+            # 网络错误与文件无关，保留上传记录，重试时不必重新上传
             raise Exception(f"发送图片消息失败: {response_result['error']}")
-        return response_result["response"]
+
+        resp = response_result["response"]
+        if resp is None:
+            raise Exception("发送图片消息失败: 空响应")
+        if resp.status_code != 200:
+            # 5xx、限流和鉴权失败不代表文件有问题；其它 4xx 视为服务器拒绝了这条图片消息
+            if resp.status_code < 500 and resp.status_code not in (401, 403, 408, 429):
+                Api._discard_upload_record(img_meta)
+            raise Exception(f"发送图片消息失败: {resp.status_code}")
+
+        msg_resp = msg_pb2.send_message()
+        msg_resp.ParseFromString(resp.content)
+        data = json_format.MessageToDict(msg_resp)
+        print(f"[Api.SendImageMessage] status={msg_resp.status.code}")
+        if msg_resp.status.code != 1:
+            # 服务器处理后拒绝：图片可能来自上传记录，而服务端对象已被清理，删除记录使重试时重新上传
+            Api._discard_upload_record(img_meta)
+            raise Exception(f"发送图片消息失败: {msg_resp.status.msg or msg_resp.status.code}")
+        return data
+
+    @staticmethod
+    def _discard_upload_record(img_meta: dict):
+        from modules.upload_ledger import get_upload_ledger
+        get_upload_ledger().discard(img_meta['file_key'])
 
     @staticmethod
     def SendImageMessageFromConfig(chat_id: str, chat_type: int, img_meta: dict):
@@ -462,39 +638,128 @@ class Api:
         return Api.SendImageMessage(token, chat_id, chat_type, img_meta)
 
     @staticmethod
-    def GetCachedImage(url: str) -> str:
-        if not url:
-            return ""
+    def _image_ext(url: str, content_type: str = "") -> str:
+        content_type = (content_type or "").lower()
+        if "png" in content_type: return ".png"
+        elif "jpeg" in content_type or "jpg" in content_type: return ".jpg"
+        elif "webp" in content_type: return ".webp"
 
-        from modules.config import CONFIG_FILE
-
-        url_hash = hashlib.md5(url.encode()).hexdigest()
-        cache_dir = CONFIG_FILE.parent / "cache" / "images"
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        
         ext = ".img"
         lower_url = url.lower()
         if ".png" in lower_url: ext = ".png"
         elif ".jpg" in lower_url or ".jpeg" in lower_url: ext = ".jpg"
         elif ".webp" in lower_url: ext = ".webp"
-        
-        target = cache_dir / f"{url_hash}{ext}"
-        
-        if target.exists():
-            return str(target)
+        return ext
 
-        headers = {
-            "Referer": "https://myapp.jwznb.com",
-            "User-Agent": "yhchat-winui3-app",
-        }
+    @staticmethod
+    def PeekCachedImage(url: str) -> str:
+        """只查内存缓存，不做任何 IO；未命中返回空字符串，可在 UI 线程直接调用"""
+        if not url:
+            return ""
+        from modules.memory_cache import get_image_memory_cache
+        return get_image_memory_cache().get(url) or ""
+
+    @staticmethod
+    def GetCachedImage(url: str, max_age: float = None) -> str:
+        """
+        获取图片的本地缓存路径，必要时下载
+
+        Args:
+            max_age: 缓存超过该时长（秒）时向服务器条件请求确认，None 时使用媒体缓存的默认有效期
+
+        Returns:
+            本地文件路径，失败时返回空字符串
+        """
+        if not url:
+            return ""
+
+        from modules.media_cache import get_media_cache
+        from modules.memory_cache import get_image_memory_cache
+        memory = get_image_memory_cache()
+        # 指定了 max_age 时内存缓存的有效期可能更长，直接查磁盘索引
+        path = memory.get(url) if max_age is None else None
+        if path:
+            return path
+
+        cache = get_media_cache()
+        # 内存中的有效期与磁盘缓存剩余的有效期一致，到期后回到磁盘索引判断是否需要向服务器确认
+        found = cache.lookup_entry(url, max_age)
+        if found:
+            memory.put(url, *found)
+            return found[0]
+
+        with Api._image_inflight_lock:
+            future = Api._image_inflight.get(url)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                Api._image_inflight[url] = future
+        if not is_owner:
+            return future.result()
+
+        path = ""
+        try:
+            # 拿到下载权前可能刚有别的线程下载完成
+            found = cache.lookup_entry(url, max_age)
+            path, fresh_for = found if found else (Api._download_image(url), cache.fresh_for)
+            memory.put(url, path, fresh_for)
+        finally:
+            with Api._image_inflight_lock:
+                Api._image_inflight.pop(url, None)
+            future.set_result(path)
+        return path
+
+    @staticmethod
+    def _download_image(url: str) -> str:
+        from modules.download import download
+        from modules.media_cache import get_media_cache
+        cache = get_media_cache()
+        headers = dict(Api._media_headers)
+        headers.update(cache.conditional_headers(url))
 
         try:
             print(f"[Api.GetCachedImage] downloading {url} ...")
-            with httpx.Client(timeout=10.0) as client:
-                resp = client.get(url, headers=headers)
-                resp.raise_for_status()
-                target.write_bytes(resp.content)
-                return str(target)
+            result = download(url, cache.download_path(url), headers=headers, timeout=10.0)
+            return Api._store_image_download(url, result)
         except Exception as e:
             print(f"[Api.GetCachedImage] failed for {url}: {e}")
             return ""
+
+    @staticmethod
+    def _store_image_download(url: str, result) -> str:
+        """把（条件）下载的结果移入媒体缓存，返回本地文件路径"""
+        from modules.media_cache import get_media_cache
+        cache = get_media_cache()
+        if result.status_code == 304:
+            path = cache.revalidated(url)
+            if not path:
+                raise Exception("服务器返回 304 但本地缓存已不存在")
+            return path
+
+        return cache.put_file(
+            url,
+            result.path,
+            result.sha1,
+            Api._image_ext(url, result.headers.get("content-type")),
+            etag=result.headers.get("etag") or "",
+            last_modified=result.headers.get("last-modified") or "",
+        )
+
+    @staticmethod
+    def DownloadFile(url: str, dest_path: str, progress=None) -> str:
+        """
+        下载消息中的文件/视频/音频到 dest_path，流式写盘，中断后再次调用可续传
+
+        Args:
+            progress: 进度回调 progress(已下载字节, 总字节或 None)，在下载线程中调用
+
+        Returns:
+            保存的文件路径
+        """
+        from modules.download import download
+        try:
+            result = download(url, Path(dest_path), headers=Api._media_headers, progress=progress, timeout=60.0)
+        except Exception as e:
+            raise Exception(f"下载失败: {e}")
+        print(f"[Api.DownloadFile] saved: {result.path} ({result.size} bytes)")
+        return str(result.path)
@@ -0,0 +1,193 @@
+import asyncio
+from concurrent.futures import Future
+from pathlib import Path
+
+from modules.api import Api
+from modules.req import AsyncHTTPClient
+
+aio_session = AsyncHTTPClient()
+
+
+class AsyncApi:
+    """
+    Api 的异步版本，所有请求共享 aio_session 的事件循环线程。
+
+    在事件循环内直接 await；在普通线程中可用 aio_session.submit / aio_session.run。
+    """
+
+    # 正在下载图片的 Task，只在事件循环线程中访问；下载去重用的是与 Api 共用的 Api._image_inflight
+    _image_tasks = set()
+
+    @staticmethod
+    async def _request(method: str, url: str, **kwargs):
+        try:
+            return await aio_session.request(method, url, **kwargs)
+        except Exception as e:
+            raise Exception(f"请求失败: {e}")
+
+    @staticmethod
+    def _token_from_config() -> str:
+        from modules.config import Config
+        token = Config().get("token")
+        if not token:
+            raise Exception("未登录: token 为空")
+        return token
+
+    @staticmethod
+    async def UserInfo(token: str):
+        resp = await AsyncApi._request(
+            "get",
+            "https://chat-go.jwzhd.com/v1/user/info",
+            headers={"token": token},
+        )
+        return Api._parse_user_info(resp)
+
+    @staticmethod
+    async def GetAvatarUrl(token: str) -> str:
+        info = await AsyncApi.UserInfo(token)
+        return (
+            info.get("data", {}).get("avatarUrl")
+            or info.get("data", {}).get("avatar_url")
+            or ""
+        )
+
+    @staticmethod
+    async def UserInfoFromConfig():
+        return await AsyncApi.UserInfo(AsyncApi._token_from_config())
+
+    @staticmethod
+    async def ConversationList(token: str):
+        resp = await AsyncApi._request(
+            "post",
+            "https://chat-go.jwzhd.com/v1/conversation/list",
+            headers={"token": token},
+            content=b"",
+        )
+        return Api._parse_conversation_list(resp)
+
+    @staticmethod
+    async def ConversationListFromConfig():
+        return await AsyncApi.ConversationList(AsyncApi._token_from_config())
+
+    @staticmethod
+    async def MessageList(token: str, chat_id: str, chat_type: int, msg_count: int = 50, msg_id: str = ""):
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, Api._cached_message_page, token, chat_id, msg_count, msg_id)
+        if cached is not None:
+            return cached
+
+        resp = await AsyncApi._request(
+            "post",
+            "https://chat-go.jwzhd.com/v1/msg/list-message",
+            headers={"token": token},
+            content=Api._build_message_list_req(chat_id, chat_type, msg_count, msg_id),
+        )
+        data = Api._parse_message_list(resp)
+        # JSON 编码、SQLite 写入和检索索引都放到线程池，不占用所有请求共享的事件循环
+        await loop.run_in_executor(None, Api._store_message_page, token, chat_id, data)
+        return data
+
+    @staticmethod
+    async def MessageListFromConfig(chat_id: str, chat_type: int, msg_count: int = 50, msg_id: str = ""):
+        token = AsyncApi._token_from_config()
+        return await AsyncApi.MessageList(token, chat_id, chat_type, msg_count, msg_id)
+
+    @staticmethod
+    async def MessageListBySeq(token: str, chat_id: str, chat_type: int, msg_seq: int):
+        resp = await AsyncApi._request(
+            "post",
+            "https://chat-go.jwzhd.com/v1/msg/list-message-by-seq",
+            headers={"token": token},
+            content=Api._build_message_list_by_seq_req(chat_id, chat_type, msg_seq),
+        )
+        data = Api._parse_message_list_by_seq(resp)
+        await asyncio.get_running_loop().run_in_executor(None, Api._store_message_page, token, chat_id, data)
+        return data
+
+    @staticmethod
+    async def SendMessage(token: str, chat_id: str, chat_type: int, text: str):
+        resp = await AsyncApi._request(
+            "post",
+            "https://chat-go.jwzhd.com/v1/msg/send-message",
+            headers={"token": token},
+            content=Api._build_send_message_req(chat_id, chat_type, text),
+        )
+        return Api._parse_send_message(resp)
+
+    @staticmethod
+    async def SendMessageFromConfig(chat_id: str, chat_type: int, text: str):
+        token = AsyncApi._token_from_config()
+        return await AsyncApi.SendMessage(token, chat_id, chat_type, text)
+
+    @staticmethod
+    async def GetCachedImage(url: str, max_age: float = None) -> str:
+        if not url:
+            return ""
+
+        from modules.media_cache import get_media_cache
+        from modules.memory_cache import get_image_memory_cache
+        memory = get_image_memory_cache()
+        path = memory.get(url) if max_age is None else None
+        if path:
+            return path
+
+        loop = asyncio.get_running_loop()
+        cache = get_media_cache()
+        # 磁盘索引查询会等 SQLite 锁和文件状态，不在事件循环上做；内存有效期同 Api.GetCachedImage
+        found = await loop.run_in_executor(None, cache.lookup_entry, url, max_age)
+        if found:
+            memory.put(url, *found)
+            return found[0]
+
+        # 与 Api.GetCachedImage 共用下载表：同一 url 的同步和异步请求只下载一次，不会同时写同一个临时文件
+        with Api._image_inflight_lock:
+            future = Api._image_inflight.get(url)
+            if future is None:
+                future = Future()
+                Api._image_inflight[url] = future
+                task = asyncio.ensure_future(AsyncApi._download_image(url, max_age, future))
+                AsyncApi._image_tasks.add(task)
+                task.add_done_callback(AsyncApi._image_tasks.discard)
+        # 某个等待者被取消时不影响其它等待者
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    @staticmethod
+    async def _download_image(url: str, max_age: float, future: Future) -> str:
+        from modules.download import download_async
+        from modules.media_cache import get_media_cache
+        from modules.memory_cache import get_image_memory_cache
+        loop = asyncio.get_running_loop()
+        cache = get_media_cache()
+        path = ""
+        try:
+            # 拿到下载权前可能刚有别的请求下载完成
+            found = await loop.run_in_executor(None, cache.lookup_entry, url, max_age)
+            path, fresh_for = found if found else ("", cache.fresh_for)
+            if not path:
+                headers = dict(Api._media_headers)
+                headers.update(await loop.run_in_executor(None, cache.conditional_headers, url))
+                print(f"[AsyncApi.GetCachedImage] downloading {url} ...")
+                result = await download_async(url, cache.download_path(url), headers=headers, timeout=10.0)
+                # 入库包括 SQLite 写入和淘汰时删除文件
+                path = await loop.run_in_executor(None, Api._store_image_download, url, result)
+            get_image_memory_cache().put(url, path, fresh_for)
+        except Exception as e:
+            print(f"[AsyncApi.GetCachedImage] failed for {url}: {e}")
+            path = ""
+        finally:
+            with Api._image_inflight_lock:
+                Api._image_inflight.pop(url, None)
+            future.set_result(path)
+        return path
+
+    @staticmethod
+    async def DownloadFile(url: str, dest_path: str, progress=None) -> str:
+        """Api.DownloadFile 的异步版本，progress 在事件循环线程中调用"""
+        from modules.download import download_async
+        try:
+            result = await download_async(url, Path(dest_path), headers=Api._media_headers,
+                                          progress=progress, timeout=60.0)
+        except Exception as e:
+            raise Exception(f"下载失败: {e}")
+        print(f"[AsyncApi.DownloadFile] saved: {result.path} ({result.size} bytes)")
+        return str(result.path)
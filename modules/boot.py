@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+
+class BootFetches:
+    """
+    登录后首屏需要的数据，启动时在 aio_session 的事件循环上并行请求
+
+    用户信息和会话列表同时发出，头像在拿到用户信息后立即下载（缩略图，向服务器确认是否更新）。
+    各项都是 concurrent.futures.Future，页面只注册回调，不在 UI 线程上等待网络。
+    """
+
+    def __init__(self):
+        from modules.async_api import AsyncApi, aio_session
+        self.user_info: Future = aio_session.submit(self._user_info())
+        self.conversations: Optional[Future] = aio_session.submit(AsyncApi.ConversationListFromConfig())
+        self.avatar: Future = aio_session.submit(self._download_avatar())
+        self._lock = threading.Lock()
+
+    async def _user_info(self) -> dict:
+        from modules.async_api import AsyncApi
+        from modules.store import use_message_store
+        token = AsyncApi._token_from_config()
+        info = await AsyncApi.UserInfo(token)
+        user_id = (info.get("data") or {}).get("id") or ""
+        if user_id:
+            # 本地消息缓存按账号分开，拿到用户ID后才能读写
+            await asyncio.get_running_loop().run_in_executor(None, use_message_store, user_id, token)
+        return info
+
+    async def _download_avatar(self) -> str:
+        from modules import thumbnail
+        from modules.async_api import AsyncApi
+        info = await asyncio.wrap_future(self.user_info)
+        data = info.get("data") or {}
+        avatar_url = data.get("avatarUrl") or data.get("avatar_url") or ""
+        if not avatar_url:
+            return ""
+        # 头像地址可能不变而内容更新，与 Api.DownloadAvatarToCache 一样每次都确认
+        return await AsyncApi.GetCachedImage(thumbnail.avatar_url(avatar_url, thumbnail.HOME_AVATAR), max_age=0)
+
+    def take_conversations(self) -> Optional[Future]:
+        """取走启动时预取的会话列表，只能取一次，之后的刷新应重新请求"""
+        with self._lock:
+            future, self.conversations = self.conversations, None
+            return future
+
+
+_boot: Optional[BootFetches] = None
+_boot_lock = threading.Lock()
+
+
+def start_boot_fetches() -> BootFetches:
+    """发起（或返回已发起的）启动请求，需已登录"""
+    global _boot
+    with _boot_lock:
+        if _boot is None:
+            _boot = BootFetches()
+        return _boot
+
+
+def get_boot_fetches() -> Optional[BootFetches]:
+    """已发起的启动请求，未发起时为 None"""
+    return _boot
+
+
+def reset_boot_fetches():
+    """退出登录时丢弃，下次登录重新请求"""
+    global _boot
+    with _boot_lock:
+        _boot = None
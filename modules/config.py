@@ -1,57 +1,144 @@
+import atexit
 import json
+import os
+import tempfile
+import threading
+import time
 from pathlib import Path
 
 CONFIG_FILE = Path.home() / 'AppData' / 'Roaming' / 'yhchat-winui3' / "config.json"
 
+# 所有 Config 实例共享的内存快照，按文件 mtime 失效
+_lock = threading.RLock()
+_snapshot = None
+_snapshot_mtime = None
+_checked_at = 0.0
+_dirty = False
+_initialized = False
+_flush_timer = None
+WRITE_DELAY = 0.5  # 合并写入的延迟（秒）
+CHECK_INTERVAL = 1.0  # 检查文件 mtime 的最小间隔（秒）
+
+
+def _file_mtime():
+    try:
+        return CONFIG_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _load() -> dict:
+    """返回内存快照；文件被外部修改时重新读取（有未写入的修改时以内存为准）"""
+    global _snapshot, _snapshot_mtime, _checked_at
+    if _dirty and _snapshot is not None:
+        return _snapshot
+
+    now = time.monotonic()
+    if _snapshot is not None and now - _checked_at < CHECK_INTERVAL:
+        return _snapshot
+    _checked_at = now
+
+    mtime = _file_mtime()
+    if _snapshot is not None and mtime == _snapshot_mtime:
+        return _snapshot
+
+    if mtime is None:
+        _snapshot = {}
+    else:
+        with open(CONFIG_FILE, "r", encoding="utf-8") as file:
+            _snapshot = json.load(file)
+    _snapshot_mtime = mtime
+    return _snapshot
+
+
+def _write_atomic(content: dict):
+    """先写临时文件再替换，写入过程中崩溃不会留下半个配置文件"""
+    global _snapshot_mtime
+    fd, tmp_path = tempfile.mkstemp(dir=str(CONFIG_FILE.parent), prefix=".config-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(content, file, ensure_ascii=False, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, CONFIG_FILE)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _snapshot_mtime = _file_mtime()
+
+
+def _flush():
+    global _dirty, _flush_timer
+    with _lock:
+        _flush_timer = None
+        if not _dirty:
+            return
+        try:
+            _write_atomic(_snapshot)
+            _dirty = False
+        except PermissionError:
+            print(f"没有权限写入配置文件: {CONFIG_FILE}")
+        except Exception as e:
+            print(f"写入配置文件失败: {e}")
+
+
+def _schedule_flush():
+    global _dirty, _flush_timer
+    _dirty = True
+    if _flush_timer is None:
+        _flush_timer = threading.Timer(WRITE_DELAY, _flush)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+
+atexit.register(_flush)
+
 
 class Config:
     def __init__(self):
-        """初始化配置，确保配置文件存在"""
+        """初始化配置，确保配置文件存在（每个进程只检查一次）"""
+        global _initialized
+        if _initialized:
+            return
         try:
-            # 确保配置目录存在
-            config_dir = CONFIG_FILE.parent
-            if not config_dir.exists():
-                config_dir.mkdir(parents=True, exist_ok=True)
-            
-            # 如果配置文件不存在，创建空的配置文件
-            if not CONFIG_FILE.exists():
-                with open(CONFIG_FILE, "w", encoding="utf-8") as file:
-                    json.dump({}, file, ensure_ascii=False, indent=4)
+            with _lock:
+                # 确保配置目录存在
+                config_dir = CONFIG_FILE.parent
+                if not config_dir.exists():
+                    config_dir.mkdir(parents=True, exist_ok=True)
+                
+                # 如果配置文件不存在，创建空的配置文件
+                if not CONFIG_FILE.exists() and not _dirty:
+                    _write_atomic({})
+                _initialized = True
         except Exception as e:
             print(f"初始化配置文件失败: {e}")
             # 可以选择重新抛出异常或者进行其他错误处理
 
     def set(self, key: str, content):
-        """设置配置项"""
+        """设置配置项（合并后异步写入磁盘）"""
         try:
-            json_content = self.get("*")
-            json_content[key] = content
-            
-            # 使用json.dump来确保正确的JSON格式
-            with open(CONFIG_FILE, "w", encoding="utf-8") as file:
-                json.dump(json_content, file, ensure_ascii=False, indent=4)
-                
-        except PermissionError:
-            print(f"没有权限写入配置文件: {CONFIG_FILE}")
+            with _lock:
+                _load()[key] = content
+                _schedule_flush()
         except Exception as e:
             print(f"设置配置项 '{key}' 失败: {e}")
 
     def get(self, key: str, default=None):
         """获取配置项"""
         try:
-            # 检查文件是否存在
-            if not CONFIG_FILE.exists():
-                return default
-                
-            with open(CONFIG_FILE, "r", encoding="utf-8") as file:
-                json_content = json.load(file)  # 使用json.load替代json.loads(file.read())
+            with _lock:
+                json_content = _load()
                 
-            if key == "*":
-                return json_content
-            elif key in json_content:
-                return json_content[key]
-            else:
-                return default
+                if key == "*":
+                    return dict(json_content)
+                elif key in json_content:
+                    return json_content[key]
+                else:
+                    return default
                 
         except json.JSONDecodeError:
             print(f"配置文件格式错误: {CONFIG_FILE}")
@@ -66,12 +153,12 @@ class Config:
     def delete(self, key: str):
         """删除配置项"""
         try:
-            json_content = self.get("*")
-            if key in json_content:
-                del json_content[key]
-                with open(CONFIG_FILE, "w", encoding="utf-8") as file:
-                    json.dump(json_content, file, ensure_ascii=False, indent=4)
-                return True
+            with _lock:
+                json_content = _load()
+                if key in json_content:
+                    del json_content[key]
+                    _schedule_flush()
+                    return True
             return False
         except Exception as e:
             print(f"删除配置项 '{key}' 失败: {e}")
@@ -79,8 +166,14 @@ class Config:
 
     def clear(self):
         """清空所有配置"""
+        global _snapshot
         try:
-            with open(CONFIG_FILE, "w", encoding="utf-8") as file:
-                json.dump({}, file, ensure_ascii=False, indent=4)
+            with _lock:
+                _snapshot = {}
+                _schedule_flush()
         except Exception as e:
-            print(f"清空配置失败: {e}")
\ No newline at end of file
+            print(f"清空配置失败: {e}")
+
+    def flush(self):
+        """立即把未写入的修改写到磁盘"""
+        _flush()
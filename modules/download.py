@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+CHUNK_SIZE = 64 * 1024
+
+ProgressCallback = Callable[[int, Optional[int]], None]  # (已下载字节, 总字节或 None)
+
+
+class RateLimiter:
+    """
+    令牌桶限速器
+
+    多个下载共享同一个实例时共享带宽上限；同步下载用 acquire，事件循环中用 acquire_async。
+    """
+
+    def __init__(self, bytes_per_second: float, burst: Optional[int] = None):
+        self.rate = float(bytes_per_second)
+        self.capacity = burst or max(int(bytes_per_second), CHUNK_SIZE)
+        self.tokens = float(self.capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self, n: int) -> float:
+        """扣除 n 字节的令牌，返回需要等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= n
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self, n: int):
+        delay = self._reserve(n)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, n: int):
+        delay = self._reserve(n)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_loaded = False
+_limiter_lock = threading.Lock()
+
+
+def get_download_limiter() -> Optional[RateLimiter]:
+    """全局下载限速器，由配置项 download_rate_limit（字节/秒）控制，未设置或为 0 时不限速"""
+    global _limiter, _limiter_loaded
+    with _limiter_lock:
+        if not _limiter_loaded:
+            from modules.config import Config
+            rate = float(Config().get("download_rate_limit", 0) or 0)
+            _limiter = RateLimiter(rate) if rate > 0 else None
+            _limiter_loaded = True
+        return _limiter
+
+
+@dataclass
+class DownloadResult:
+    status_code: int
+    path: Optional[Path]  # 下载完成的文件；304 时为 None
+    sha1: str = ""
+    size: int = 0
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+class _Download:
+    """
+    一次下载的磁盘状态
+
+    数据先写到 dest.part，响应头中的校验信息写到 dest.part.json；
+    中断后再次下载同一 dest 时带上 Range / If-Range 续传，服务器内容已变化时从头开始。
+    """
+
+    def __init__(self, url: str, dest: Path, progress: Optional[ProgressCallback]):
+        self.url = url
+        self.dest = Path(dest)
+        self.part = Path(str(self.dest) + ".part")
+        self.meta = Path(str(self.dest) + ".part.json")
+        self.progress = progress
+        self.offset = 0
+        self.done = 0
+        self.total = None
+        self.hasher = hashlib.sha1()
+        self.file = None
+
+    def _load_meta(self) -> Dict:
+        try:
+            meta = json.loads(self.meta.read_text(encoding="utf-8"))
+            return meta if meta.get("url") == self.url else {}
+        except (OSError, ValueError):
+            return {}
+
+    def reset(self):
+        for p in (self.part, self.meta):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+        self.offset = 0
+        self.hasher = hashlib.sha1()
+
+    def prepare(self, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """返回本次请求的请求头，有可续传的部分文件时加上 Range"""
+        self.dest.parent.mkdir(parents=True, exist_ok=True)
+        req_headers = dict(headers or {})
+        # Range 按编码后的字节计算，而 iter_bytes 给出的是解压后的内容，要求服务器不压缩才能按写入的字节数续传
+        req_headers["Accept-Encoding"] = "identity"
+
+        meta = self._load_meta()
+        validator = meta.get("etag") if not (meta.get("etag") or "").startswith("W/") else ""
+        validator = validator or meta.get("last_modified") or ""
+        size = self.part.stat().st_size if self.part.exists() else 0
+        if not validator or not size:
+            self.reset()
+            return req_headers
+
+        # 已有部分的哈希需要重新计算，分块读取，不占用额外内存
+        with open(self.part, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                self.hasher.update(chunk)
+        self.offset = size
+        req_headers["Range"] = f"bytes={size}-"
+        req_headers["If-Range"] = validator
+        return req_headers
+
+    def begin(self, resp) -> bool:
+        """
+        根据响应状态准备写入
+
+        Returns:
+            False 表示 304（未修改），不需要读取响应体
+        """
+        if resp.status_code == 304:
+            return False
+        resp.raise_for_status()
+
+        start = 0
+        encoded = (resp.headers.get("content-encoding") or "identity") != "identity"
+        if resp.status_code == 206:
+            # Content-Range: bytes 起-止/总长
+            content_range = resp.headers.get("content-range") or ""
+            try:
+                span, _, total = content_range.split(" ", 1)[1].partition("/")
+                start = int(span.split("-")[0])
+                self.total = int(total) if total != "*" else None
+            except (IndexError, ValueError):
+                start = -1
+            if start != self.offset:
+                raise Exception(f"续传位置不匹配: {content_range}")
+        else:
+            # 服务器忽略了 Range 或内容已变化，从头开始
+            self.offset = 0
+            self.hasher = hashlib.sha1()
+            length = resp.headers.get("content-length")
+            self.total = int(length) if length and length.isdigit() else None
+            if encoded:
+                # 压缩传输时 Content-Length 是压缩后的长度，与写入的字节数不可比
+                self.total = None
+
+        if encoded:
+            # 服务器仍然压缩了响应，写入的字节与 Range 对不上，不记录续传信息，中断后从头下载
+            try:
+                self.meta.unlink()
+            except FileNotFoundError:
+                pass
+        else:
+            self.meta.write_text(json.dumps({
+                "url": self.url,
+                "etag": resp.headers.get("etag") or "",
+                "last_modified": resp.headers.get("last-modified") or "",
+            }), encoding="utf-8")
+        self.file = open(self.part, "ab" if start else "wb")
+        self.done = self.offset
+        self._report()
+        return True
+
+    def write(self, chunk: bytes):
+        self.file.write(chunk)
+        self.hasher.update(chunk)
+        self.done += len(chunk)
+        self._report()
+
+    def _report(self):
+        if self.progress is not None:
+            try:
+                self.progress(self.done, self.total)
+            except Exception as e:
+                print(f"[download] progress callback error: {e}")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def finish(self, resp) -> DownloadResult:
+        if self.total is not None and self.done != self.total:
+            raise Exception(f"下载不完整: {self.done}/{self.total}")
+        os.replace(self.part, self.dest)
+        try:
+            self.meta.unlink()
+        except FileNotFoundError:
+            pass
+        return DownloadResult(resp.status_code, self.dest, self.hasher.hexdigest(), self.done, dict(resp.headers))
+
+
+def download(url: str, dest: Path, headers: Optional[Dict[str, str]] = None,
+             progress: Optional[ProgressCallback] = None,
+             limiter: Optional[RateLimiter] = None,
+             timeout: float = 30.0) -> DownloadResult:
+    """
+    分块流式下载到 dest，内存占用与文件大小无关
+
+    中断时保留 dest.part，下次以相同 dest 调用会续传。headers 中可带条件请求头，
+    服务器返回 304 时结果的 path 为 None。limiter 为 None 时使用全局限速器。
+    """
+    from modules.api import session
+    limiter = limiter or get_download_limiter()
+
+    for _ in range(2):
+        job = _Download(url, dest, progress)
+        req_headers = job.prepare(headers)
+        with session.stream("GET", url, headers=req_headers, timeout=timeout) as resp:
+            if resp.status_code == 416 and job.offset:
+                # 部分文件已失效（例如服务器上的文件变短），丢弃后重试一次
+                job.reset()
+                continue
+            if not job.begin(resp):
+                return DownloadResult(304, None, headers=dict(resp.headers))
+            try:
+                for chunk in resp.iter_bytes(CHUNK_SIZE):
+                    if limiter is not None:
+                        limiter.acquire(len(chunk))
+                    job.write(chunk)
+            finally:
+                job.close()
+            return job.finish(resp)
+    raise Exception(f"下载失败: {url}")
+
+
+async def download_async(url: str, dest: Path, headers: Optional[Dict[str, str]] = None,
+                         progress: Optional[ProgressCallback] = None,
+                         limiter: Optional[RateLimiter] = None,
+                         timeout: float = 30.0) -> DownloadResult:
+    """
+    download 的异步版本，在 aio_session 的事件循环中 await
+
+    文件读写都放到线程池里，事件循环只负责收数据；progress 在线程池中调用。
+    """
+    from modules.async_api import aio_session
+    limiter = limiter or get_download_limiter()
+    loop = asyncio.get_running_loop()
+
+    for _ in range(2):
+        job = _Download(url, dest, progress)
+        # 续传前要重新计算已有部分的哈希，放到线程池里避免阻塞事件循环
+        req_headers = await loop.run_in_executor(None, job.prepare, headers)
+        async with aio_session.stream("GET", url, headers=req_headers, timeout=timeout) as resp:
+            if resp.status_code == 416 and job.offset:
+                await loop.run_in_executor(None, job.reset)
+                continue
+            if not await loop.run_in_executor(None, job.begin, resp):
+                return DownloadResult(304, None, headers=dict(resp.headers))
+            try:
+                async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+                    if limiter is not None:
+                        await limiter.acquire_async(len(chunk))
+                    # 逐块等待写完再收下一块，保证写入顺序，内存中最多只有一块数据
+                    await loop.run_in_executor(None, job.write, chunk)
+            finally:
+                await loop.run_in_executor(None, job.close)
+            return await loop.run_in_executor(None, job.finish, resp)
+    raise Exception(f"下载失败: {url}")
@@ -0,0 +1,328 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from modules.config import CONFIG_FILE
+
+CACHE_DIR = CONFIG_FILE.parent / "cache" / "media"
+DEFAULT_BUDGET = 512 * 1024 * 1024
+# 超过该时长（秒）的缓存项需要向服务器条件请求确认后才能继续使用
+DEFAULT_FRESH_FOR = 7 * 24 * 3600
+
+
+class MediaCache:
+    """
+    按内容寻址的图片/媒体磁盘缓存
+
+    文件按内容 sha1 存放，不同 URL 下载到相同内容时只保存一份；
+    索引（url -> 内容哈希，内容哈希 -> 文件/大小/访问记录）保存在 SQLite 中。
+    总大小超过 budget 时按 LRU（或 LFU）淘汰。
+    每个 url 同时记录 ETag / Last-Modified 和获取时间，超过 fresh_for 秒后视为过期，
+    由调用方带上 conditional_headers 重新请求，304 时调用 revalidated 续期。
+    """
+
+    def __init__(self, root: Path = CACHE_DIR, budget: int = DEFAULT_BUDGET,
+                 policy: str = "lru", access_flush_interval: float = 5.0,
+                 fresh_for: float = DEFAULT_FRESH_FOR):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"unknown eviction policy: {policy}")
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        # 下载中的临时文件，与 blobs 在同一目录树下，完成后直接 os.replace 过去
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.budget = budget
+        self.policy = policy
+        self.access_flush_interval = access_flush_interval
+        self.fresh_for = fresh_for
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.root / "index.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash        TEXT    PRIMARY KEY,
+                name        TEXT    NOT NULL,
+                size        INTEGER NOT NULL,
+                last_access REAL    NOT NULL,
+                hits        INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                url           TEXT PRIMARY KEY,
+                hash          TEXT NOT NULL,
+                etag          TEXT NOT NULL DEFAULT '',
+                last_modified TEXT NOT NULL DEFAULT '',
+                fetched_at    REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_urls_hash ON urls (hash);
+            CREATE INDEX IF NOT EXISTS idx_blobs_access ON blobs (last_access);
+            """
+        )
+        self._migrate()
+        self.conn.commit()
+
+        row = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        self.total_bytes = row[0]
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "revalidated": 0, "evictions": 0, "dedup": 0}
+
+        # 命中时只记在内存里，定期批量写回，避免每次命中都写数据库
+        self._pending_access: Dict[str, int] = {}
+        self._last_access_flush = time.monotonic()
+        # 文件被删除时通知上层缓存，回调参数为受影响的 url 列表，在持有 self.lock 时调用
+        self.drop_listeners: List[Callable[[List[str]], None]] = []
+
+    def _migrate(self):
+        # 旧版本的 urls 表没有校验信息，补上列并把已有记录视为刚获取过，避免升级后全部重新下载
+        columns = {r[1] for r in self.conn.execute("PRAGMA table_info(urls)")}
+        if "fetched_at" not in columns:
+            self.conn.execute("ALTER TABLE urls ADD COLUMN etag TEXT NOT NULL DEFAULT ''")
+            self.conn.execute("ALTER TABLE urls ADD COLUMN last_modified TEXT NOT NULL DEFAULT ''")
+            self.conn.execute("ALTER TABLE urls ADD COLUMN fetched_at REAL NOT NULL DEFAULT 0")
+            self.conn.execute("UPDATE urls SET fetched_at = ?", (time.time(),))
+
+    def _blob_path(self, name: str) -> Path:
+        return self.blob_dir / name[:2] / name
+
+    def _find(self, url: str):
+        """(hash, 路径, etag, last_modified, fetched_at)，没有记录或文件已丢失时返回 None，需持有 self.lock"""
+        row = self.conn.execute(
+            "SELECT b.hash, b.name, u.etag, u.last_modified, u.fetched_at "
+            "FROM urls AS u JOIN blobs AS b ON b.hash = u.hash WHERE u.url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        path = self._blob_path(row[1])
+        if not path.exists():
+            # 文件被外部删除，清掉索引
+            self._drop_blob(row[0])
+            self.conn.commit()
+            return None
+        return row[0], path, row[2], row[3], row[4]
+
+    def _touch(self, digest: str):
+        self._pending_access[digest] = self._pending_access.get(digest, 0) + 1
+        if time.monotonic() - self._last_access_flush > self.access_flush_interval:
+            self._flush_access()
+            self.conn.commit()
+
+    def lookup(self, url: str, max_age: Optional[float] = None) -> Optional[str]:
+        """
+        命中且未过期时返回本地文件路径，否则返回 None
+
+        Args:
+            max_age: 允许的最大缓存时长（秒），None 时使用 fresh_for
+        """
+        found = self.lookup_entry(url, max_age)
+        return found[0] if found is not None else None
+
+    def lookup_entry(self, url: str, max_age: Optional[float] = None) -> Optional[Tuple[str, float]]:
+        """同 lookup，命中时返回 (本地文件路径, 按 fresh_for 计算的剩余有效秒数)"""
+        max_age = self.fresh_for if max_age is None else max_age
+        with self.lock:
+            found = self._find(url)
+            if found is None:
+                self.stats["misses"] += 1
+                return None
+            digest, path, _, _, fetched_at = found
+            age = time.time() - fetched_at
+            if age > max_age:
+                self.stats["stale"] += 1
+                return None
+
+            self.stats["hits"] += 1
+            self._touch(digest)
+            return str(path), max(0.0, self.fresh_for - age)
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """已缓存（无论是否过期）时返回 If-None-Match / If-Modified-Since 请求头"""
+        with self.lock:
+            found = self._find(url)
+        headers = {}
+        if found is not None:
+            if found[2]:
+                headers["If-None-Match"] = found[2]
+            if found[3]:
+                headers["If-Modified-Since"] = found[3]
+        return headers
+
+    def revalidated(self, url: str) -> Optional[str]:
+        """服务器返回 304 后调用：刷新获取时间并返回本地文件路径，缓存已丢失时返回 None"""
+        with self.lock:
+            found = self._find(url)
+            if found is None:
+                return None
+            self.conn.execute("UPDATE urls SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self.stats["revalidated"] += 1
+            self._touch(found[0])
+            self.conn.commit()
+            return str(found[1])
+
+    def download_path(self, url: str) -> Path:
+        """url 对应的下载临时文件路径，同一 url 固定不变以便续传"""
+        return self.tmp_dir / hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def put(self, url: str, content: bytes, ext: str = ".img",
+            etag: str = "", last_modified: str = "") -> str:
+        """保存下载内容并把 url 指向它，返回本地文件路径"""
+        digest = hashlib.sha1(content).hexdigest()
+        return self._put(url, digest, len(content), ext, etag, last_modified,
+                         lambda path: self._write_atomic(path, content))
+
+    def put_file(self, url: str, src: Path, digest: str, ext: str = ".img",
+                 etag: str = "", last_modified: str = "") -> str:
+        """
+        把已下载好的文件移入缓存并把 url 指向它，返回本地文件路径
+
+        src 应位于 tmp_dir 下（与缓存同一文件系统），digest 为其内容的 sha1。
+        """
+        src = Path(src)
+
+        def move(path: Path):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src, path)
+
+        try:
+            return self._put(url, digest, src.stat().st_size, ext, etag, last_modified, move)
+        finally:
+            # 内容已存在时不需要移动，删掉临时文件
+            try:
+                src.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _put(self, url: str, digest: str, size: int, ext: str, etag: str, last_modified: str,
+             write: Callable[[Path], None]) -> str:
+        name = f"{digest}{ext}"
+
+        with self.lock:
+            row = self.conn.execute("SELECT name FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            if row is not None and self._blob_path(row[0]).exists():
+                self.stats["dedup"] += 1
+                path = self._blob_path(row[0])
+                self.conn.execute("UPDATE blobs SET last_access = ? WHERE hash = ?", (time.time(), digest))
+            else:
+                path = self._blob_path(name)
+                write(path)
+                if row is not None:
+                    self.total_bytes -= self.conn.execute(
+                        "SELECT size FROM blobs WHERE hash = ?", (digest,)
+                    ).fetchone()[0]
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO blobs (hash, name, size, last_access, hits) VALUES (?, ?, ?, ?, 0)",
+                    (digest, name, size, time.time()),
+                )
+                self.total_bytes += size
+
+            self.conn.execute(
+                "INSERT OR REPLACE INTO urls (url, hash, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, digest, etag or "", last_modified or "", time.time()),
+            )
+            self._flush_access()
+            self._evict(keep=digest)
+            self.conn.commit()
+            return str(path)
+
+    def _write_atomic(self, path: Path, content: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _flush_access(self):
+        if self._pending_access:
+            now = time.time()
+            self.conn.executemany(
+                "UPDATE blobs SET last_access = ?, hits = hits + ? WHERE hash = ?",
+                [(now, n, h) for h, n in self._pending_access.items()],
+            )
+            self._pending_access.clear()
+        self._last_access_flush = time.monotonic()
+
+    def _drop_blob(self, digest: str):
+        row = self.conn.execute("SELECT name, size FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            return
+        try:
+            self._blob_path(row[0]).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[MediaCache] remove failed for {row[0]}: {e}")
+        if self.drop_listeners:
+            urls = [r[0] for r in self.conn.execute("SELECT url FROM urls WHERE hash = ?", (digest,))]
+            for listener in self.drop_listeners:
+                try:
+                    listener(urls)
+                except Exception as e:
+                    print(f"[MediaCache] drop listener error: {e}")
+        self.conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+        self.conn.execute("DELETE FROM urls WHERE hash = ?", (digest,))
+        self.total_bytes -= row[1]
+        self._pending_access.pop(digest, None)
+
+    def _evict(self, keep: Optional[str] = None):
+        if self.total_bytes <= self.budget:
+            return
+        order = "last_access" if self.policy == "lru" else "hits, last_access"
+        while self.total_bytes > self.budget:
+            # 一次多取一些候选，避免大缓存时反复查询
+            candidates = self.conn.execute(
+                f"SELECT hash FROM blobs WHERE hash != ? ORDER BY {order} LIMIT 256", (keep or "",)
+            ).fetchall()
+            if not candidates:
+                break
+            for (digest,) in candidates:
+                if self.total_bytes <= self.budget:
+                    break
+                self._drop_blob(digest)
+                self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+            return dict(self.stats, files=count, bytes=self.total_bytes, budget=self.budget)
+
+    def close(self):
+        with self.lock:
+            self._flush_access()
+            self.conn.commit()
+            self.conn.close()
+
+
+_cache: Optional[MediaCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_media_cache() -> MediaCache:
+    """
+    全局媒体缓存
+
+    容量可通过配置项 media_cache_budget（字节）调整，
+    有效期可通过 media_cache_fresh_seconds（秒）调整。
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from modules.config import Config
+            config = Config()
+            budget = config.get("media_cache_budget", DEFAULT_BUDGET)
+            fresh_for = config.get("media_cache_fresh_seconds", DEFAULT_FRESH_FOR)
+            _cache = MediaCache(budget=int(budget), fresh_for=float(fresh_for))
+        return _cache
@@ -0,0 +1,180 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+from urllib.parse import urlsplit
+
+# 优先级，数值越小越先下载
+VISIBLE = 0
+NEAR_VIEWPORT = 1
+PREFETCH = 2
+
+
+class _Job:
+    __slots__ = ("url", "host", "priority", "waiters", "started", "queued_at")
+
+    def __init__(self, url: str, priority: int):
+        self.url = url
+        self.host = urlsplit(url).netloc
+        self.priority = priority
+        self.waiters: List = []  # [(group, Future)]
+        self.started = False
+        self.queued_at = time.monotonic()
+
+    def alive(self) -> bool:
+        return any(not f.done() for _, f in self.waiters)
+
+
+class MediaScheduler:
+    """
+    带优先级的媒体下载调度器
+
+    按优先级（VISIBLE > NEAR_VIEWPORT > PREFETCH）出队，总并发和每个 host 的并发都有上限；
+    同一 url 的多次提交合并成一个任务，再次提交更高优先级时会提升排队中的任务。
+    每次提交可带一个分组（例如某个会话的加载令牌），cancel(group) 会取消该组所有尚未完成的等待，
+    排队中的任务如果已没有其它分组在等待则直接丢弃，不再下载。
+
+    submit / cancel 可在任意线程调用；调度状态只在事件循环线程中修改。
+    """
+
+    def __init__(self, fetch: Optional[Callable[[str], Awaitable[str]]] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 max_inflight: int = 8, max_per_host: int = 4):
+        self._fetch = fetch
+        self._loop = loop
+        self.max_inflight = max_inflight
+        self.max_per_host = max_per_host
+
+        self._heap = []  # (priority, seq, job)，过期条目在出队时跳过
+        self._seq = itertools.count()
+        self._jobs: Dict[str, _Job] = {}  # url -> 排队或下载中的任务
+        self._inflight = 0
+        self._host_inflight: Dict[str, int] = {}
+        self.stats = {"submitted": 0, "completed": 0, "cancelled": 0, "merged": 0,
+                      "wait_ms": {VISIBLE: 0.0, NEAR_VIEWPORT: 0.0, PREFETCH: 0.0},
+                      "started": {VISIBLE: 0, NEAR_VIEWPORT: 0, PREFETCH: 0}}
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            from modules.async_api import aio_session
+            self._loop = aio_session._ensure_loop()
+        return self._loop
+
+    async def _do_fetch(self, url: str) -> str:
+        if self._fetch is None:
+            from modules.async_api import AsyncApi
+            self._fetch = AsyncApi.GetCachedImage
+        return await self._fetch(url)
+
+    def submit(self, url: str, priority: int = VISIBLE, group: Hashable = None) -> Future:
+        """
+        提交下载，返回 concurrent.futures.Future，结果为本地文件路径（失败时为空字符串）
+
+        分组被取消时 Future 会被取消。
+        """
+        future = Future()
+        self._get_loop().call_soon_threadsafe(self._enqueue, url, priority, group, future)
+        return future
+
+    def cancel(self, group: Hashable):
+        """取消某个分组中所有尚未完成的请求"""
+        self._get_loop().call_soon_threadsafe(self._cancel, group)
+
+    def _enqueue(self, url: str, priority: int, group: Hashable, future: Future):
+        self.stats["submitted"] += 1
+        job = self._jobs.get(url)
+        if job is None:
+            job = _Job(url, priority)
+            self._jobs[url] = job
+            heapq.heappush(self._heap, (priority, next(self._seq), job))
+        else:
+            self.stats["merged"] += 1
+            if not job.started and priority < job.priority:
+                job.priority = priority
+                heapq.heappush(self._heap, (priority, next(self._seq), job))
+        job.waiters.append((group, future))
+        self._pump()
+
+    def _cancel(self, group: Hashable):
+        for url, job in list(self._jobs.items()):
+            remaining = []
+            for g, f in job.waiters:
+                if g == group and not f.done():
+                    f.cancel()
+                    self.stats["cancelled"] += 1
+                else:
+                    remaining.append((g, f))
+            job.waiters = remaining
+            if not job.started and not job.alive():
+                # 堆中的条目在出队时发现任务已不在 _jobs 中会被跳过
+                del self._jobs[url]
+
+    def _pump(self):
+        deferred = []
+        while self._heap and self._inflight < self.max_inflight:
+            priority, seq, job = heapq.heappop(self._heap)
+            if job.started or priority != job.priority or self._jobs.get(job.url) is not job:
+                continue
+            if not job.alive():
+                del self._jobs[job.url]
+                continue
+            if self._host_inflight.get(job.host, 0) >= self.max_per_host:
+                deferred.append((priority, seq, job))
+                continue
+            self._start(job)
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+
+    def _start(self, job: _Job):
+        job.started = True
+        self._inflight += 1
+        self._host_inflight[job.host] = self._host_inflight.get(job.host, 0) + 1
+        self.stats["started"][job.priority] += 1
+        self.stats["wait_ms"][job.priority] += (time.monotonic() - job.queued_at) * 1000
+        asyncio.ensure_future(self._run(job))
+
+    async def _run(self, job: _Job):
+        path = ""
+        try:
+            path = await self._do_fetch(job.url)
+        except Exception as e:
+            print(f"[MediaScheduler] fetch failed for {job.url}: {e}")
+        finally:
+            self._inflight -= 1
+            self._host_inflight[job.host] -= 1
+            if not self._host_inflight[job.host]:
+                del self._host_inflight[job.host]
+            if self._jobs.get(job.url) is job:
+                del self._jobs[job.url]
+            self.stats["completed"] += 1
+            for _, f in job.waiters:
+                try:
+                    f.set_result(path)
+                except InvalidStateError:
+                    pass  # 已被调用方或分组取消
+            self._pump()
+
+    def get_stats(self) -> Dict:
+        """各优先级的平均排队时间（毫秒）等统计信息，需在事件循环线程或空闲时读取"""
+        avg_wait = {
+            p: (self.stats["wait_ms"][p] / n if n else 0.0)
+            for p, n in self.stats["started"].items()
+        }
+        return dict(self.stats, queued=len(self._jobs) - self._inflight,
+                    inflight=self._inflight, avg_wait_ms=avg_wait)
+
+
+_scheduler: Optional[MediaScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_media_scheduler() -> MediaScheduler:
+    """全局媒体调度器，运行在 aio_session 的事件循环上，通过 AsyncApi.GetCachedImage 下载"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = MediaScheduler()
+        return _scheduler
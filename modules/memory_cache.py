@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+DEFAULT_BUDGET = 64 * 1024 * 1024
+# 只缓存路径时每项的估算开销（字典项 + 字符串）
+_PATH_ENTRY_COST = 256
+
+
+class _Entry:
+    __slots__ = ("path", "thumbs", "size", "expires")
+
+    def __init__(self, path: str, expires: Optional[float] = None):
+        self.path = path
+        self.expires = expires  # time.monotonic() 截止时间，None 为不过期
+        self.thumbs = {}  # (w, h) -> PIL.Image
+        self.size = _PATH_ENTRY_COST + len(path)
+
+
+class ImageMemoryCache:
+    """
+    进程内图片内存缓存，位于 MediaCache 之上
+
+    以 url 为键保存已解析的本地路径，命中时不再经过 sqlite 和文件系统；
+    可选地保存按尺寸缩好的 Pillow 图像。总占用超过 budget（字节，按像素数估算）时按 LRU 淘汰。
+    put 时可指定 max_age，过期后视为未命中，由下层缓存重新校验。
+    """
+
+    def __init__(self, budget: int = DEFAULT_BUDGET):
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # url -> _Entry
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "lookup_ns": 0, "lookups": 0}
+
+    def get(self, url: str) -> Optional[str]:
+        """命中时返回本地路径，否则返回 None"""
+        start = time.perf_counter_ns()
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None and entry.expires is not None and time.monotonic() > entry.expires:
+                del self.entries[url]
+                self.total_bytes -= entry.size
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+            else:
+                self.entries.move_to_end(url)
+                self.stats["hits"] += 1
+            self.stats["lookups"] += 1
+            self.stats["lookup_ns"] += time.perf_counter_ns() - start
+        return entry.path if entry is not None else None
+
+    def put(self, url: str, path: str, max_age: Optional[float] = None):
+        if not url or not path:
+            return
+        expires = time.monotonic() + max_age if max_age is not None else None
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                if entry.path == path:
+                    entry.expires = expires
+                    self.entries.move_to_end(url)
+                    return
+                self.total_bytes -= entry.size
+            entry = _Entry(path, expires)
+            self.entries[url] = entry
+            self.total_bytes += entry.size
+            self._evict()
+
+    def get_thumbnail(self, url: str, size: Tuple[int, int]):
+        """
+        返回缩放到 size 以内的 Pillow 图像，首次调用时解码并缓存
+
+        url 必须已经通过 put 登记过本地路径，否则返回 None；解码失败同样返回 None。
+        """
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return None
+            self.entries.move_to_end(url)
+            thumb = entry.thumbs.get(size)
+            if thumb is not None:
+                return thumb
+            path = entry.path
+
+        try:
+            from PIL import Image
+            with Image.open(path) as img:
+                img.draft("RGB", size)
+                img.thumbnail(size)
+                thumb = img.copy()
+        except Exception as e:
+            print(f"[ImageMemoryCache] decode failed for {path}: {e}")
+            return None
+
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None or entry.path != path:
+                return thumb
+            if size not in entry.thumbs:
+                entry.thumbs[size] = thumb
+                cost = thumb.width * thumb.height * len(thumb.getbands())
+                entry.size += cost
+                self.total_bytes += cost
+                self._evict(keep=url)
+        return thumb
+
+    def discard(self, url: str):
+        with self.lock:
+            entry = self.entries.pop(url, None)
+            if entry is not None:
+                self.total_bytes -= entry.size
+
+    def discard_many(self, urls):
+        for url in urls:
+            self.discard(url)
+
+    def _evict(self, keep: Optional[str] = None):
+        while self.total_bytes > self.budget and self.entries:
+            url, entry = next(iter(self.entries.items()))
+            if url == keep:
+                if len(self.entries) == 1:
+                    break
+                self.entries.move_to_end(url)
+                continue
+            del self.entries[url]
+            self.total_bytes -= entry.size
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            lookups = self.stats["lookups"]
+            return dict(
+                self.stats,
+                entries=len(self.entries),
+                bytes=self.total_bytes,
+                budget=self.budget,
+                hit_rate=self.stats["hits"] / lookups if lookups else 0.0,
+                avg_lookup_us=self.stats["lookup_ns"] / lookups / 1000 if lookups else 0.0,
+            )
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+
+_cache: Optional[ImageMemoryCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_image_memory_cache() -> ImageMemoryCache:
+    """全局图片内存缓存，容量可通过配置项 image_memory_budget（字节）调整"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from modules.config import Config
+            budget = Config().get("image_memory_budget", DEFAULT_BUDGET)
+            _cache = ImageMemoryCache(budget=int(budget))
+            # 磁盘缓存淘汰文件后，内存中指向它的路径随之失效
+            from modules.media_cache import get_media_cache
+            get_media_cache().drop_listeners.append(_cache.discard_many)
+        return _cache
@@ -0,0 +1,166 @@
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+Page = Union[bytes, object]  # list_message / list_message_by_seq 的原始响应，或已解析的对象
+
+
+class MessageColumns:
+    """
+    按列存放的一批消息
+
+    用于检索建索引、导出、统计等需要处理大量 list_message 页面的场景，代替每条消息一个字典。
+    数值列为连续数组：安装了 NumPy 时是 numpy.ndarray（可直接做向量化过滤，如
+    cols.send_time >= t0），否则是 array.array。
+    字符串列：
+        msg_id / text 分别拼成一整块 UTF-8 缓冲区，第 i 条消息位于 buf[offsets[i]:offsets[i + 1]]
+        sender 按 chat_id 去重，sender_code[i] 是 senders 中的下标
+    """
+
+    __slots__ = ("msg_seq", "send_time", "content_type", "sender_code", "senders",
+                 "msg_id_buf", "msg_id_offsets", "text_buf", "text_offsets")
+
+    def __init__(self):
+        self.msg_seq = array("q")
+        self.send_time = array("q")
+        self.content_type = array("q")
+        self.sender_code = array("i")
+        self.senders: List[str] = []
+        self.msg_id_buf = bytearray()
+        self.msg_id_offsets = array("q", [0])
+        self.text_buf = bytearray()
+        self.text_offsets = array("q", [0])
+
+    def __len__(self) -> int:
+        return len(self.msg_seq)
+
+    def msg_id(self, i: int) -> str:
+        return self.msg_id_buf[self.msg_id_offsets[i]:self.msg_id_offsets[i + 1]].decode("utf-8")
+
+    def text(self, i: int) -> str:
+        return self.text_buf[self.text_offsets[i]:self.text_offsets[i + 1]].decode("utf-8")
+
+    def sender(self, i: int) -> str:
+        return self.senders[self.sender_code[i]]
+
+    def row(self, i: int) -> Dict:
+        """单条消息的精简字典（仅包含列中的字段）"""
+        return {
+            "msg_id": self.msg_id(i),
+            "msg_seq": int(self.msg_seq[i]),
+            "send_time": int(self.send_time[i]),
+            "sender_chat_id": self.sender(i),
+            "content_type": int(self.content_type[i]),
+            "text": self.text(i),
+        }
+
+    def rows(self, indices: Optional[Iterable[int]] = None) -> Iterator[Dict]:
+        """按下标（或 NumPy 布尔掩码过滤后的 nonzero 结果）逐条取出"""
+        for i in (range(len(self)) if indices is None else indices):
+            yield self.row(int(i))
+
+    def sender_mask(self, chat_id: str):
+        """某个发送者的布尔掩码，需要 NumPy"""
+        _require_numpy()
+        try:
+            code = self.senders.index(chat_id)
+        except ValueError:
+            return np.zeros(len(self), dtype=bool)
+        return self.sender_code == code
+
+    def find_text(self, needle: str) -> List[int]:
+        """正文包含 needle 的消息下标（在整块缓冲区上查找，不逐条解码）"""
+        if not needle:
+            return list(range(len(self)))
+        pattern = needle.encode("utf-8")
+        buf, offsets = self.text_buf, self.text_offsets
+        if np is not None and isinstance(offsets, np.ndarray):
+            # 逐个命中查找所在的消息时，对 ndarray 调 searchsorted 的开销比查找本身还大，改用零拷贝的 memoryview 二分
+            offsets = memoryview(offsets)
+        found = []
+        pos = buf.find(pattern)
+        while pos != -1:
+            i = _row_of(offsets, pos)
+            end = offsets[i + 1]
+            if pos + len(pattern) <= end:
+                found.append(i)
+                # 同一条消息只记一次，从下一条开始继续查找
+                pos = buf.find(pattern, end)
+            else:
+                # 跨越了两条消息的边界，不算命中
+                pos = buf.find(pattern, pos + 1)
+        return found
+
+    def nbytes(self) -> int:
+        """各列占用的字节数（不含 Python 对象头）"""
+        total = len(self.msg_id_buf) + len(self.text_buf) + sum(len(s) for s in self.senders)
+        for name in ("msg_seq", "send_time", "content_type", "sender_code", "msg_id_offsets", "text_offsets"):
+            col = getattr(self, name)
+            total += col.nbytes if np is not None and isinstance(col, np.ndarray) else len(col) * col.itemsize
+        return total
+
+
+def _require_numpy():
+    if np is None:
+        raise Exception("需要安装 numpy")
+
+
+def _row_of(offsets, pos: int) -> int:
+    return bisect_right(offsets, pos) - 1
+
+
+def _parse_page(page: Page):
+    if not isinstance(page, (bytes, bytearray, memoryview)):
+        return page
+    from modules.proto import msg_pb2
+    # list_message 和 list_message_by_seq 的字段编号相同（status = 1, msg = 2），统一按 list_message 解析
+    parsed = msg_pb2.list_message()
+    parsed.ParseFromString(bytes(page))
+    return parsed
+
+
+def decode_pages(pages: Iterable[Page], use_numpy: bool = True) -> MessageColumns:
+    """
+    把多页 list_message 响应解码成一个 MessageColumns
+
+    Args:
+        pages: 原始响应字节，或已解析的 list_message / list_message_by_seq 对象
+        use_numpy: 安装了 NumPy 时把数值列转换为 ndarray（零拷贝）
+    """
+    cols = MessageColumns()
+    msg_seq = cols.msg_seq.append
+    send_time = cols.send_time.append
+    content_type = cols.content_type.append
+    sender_code = cols.sender_code.append
+    id_buf, id_offsets = cols.msg_id_buf, cols.msg_id_offsets
+    text_buf, text_offsets = cols.text_buf, cols.text_offsets
+    sender_index: Dict[str, int] = {}
+
+    for page in pages:
+        for m in _parse_page(page).msg:
+            msg_seq(m.msg_seq)
+            send_time(m.send_time)
+            content_type(m.content_type)
+
+            chat_id = m.sender.chat_id
+            code = sender_index.get(chat_id)
+            if code is None:
+                code = sender_index[chat_id] = len(cols.senders)
+                cols.senders.append(chat_id)
+            sender_code(code)
+
+            id_buf += m.msg_id.encode("utf-8")
+            id_offsets.append(len(id_buf))
+            text_buf += m.content.text.encode("utf-8")
+            text_offsets.append(len(text_buf))
+
+    if use_numpy and np is not None:
+        for name, dtype in (("msg_seq", np.int64), ("send_time", np.int64), ("content_type", np.int64),
+                            ("sender_code", np.int32), ("msg_id_offsets", np.int64), ("text_offsets", np.int64)):
+            setattr(cols, name, np.frombuffer(getattr(cols, name), dtype=dtype))
+    return cols
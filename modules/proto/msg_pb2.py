@@ -104,6 +104,18 @@ _lm.name = 'list_message'
 _f = _lm.field.add(); _f.name = 'status'; _f.number = 1; _f.label = 1; _f.type = 11; _f.type_name = '.Status'
 _f = _lm.field.add(); _f.name = 'msg'; _f.number = 2; _f.label = 3; _f.type = 11; _f.type_name = '.Msg'
 
+_lmbs = _fd.message_type.add()
+_lmbs.name = 'list_message_by_seq_send'
+_f = _lmbs.field.add(); _f.name = 'msg_seq'; _f.number = 3; _f.label = 1; _f.type = 3
+_f = _lmbs.field.add(); _f.name = 'chat_type'; _f.number = 4; _f.label = 1; _f.type = 3
+_f = _lmbs.field.add(); _f.name = 'chat_id'; _f.number = 5; _f.label = 1; _f.type = 9
+
+_lmb = _fd.message_type.add()
+_lmb.name = 'list_message_by_seq'
+_f = _lmb.field.add(); _f.name = 'status'; _f.number = 1; _f.label = 1; _f.type = 11; _f.type_name = '.Status'
+_f = _lmb.field.add(); _f.name = 'msg'; _f.number = 2; _f.label = 3; _f.type = 11; _f.type_name = '.Msg'
+_f = _lmb.field.add(); _f.name = 'total'; _f.number = 3; _f.label = 1; _f.type = 5
+
 _sms = _fd.message_type.add()
 _sms.name = 'send_message_send'
 
@@ -0,0 +1,225 @@
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# 消息描述符 -> {字段名: (字段名, 类别, FieldDescriptor)}，同时收录 snake_case 和 camelCase（json_name）两种写法
+_field_maps: Dict[Any, Dict[str, Tuple[str, int, Any]]] = {}
+# 消息全名 -> 视图类，未登记的消息类型使用 ProtoView
+_view_types: Dict[str, type] = {}
+
+# 字段类别
+_SCALAR = 0
+_MESSAGE = 1
+_ENUM = 2
+_REPEATED = 3
+_REPEATED_MESSAGE = 4
+
+_TYPE_MESSAGE = 11
+_TYPE_ENUM = 14
+_MISSING = object()
+
+
+def _is_repeated(field) -> bool:
+    # protobuf 新版本用 is_repeated 取代了 label
+    is_repeated = getattr(field, "is_repeated", None)
+    if is_repeated is not None:
+        return bool(is_repeated)
+    return field.label == field.LABEL_REPEATED
+
+
+def _fields(descriptor) -> Dict[str, Tuple[str, int, Any]]:
+    fields = _field_maps.get(descriptor)
+    if fields is None:
+        fields = {}
+        for f in descriptor.fields:
+            if _is_repeated(f):
+                kind = _REPEATED_MESSAGE if f.type == _TYPE_MESSAGE else _REPEATED
+            elif f.type == _TYPE_MESSAGE:
+                kind = _MESSAGE
+            elif f.type == _TYPE_ENUM:
+                kind = _ENUM
+            else:
+                kind = _SCALAR
+            fields[f.name] = fields[f.json_name] = (f.name, kind, f)
+        _field_maps[descriptor] = fields
+    return fields
+
+
+def register_view(full_name: str):
+    """把视图类登记为某个消息类型（如 "Msg"）的包装类"""
+    def deco(cls):
+        _view_types[full_name] = cls
+        return cls
+    return deco
+
+
+def wrap(pb) -> "ProtoView":
+    """用登记的视图类包装已解析的 protobuf 消息"""
+    descriptor = pb.DESCRIPTOR
+    return _view_types.get(descriptor.full_name, ProtoView)(pb, _fields(descriptor))
+
+
+def as_dict(obj) -> Dict:
+    """视图转成与 json_format.MessageToDict 相同的字典（用于写入缓存等），普通字典原样返回"""
+    return obj.to_dict() if isinstance(obj, ProtoView) else obj
+
+
+class ProtoView(Mapping):
+    """
+    protobuf 消息的只读视图
+
+    不做 MessageToDict 转换，字段在访问时才从 protobuf 对象中读取；子消息和 repeated 字段的包装在首次访问时缓存。
+    兼容原来的字典用法：get / [] / in / keys，字段名可用 msgId 或 msg_id。
+    与 MessageToDict 一致，未设置（取默认值）的字段视为不存在；区别是 int64 返回 int 而不是字符串。
+    """
+
+    __slots__ = ("_pb", "_fields", "_cache")
+
+    def __init__(self, pb, fields: Optional[Dict[str, Tuple[str, int, Any]]] = None):
+        self._pb = pb
+        self._fields = fields if fields is not None else _fields(pb.DESCRIPTOR)
+        self._cache: Optional[Dict[str, Any]] = None
+
+    @property
+    def pb(self):
+        """被包装的 protobuf 对象"""
+        return self._pb
+
+    def _value(self, key: str):
+        entry = self._fields.get(key)
+        if entry is None:
+            return _MISSING
+        name, kind, field = entry
+
+        if kind == _SCALAR:
+            value = getattr(self._pb, name)
+            return value if value else _MISSING
+
+        cache = self._cache
+        if cache is not None and name in cache:
+            return cache[name]
+
+        if kind == _MESSAGE:
+            if not self._pb.HasField(name):
+                return _MISSING
+            value = wrap(getattr(self._pb, name))
+        elif kind == _ENUM:
+            number = getattr(self._pb, name)
+            if not number:
+                return _MISSING
+            enum_value = field.enum_type.values_by_number.get(number)
+            return enum_value.name if enum_value else number
+        else:
+            raw = getattr(self._pb, name)
+            if not raw:
+                return _MISSING
+            value = [wrap(item) for item in raw] if kind == _REPEATED_MESSAGE else list(raw)
+
+        if cache is None:
+            cache = self._cache = {}
+        cache[name] = value
+        return value
+
+    def get(self, key: str, default=None):
+        entry = self._fields.get(key)
+        if entry is not None and entry[1] == _SCALAR:
+            # 标量字段最常用，直接读取
+            value = getattr(self._pb, entry[0])
+            return value if value else default
+        value = self._value(key)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, key: str):
+        value = self._value(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self._value(key) is not _MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        # 只列出已设置的字段，键名与 MessageToDict 一致（camelCase）；ListFields 与 MessageToDict 取字段的方式相同
+        for field, _ in self._pb.ListFields():
+            yield field.json_name
+
+    def __len__(self) -> int:
+        return len(self._pb.ListFields())
+
+    def __bool__(self) -> bool:
+        # `m.get("sender") or {}` 这类写法会判断真假，不要退回到逐个字段计数
+        return bool(self._pb.ListFields())
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        value = self._value(name)
+        if value is _MISSING:
+            if name in self._fields:
+                return None
+            raise AttributeError(name)
+        return value
+
+    def to_dict(self) -> Dict:
+        from google.protobuf import json_format
+        return json_format.MessageToDict(self._pb)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+@register_view("Msg")
+class MsgView(ProtoView):
+    """单条消息（msg_pb2.Msg），常用字段直接读取 protobuf，返回类型固定"""
+
+    __slots__ = ()
+
+    @property
+    def msg_id(self) -> str:
+        return self._pb.msg_id
+
+    @property
+    def msg_seq(self) -> int:
+        return self._pb.msg_seq
+
+    @property
+    def send_time(self) -> int:
+        return self._pb.send_time
+
+    @property
+    def content_type(self) -> int:
+        return self._pb.content_type
+
+    @property
+    def direction(self) -> str:
+        return self._pb.direction
+
+
+@register_view("ConversationList.ConversationData")
+class ConversationView(ProtoView):
+    """会话列表中的一项（conversation_pb2.ConversationList.ConversationData）"""
+
+    __slots__ = ()
+
+    @property
+    def chat_id(self) -> str:
+        return self._pb.chat_id
+
+    @property
+    def chat_type(self) -> int:
+        return self._pb.chat_type
+
+    @property
+    def name(self) -> str:
+        return self._pb.name
+
+    @property
+    def chat_content(self) -> str:
+        return self._pb.chat_content
+
+    @property
+    def avatar_url(self) -> str:
+        return self._pb.avatar_url
+
+    @property
+    def timestamp_ms(self) -> int:
+        return self._pb.timestamp_ms
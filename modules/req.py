@@ -1,8 +1,27 @@
-import httpx
+import asyncio
 import threading
 import queue
+import weakref
 
-from typing import Optional, Dict, Callable
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Optional, Dict, Callable, Awaitable
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class RequestFuture(Future):
+    """
+    单个请求的等待句柄
+    
+    结果保存在句柄上，由调用方持有，不受结果缓存的数量/字节上限淘汰影响；
+    调用方丢弃句柄后结果随之释放。
+    """
+    
+    def __init__(self, task_id: int):
+        super().__init__()
+        self.task_id = task_id
 
 
 class HTTPThreadingClient:
@@ -11,35 +30,93 @@ class HTTPThreadingClient:
     
     示例：
     >>> client = HTTPThreadingClient(max_thread=4)
-    >>> client.get('https://httpbin.org/get')
+    >>> task = client.get('https://httpbin.org/get')
+    >>> result = client.wait(task)
     >>> client.post('https://httpbin.org/post', json={'key': 'value'})
     """
     
     def __init__(self, max_thread: int = 4, timeout: float = 30.0, 
-                default_headers: Optional[Dict] = None):
+                verify=True,
+                default_headers: Optional[Dict] = None,
+                max_connections: int = 20,
+                max_keepalive_connections: int = 10,
+                keepalive_expiry: float = 30.0,
+                http2: bool = False,
+                max_results: int = 256,
+                max_result_bytes: int = 16 * 1024 * 1024):
         """
-        初始化多线程HTTP客户端
+        初始化多线程HTTP客户端，连接池和工作线程在首次使用时才创建（httpx 也在那时才导入）
         
         Args:
             max_thread: 最大线程数
             timeout: 请求超时时间（秒）
-            verify: SSL证书验证
+            verify: SSL证书验证（True、False、CA证书路径或ssl.SSLContext）
             default_headers: 默认请求头
+            max_connections: 连接池最大连接数
+            max_keepalive_connections: 连接池最大保活连接数
+            keepalive_expiry: 空闲连接保活时间（秒）
+            http2: 是否启用HTTP/2（需要安装h2）
+            max_results: 最多保留的任务结果数
+            max_result_bytes: 保留结果的响应体总字节上限
         """
         self.max_thread = max_thread
         self.timeout = timeout
+        self.verify = verify
         self.default_headers = default_headers or {}
         
+        # 所有工作线程共享一个长连接池，避免每个请求重新握手
+        self.limits = dict(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self._client = None
+        self._start_lock = threading.Lock()
+        
         # 创建线程池
         self.task_queue = queue.Queue()
         self.threads = []
         self._running = True
-        self.results = {}  # 存储请求结果
+        self.results = OrderedDict()  # 存储请求结果（LRU，超出上限淘汰最旧的）
+        self.result_sizes = {}
+        self.retained_bytes = 0  # 当前保留的响应体字节数
+        self.max_results = max_results
+        self.max_result_bytes = max_result_bytes
+        self.futures = weakref.WeakValueDictionary()  # task_id -> 仍被持有的等待句柄
         self.result_lock = threading.Lock()
         self.task_id = 0
         self.task_id_lock = threading.Lock()
-        
-        self._create_threads()
+    
+    @property
+    def client(self) -> "httpx.Client":
+        """共享的httpx客户端，首次访问时创建"""
+        if self._client is None:
+            with self._start_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+    
+    def _create_client(self) -> "httpx.Client":
+        """创建共享的httpx客户端"""
+        import httpx
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("[HTTPThreadingClient] h2 not installed, fallback to HTTP/1.1")
+                http2 = False
+        return httpx.Client(limits=httpx.Limits(**self.limits), http2=http2, timeout=self.timeout,
+                            verify=self.verify)
+    
+    def _ensure_threads(self):
+        """首次提交请求时创建工作线程"""
+        if self.threads:
+            return
+        with self._start_lock:
+            if not self.threads:
+                self._create_threads()
     
     def _create_threads(self):
         """创建工作线程"""
@@ -63,7 +140,9 @@ class HTTPThreadingClient:
         while self._running:
             try:
                 # 获取任务
-                task_id, method, url, kwargs, callback, error_callback = self.task_queue.get(timeout=1)
+                future, method, url, kwargs, callback, error_callback = self.task_queue.get(timeout=1)
+                task_id = future.task_id
+                result = None
                 
                 try:
                     # 执行HTTP请求
@@ -74,33 +153,58 @@ class HTTPThreadingClient:
                         callback(response)
                     
                     # 存储结果
-                    with self.result_lock:
-                        self.results[task_id] = {
-                            'success': True,
-                            'response': response,
-                            'error': None
-                        }
+                    result = {
+                        'success': True,
+                        'response': response,
+                        'error': None
+                    }
+                    self._store_result(task_id, result)
                         
                 except Exception as e:
                     # 存储错误信息
-                    with self.result_lock:
-                        self.results[task_id] = {
-                            'success': False,
-                            'response': None,
-                            'error': str(e)
-                        }
+                    result = {
+                        'success': False,
+                        'response': None,
+                        'error': str(e)
+                    }
+                    self._store_result(task_id, result)
                     
                     # 调用错误回调
                     if error_callback:
                         error_callback(e)
                 
                 finally:
+                    # 回调执行完毕后再唤醒等待者
+                    future.set_result(result)
+                    del future
                     self.task_queue.task_done()
                     
             except queue.Empty:
                 continue
     
-    def _execute_request(self, method: str, url: str, **kwargs) -> httpx.Response:
+    def _store_result(self, task_id: int, result: Dict):
+        """存储任务结果，并按数量和字节上限淘汰旧结果"""
+        response = result.get('response')
+        size = len(getattr(response, 'content', b'') or b'') if response is not None else 0
+        
+        with self.result_lock:
+            self.results[task_id] = result
+            self.result_sizes[task_id] = size
+            self.retained_bytes += size
+            
+            while self.results and (len(self.results) > self.max_results
+                                    or self.retained_bytes > self.max_result_bytes):
+                old_id, _ = self.results.popitem(last=False)
+                self.retained_bytes -= self.result_sizes.pop(old_id, 0)
+    
+    def pop_result(self, task_id: int) -> Optional[Dict]:
+        """取出结果缓存中的任务结果并释放其占用"""
+        task_id = getattr(task_id, 'task_id', task_id)
+        with self.result_lock:
+            self.retained_bytes -= self.result_sizes.pop(task_id, 0)
+            return self.results.pop(task_id, None)
+    
+    def _execute_request(self, method: str, url: str, **kwargs) -> "httpx.Response":
         """执行HTTP请求"""
         # 设置默认参数
         kwargs.setdefault('timeout', self.timeout)
@@ -111,31 +215,45 @@ class HTTPThreadingClient:
             headers.update(kwargs['headers'])
         kwargs['headers'] = headers
         
-        # 使用httpx执行请求
-        with httpx.Client() as client:
-            http_method = getattr(client, method.lower())
-            return http_method(url, **kwargs)
+        # 使用共享连接池执行请求
+        return self.client.request(method.upper(), url, **kwargs)
+    
+    def stream(self, method: str, url: str, **kwargs):
+        """
+        在调用线程中发起流式请求，返回 httpx 的响应上下文管理器
+        
+        用于大文件下载，响应体通过 iter_bytes 分块读取，不经过线程池和结果缓存
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        headers = self.default_headers.copy()
+        if 'headers' in kwargs and kwargs['headers']:
+            headers.update(kwargs['headers'])
+        kwargs['headers'] = headers
+        return self.client.stream(method.upper(), url, **kwargs)
     
     def _submit_request(self, method: str, url: str, 
                        callback: Optional[Callable] = None,
                        error_callback: Optional[Callable] = None,
-                       **kwargs) -> int:
+                       **kwargs) -> RequestFuture:
         """
         提交HTTP请求到线程池
         
         Returns:
-            task_id: 任务ID，可用于查询结果
+            请求句柄，传给 wait 等待结果；句柄的 task_id 可用于 get_result 查询
         """
-        task_id = self._get_next_task_id()
+        self._ensure_threads()
+        future = RequestFuture(self._get_next_task_id())
+        with self.result_lock:
+            self.futures[future.task_id] = future
         
-        self.task_queue.put((task_id, method, url, kwargs, callback, error_callback))
-        return task_id
+        self.task_queue.put((future, method, url, kwargs, callback, error_callback))
+        return future
     
     def get(self, url: str, params: Optional[Dict] = None, 
             headers: Optional[Dict] = None, 
             callback: Optional[Callable] = None,
             error_callback: Optional[Callable] = None,
-            **kwargs) -> int:
+            **kwargs) -> RequestFuture:
         """发送GET请求"""
         kwargs.update({'params': params, 'headers': headers})
         return self._submit_request('get', url, callback, error_callback, **kwargs)
@@ -145,7 +263,7 @@ class HTTPThreadingClient:
              headers: Optional[Dict] = None,
              callback: Optional[Callable] = None,
              error_callback: Optional[Callable] = None,
-             **kwargs) -> int:
+             **kwargs) -> RequestFuture:
         """发送POST请求"""
         kwargs.update({'data': data, 'json': json, 'headers': headers})
         return self._submit_request('post', url, callback, error_callback, **kwargs)
@@ -155,7 +273,7 @@ class HTTPThreadingClient:
             headers: Optional[Dict] = None,
             callback: Optional[Callable] = None,
             error_callback: Optional[Callable] = None,
-            **kwargs) -> int:
+            **kwargs) -> RequestFuture:
         """发送PUT请求"""
         kwargs.update({'data': data, 'json': json, 'headers': headers})
         return self._submit_request('put', url, callback, error_callback, **kwargs)
@@ -163,7 +281,7 @@ class HTTPThreadingClient:
     def delete(self, url: str, headers: Optional[Dict] = None,
                callback: Optional[Callable] = None,
                error_callback: Optional[Callable] = None,
-               **kwargs) -> int:
+               **kwargs) -> RequestFuture:
         """发送DELETE请求"""
         kwargs.update({'headers': headers})
         return self._submit_request('delete', url, callback, error_callback, **kwargs)
@@ -173,7 +291,7 @@ class HTTPThreadingClient:
               headers: Optional[Dict] = None,
               callback: Optional[Callable] = None,
               error_callback: Optional[Callable] = None,
-              **kwargs) -> int:
+              **kwargs) -> RequestFuture:
         """发送PATCH请求"""
         kwargs.update({'data': data, 'json': json, 'headers': headers})
         return self._submit_request('patch', url, callback, error_callback, **kwargs)
@@ -182,7 +300,7 @@ class HTTPThreadingClient:
              headers: Optional[Dict] = None,
              callback: Optional[Callable] = None,
              error_callback: Optional[Callable] = None,
-             **kwargs) -> int:
+             **kwargs) -> RequestFuture:
         """发送HEAD请求"""
         kwargs.update({'params': params, 'headers': headers})
         return self._submit_request('head', url, callback, error_callback, **kwargs)
@@ -190,15 +308,42 @@ class HTTPThreadingClient:
     def options(self, url: str, headers: Optional[Dict] = None,
                 callback: Optional[Callable] = None,
                 error_callback: Optional[Callable] = None,
-                **kwargs) -> int:
+                **kwargs) -> RequestFuture:
         """发送OPTIONS请求"""
         kwargs.update({'headers': headers})
         return self._submit_request('options', url, callback, error_callback, **kwargs)
     
     def get_result(self, task_id: int) -> Optional[Dict]:
-        """获取任务结果"""
+        """获取结果缓存中的任务结果（可能已被淘汰，需要结果时用 wait）"""
+        task_id = getattr(task_id, 'task_id', task_id)
         with self.result_lock:
-            return self.results.get(task_id)
+            result = self.results.get(task_id)
+            if result is not None:
+                self.results.move_to_end(task_id)
+            return result
+    
+    def wait(self, task, timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        只等待指定任务完成，不受其它并发请求影响
+        
+        Args:
+            task: 提交请求时返回的句柄；也接受 task_id，但句柄已被丢弃时只能从结果缓存中取，可能已被淘汰
+        
+        Returns:
+            任务结果，格式同get_result；返回后结果缓存中不再保留
+        """
+        if isinstance(task, RequestFuture):
+            future = task
+        else:
+            with self.result_lock:
+                future = self.futures.get(task)
+            if future is None:
+                return self.pop_result(task)
+        
+        result = future.result(timeout=timeout)
+        # 结果已交给调用方，不再保留
+        self.pop_result(future.task_id)
+        return result
     
     def wait_completion(self, timeout: Optional[float] = None):
         """等待所有任务完成"""
@@ -212,6 +357,136 @@ class HTTPThreadingClient:
         # 等待线程结束
         for thread in self.threads:
             thread.join(timeout=2)
+        
+        # 关闭连接池
+        if self._client is not None:
+            self._client.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+
+class AsyncHTTPClient:
+    """
+    基于httpx.AsyncClient的异步HTTP客户端
+    
+    所有请求运行在同一个事件循环线程上，并发请求不再各占一个系统线程。
+    
+    示例：
+    >>> client = AsyncHTTPClient()
+    >>> future = client.submit(client.request('get', 'https://httpbin.org/get'))
+    >>> response = client.run(client.request('get', 'https://httpbin.org/get'))
+    """
+    
+    def __init__(self, timeout: float = 30.0,
+                default_headers: Optional[Dict] = None,
+                max_connections: int = 100,
+                max_keepalive_connections: int = 20,
+                keepalive_expiry: float = 30.0,
+                http2: bool = False):
+        """
+        初始化异步HTTP客户端，事件循环线程在首次提交时才启动
+        
+        Args:
+            timeout: 请求超时时间（秒）
+            default_headers: 默认请求头
+            max_connections: 连接池最大连接数
+            max_keepalive_connections: 连接池最大保活连接数
+            keepalive_expiry: 空闲连接保活时间（秒）
+            http2: 是否启用HTTP/2（需要安装h2）
+        """
+        self.timeout = timeout
+        self.default_headers = default_headers or {}
+        self.limits = dict(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        
+        self.loop = None
+        self.thread = None
+        self.client = None
+        self._start_lock = threading.Lock()
+    
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """启动事件循环线程"""
+        with self._start_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(
+                    target=self.loop.run_forever,
+                    name="HTTPEventLoop",
+                    daemon=True
+                )
+                self.thread.start()
+            return self.loop
+    
+    def _get_client(self) -> "httpx.AsyncClient":
+        """在事件循环线程内创建共享的httpx异步客户端"""
+        if self.client is None:
+            import httpx
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    print("[AsyncHTTPClient] h2 not installed, fallback to HTTP/1.1")
+                    http2 = False
+            self.client = httpx.AsyncClient(limits=httpx.Limits(**self.limits), http2=http2, timeout=self.timeout)
+        return self.client
+    
+    async def request(self, method: str, url: str, **kwargs) -> "httpx.Response":
+        """执行HTTP请求，需在事件循环内await"""
+        kwargs.setdefault('timeout', self.timeout)
+        
+        # 合并请求头
+        headers = self.default_headers.copy()
+        if 'headers' in kwargs and kwargs['headers']:
+            headers.update(kwargs['headers'])
+        kwargs['headers'] = headers
+        
+        return await self._get_client().request(method.upper(), url, **kwargs)
+    
+    def stream(self, method: str, url: str, **kwargs):
+        """流式请求，返回异步上下文管理器（async with），需在事件循环内使用"""
+        kwargs.setdefault('timeout', self.timeout)
+        headers = self.default_headers.copy()
+        if 'headers' in kwargs and kwargs['headers']:
+            headers.update(kwargs['headers'])
+        kwargs['headers'] = headers
+        return self._get_client().stream(method.upper(), url, **kwargs)
+    
+    def submit(self, coro: Awaitable) -> Future:
+        """
+        从任意线程提交协程到事件循环
+        
+        Returns:
+            concurrent.futures.Future，可用于等待结果或添加回调
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+    
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """提交协程并阻塞等待结果，不能在事件循环线程内调用"""
+        return self.submit(coro).result(timeout=timeout)
+    
+    def shutdown(self):
+        """关闭客户端"""
+        if self.loop is None:
+            return
+        
+        if self.client is not None:
+            self.run(self.client.aclose(), timeout=5)
+            self.client = None
+        
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2)
+        self.loop.close()
+        self.loop = None
+        self.thread = None
     
     def __enter__(self):
         return self
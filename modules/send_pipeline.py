@@ -0,0 +1,101 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Dict, Optional, Union
+
+ImageSource = Union[bytes, Callable[[], bytes]]
+
+
+def image_to_png_bytes(img) -> bytes:
+    """把 Pillow 图像编码为 PNG（剪贴板截图等），应在后台线程调用"""
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class _ImageJob:
+    __slots__ = ("chat_id", "chat_type", "upload", "done")
+
+    def __init__(self, chat_id: str, chat_type: int, upload: Future):
+        self.chat_id = chat_id
+        self.chat_type = chat_type
+        self.upload = upload
+        self.done = Future()
+
+
+class ImageSendPipeline:
+    """
+    图片上传发送流水线
+
+    准备数据（编码）、上传最多 max_parallel 张同时进行；发送由单独的线程按入队顺序逐条完成，
+    后粘贴的图片即使先上传完也会等前面的图片发出后再发送，保证聊天中的顺序与粘贴顺序一致。
+    发送线程只处理已上传完的图片，不在上传上等待。
+    """
+
+    def __init__(self, max_parallel: int = 3,
+                 upload: Optional[Callable[[bytes, str], Dict]] = None,
+                 send: Optional[Callable[[str, int, Dict], Any]] = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="ImageUpload")
+        self.sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ImageSender")
+        self._upload = upload
+        self._send = send
+        self.pending = deque()  # 按入队顺序排列、尚未交给发送线程的任务
+        self.lock = threading.Lock()
+
+    def _do_upload(self, source: ImageSource, filename: str) -> Dict:
+        data = source() if callable(source) else source
+        if self._upload is not None:
+            return self._upload(data, filename)
+        from modules.api import Api
+        return Api.UploadImage(None, data, filename)
+
+    def _do_send(self, chat_id: str, chat_type: int, img_meta: Dict):
+        if self._send is not None:
+            return self._send(chat_id, chat_type, img_meta)
+        from modules.api import Api
+        return Api.SendImageMessageFromConfig(chat_id, chat_type, img_meta)
+
+    def enqueue(self, chat_id: str, chat_type: int, source: ImageSource,
+                filename: str = "pasted_image.png") -> Future:
+        """
+        加入一张待发送的图片
+
+        Args:
+            source: 图片数据，或返回图片数据的函数（在上传线程中调用，可用于延后编码）
+
+        Returns:
+            发送完成时结束的 Future，结果为发送接口的返回值
+        """
+        job = _ImageJob(chat_id, chat_type, self.executor.submit(self._do_upload, source, filename))
+        with self.lock:
+            self.pending.append(job)
+        # 已上传完时立即回调
+        job.upload.add_done_callback(lambda _: self._dispatch_ready())
+        return job.done
+
+    def _dispatch_ready(self):
+        # 队首连续的已上传任务按顺序交给发送线程；在锁内提交，多个上传同时完成时也不会乱序
+        with self.lock:
+            while self.pending and self.pending[0].upload.done():
+                self.sender.submit(self._send_job, self.pending.popleft())
+
+    def _send_job(self, job: _ImageJob):
+        try:
+            img_meta = job.upload.result()
+            job.done.set_result(self._do_send(job.chat_id, job.chat_type, img_meta))
+        except Exception as e:
+            print(f"[ImageSendPipeline] upload/send failed: {e}")
+            job.done.set_exception(e)
+
+
+_pipeline: Optional[ImageSendPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_send_pipeline() -> ImageSendPipeline:
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = ImageSendPipeline()
+        return _pipeline
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from modules.config import CONFIG_FILE
+from modules.proto_view import as_dict
+
+# 每个账号一个数据库：私聊的 chat_id 是对方的用户ID，不同账号与同一个人的私聊会落在同一个 chat_id 上
+STORE_DIR = CONFIG_FILE.parent / "cache" / "messages"
+
+
+def _msg_seq(m: Dict) -> int:
+    try:
+        return int(m.get("msgSeq") or m.get("msg_seq") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _send_time(m: Dict) -> int:
+    try:
+        return int(m.get("sendTime") or m.get("send_time") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+# 参与全文检索的 Msg.Content 字段
+_SEARCH_FIELDS = (
+    ("text", "text"),
+    ("postTitle", "post_title"),
+    ("postContent", "post_content"),
+    ("fileName", "file_name"),
+    ("quoteMsgText", "quote_msg_text"),
+    ("callText", "call_text"),
+    ("tip", "tip"),
+)
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_CJK_RUN_RE = re.compile(f"[{_CJK}]+")
+_TOKEN_RE = re.compile(f"[{_CJK}]+|[^\\W{_CJK}]+")
+
+
+def search_tokens(text: str) -> List[str]:
+    """
+    检索分词：中日韩连续字符切成重叠的二元组，其它按单词切分
+
+    FTS5 自带的 unicode61 分词会把一整段中文当成一个词，无法按片段检索。
+    二元组之后再补上最后一个字，使任意单字都是某个词的开头，可以按前缀检索到。
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer((text or "").lower()):
+        word = match.group()
+        if _CJK_RUN_RE.fullmatch(word) and len(word) > 1:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+            tokens.append(word[-1])
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def _search_body(m: Dict) -> str:
+    content = m.get("content") or {}
+    parts = []
+    for camel, snake in _SEARCH_FIELDS:
+        value = content.get(camel) or content.get(snake)
+        if value:
+            parts.extend(search_tokens(str(value)))
+    return " ".join(parts)
+
+
+def _search_rowid(chat_id: str, msg_id: str) -> int:
+    # FTS 表用稳定的 63 位哈希作为 rowid，重复写入时直接覆盖
+    digest = hashlib.blake2b(f"{chat_id}\0{msg_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+def _match_query(query: str) -> str:
+    """把用户输入转成 FTS5 MATCH 表达式，每个空格分隔的词作为一个短语"""
+    phrases = []
+    for word in (query or "").split():
+        tokens = search_tokens(word)
+        if not tokens:
+            continue
+        last = _TOKEN_RE.findall(word.lower())[-1]
+        if _CJK_RUN_RE.fullmatch(last) and len(last) > 1:
+            # 查询词结尾的汉字在原文中不一定在一段的末尾，去掉补上的单字，只按二元组匹配
+            tokens.pop()
+        phrase = '"' + " ".join(tokens) + '"'
+        # 结尾是单个汉字或英文词时按前缀匹配
+        if len(tokens[-1]) == 1 or not _CJK_RUN_RE.fullmatch(tokens[-1]):
+            phrase += " *"
+        phrases.append(phrase)
+    return " AND ".join(phrases)
+
+
+class MessageStore:
+    """
+    本地消息缓存（SQLite, WAL）
+
+    以 chat_id + msg_id 为主键保存 Api.MessageList 返回的单条消息字典，
+    按 chat_id + msg_seq 建索引用于翻页和连续性判断。
+    """
+
+    def __init__(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                chat_id   TEXT    NOT NULL,
+                msg_id    TEXT    NOT NULL,
+                msg_seq   INTEGER NOT NULL,
+                send_time INTEGER NOT NULL,
+                data      TEXT    NOT NULL,
+                PRIMARY KEY (chat_id, msg_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_messages_seq ON messages (chat_id, msg_seq);
+            """
+        )
+        try:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts "
+                "USING fts5(chat_id UNINDEXED, msg_id UNINDEXED, body)"
+            )
+            self.search_enabled = True
+        except sqlite3.OperationalError as e:
+            print(f"[MessageStore] FTS5 unavailable, search disabled: {e}")
+            self.search_enabled = False
+        self.conn.commit()
+
+    def put_messages(self, chat_id: str, msgs: List[Dict]):
+        """写入（或覆盖）一批消息"""
+        rows = []
+        search_rows = []
+        for m in msgs:
+            msg_id = m.get("msgId") or m.get("msg_id")
+            if not msg_id:
+                continue
+            rows.append((chat_id, msg_id, _msg_seq(m), _send_time(m), json.dumps(as_dict(m), ensure_ascii=False)))
+            if self.search_enabled:
+                body = _search_body(m)
+                if body:
+                    search_rows.append((_search_rowid(chat_id, msg_id), chat_id, msg_id, body))
+        if not rows:
+            return
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO messages (chat_id, msg_id, msg_seq, send_time, data) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            if search_rows:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO messages_fts (rowid, chat_id, msg_id, body) VALUES (?, ?, ?, ?)",
+                    search_rows,
+                )
+            self.conn.commit()
+
+    def latest(self, chat_id: str, count: int = 50) -> List[Dict]:
+        """最新的 count 条消息，新的在前（与服务端返回顺序一致）"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data FROM messages WHERE chat_id = ? ORDER BY msg_seq DESC LIMIT ?",
+                (chat_id, count),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get_seq(self, chat_id: str, msg_id: str) -> Optional[int]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT msg_seq FROM messages WHERE chat_id = ? AND msg_id = ?",
+                (chat_id, msg_id),
+            ).fetchone()
+        return row[0] if row else None
+
+    def before(self, chat_id: str, msg_id: str, count: int = 50) -> Optional[List[Dict]]:
+        """
+        msg_id 之前的 count 条消息，新的在前
+
+        Returns:
+            只有本地连续（msg_seq 无空洞）且条数足够时才返回列表，否则返回 None
+        """
+        seq = self.get_seq(chat_id, msg_id)
+        if not seq:
+            return None
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT msg_seq, data FROM messages WHERE chat_id = ? AND msg_seq < ? AND msg_seq >= ? "
+                "ORDER BY msg_seq DESC",
+                (chat_id, seq, seq - count),
+            ).fetchall()
+        if len(rows) != count or rows[-1][0] != seq - count:
+            return None
+        return [json.loads(r[1]) for r in rows]
+
+    def seq_ranges(self, chat_id: str) -> List[Tuple[int, int]]:
+        """本地已有的连续 msg_seq 区间 [(起, 止), ...]，按 msg_seq 升序"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT MIN(msg_seq), MAX(msg_seq) FROM ("
+                "  SELECT msg_seq, msg_seq - ROW_NUMBER() OVER (ORDER BY msg_seq) AS grp"
+                "  FROM (SELECT DISTINCT msg_seq FROM messages WHERE chat_id = ? AND msg_seq > 0)"
+                ") GROUP BY grp ORDER BY 1",
+                (chat_id,),
+            ).fetchall()
+        return [(r[0], r[1]) for r in rows]
+
+    def search(self, query: str, chat_id: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """
+        全文检索已缓存的消息
+
+        Returns:
+            按相关度排序的命中列表，每项包含 chat_id, msg_id, score 和消息字典 msg
+        """
+        match = _match_query(query)
+        if not match or not self.search_enabled:
+            return []
+
+        sql = (
+            "SELECT f.chat_id, f.msg_id, bm25(messages_fts) AS score, m.data "
+            "FROM messages_fts AS f JOIN messages AS m ON m.chat_id = f.chat_id AND m.msg_id = f.msg_id "
+            "WHERE messages_fts MATCH ?"
+        )
+        params = [match]
+        if chat_id:
+            sql += " AND f.chat_id = ?"
+            params.append(chat_id)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [
+            {"chat_id": r[0], "msg_id": r[1], "score": r[2], "msg": json.loads(r[3])}
+            for r in rows
+        ]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def store_path(user_id: str) -> Path:
+    """user_id 对应的数据库文件"""
+    return STORE_DIR / f"{hashlib.blake2b(user_id.encode('utf-8'), digest_size=16).hexdigest()}.db"
+
+
+_store: Optional[MessageStore] = None
+_owner: Optional[Tuple[str, str]] = None  # 当前账号 (user_id, token)
+_store_lock = threading.Lock()
+
+
+def use_message_store(user_id: str, token: str):
+    """登录后绑定当前账号的消息缓存，换了账号时关闭上一个账号的数据库"""
+    global _store, _owner
+    if not user_id:
+        raise Exception("用户ID为空")
+    with _store_lock:
+        old = None
+        if _owner is None or _owner[0] != user_id:
+            old, _store = _store, None
+        _owner = (user_id, token)
+    if old is not None:
+        old.close()
+
+
+def close_message_store():
+    """退出登录时关闭当前账号的消息缓存，重新绑定账号前 get_message_store 会失败"""
+    global _store, _owner
+    with _store_lock:
+        old, _store, _owner = _store, None, None
+    if old is not None:
+        old.close()
+
+
+def get_message_store(token: Optional[str] = None) -> MessageStore:
+    """
+    当前账号的消息缓存，首次使用时打开数据库
+
+    Args:
+        token: 数据所属的登录凭证；与当前账号不一致（请求发出后换了账号）时抛出异常，避免写进别的账号
+    """
+    global _store
+    with _store_lock:
+        if _owner is None:
+            raise Exception("消息缓存未绑定账号")
+        if token is not None and token != _owner[1]:
+            raise Exception("消息缓存已切换到其它账号")
+        if _store is None:
+            _store = MessageStore(store_path(_owner[0]))
+        return _store
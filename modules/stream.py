@@ -0,0 +1,144 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from modules.ws import WsClient, WsEvent, _import_ws_pb2
+
+
+class _Stream:
+    __slots__ = ("msg_id", "chat_id", "recv_id", "chunks", "size", "last_time", "dirty")
+
+    def __init__(self, msg_id: str, chat_id: str, recv_id: str):
+        self.msg_id = msg_id
+        self.chat_id = chat_id
+        self.recv_id = recv_id
+        self.chunks = []
+        self.size = 0
+        self.last_time = time.monotonic()
+        self.dirty = False
+
+    def append(self, chunk: str):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        self.last_time = time.monotonic()
+        self.dirty = True
+
+    def text(self) -> str:
+        # 合并成一块，避免分片列表无限增长
+        if len(self.chunks) > 1:
+            self.chunks = ["".join(self.chunks)]
+        return self.chunks[0] if self.chunks else ""
+
+
+class StreamAssembler:
+    """
+    机器人流式消息 (stream_message) 拼装器
+
+    按 msg_id 追加分片，以固定帧率合并回调 on_update(msg_id, chat_id, text)，
+    收到同 msg_id 的 push_message 视为结束；超时无新分片的流会被清理，
+    并把已收到的文本作为普通 push_message 事件重新分发。
+    所有方法都应在 WsClient 所在的事件循环线程中调用。
+    """
+
+    def __init__(self, on_update: Callable[[str, str, str], None],
+                 frame_interval: float = 1 / 15,
+                 idle_timeout: float = 30.0,
+                 max_streams: int = 64,
+                 max_chars: int = 1024 * 1024):
+        self.on_update = on_update
+        self.frame_interval = frame_interval
+        self.idle_timeout = idle_timeout
+        self.max_streams = max_streams
+        self.max_chars = max_chars
+
+        self.streams = OrderedDict()  # msg_id -> _Stream，按最近活跃排序
+        self.client: Optional[WsClient] = None
+        self._flush_handle = None
+        self._unsubscribes = []
+
+    def attach(self, client: WsClient):
+        self.client = client
+        self._unsubscribes = [
+            client.subscribe("stream_message", self._on_stream_event),
+            client.subscribe("push_message", self._on_push_event),
+        ]
+
+    def detach(self):
+        for unsubscribe in self._unsubscribes:
+            unsubscribe()
+        self._unsubscribes = []
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self.streams.clear()
+
+    def _on_stream_event(self, event: WsEvent):
+        m = event.msg.data.msg
+        self.feed(m.msg_id, m.chat_id, m.recv_id, m.content)
+
+    def _on_push_event(self, event: WsEvent):
+        # 最终消息已经作为普通消息推送，丢弃对应缓冲
+        self.streams.pop(event.msg.data.msg.msg_id, None)
+
+    def feed(self, msg_id: str, chat_id: str, recv_id: str, chunk: str):
+        stream = self.streams.get(msg_id)
+        if stream is None:
+            stream = _Stream(msg_id, chat_id, recv_id)
+            self.streams[msg_id] = stream
+            while len(self.streams) > self.max_streams:
+                _, oldest = self.streams.popitem(last=False)
+                self._emit_final(oldest)
+        else:
+            self.streams.move_to_end(msg_id)
+
+        if stream.size + len(chunk) > self.max_chars:
+            chunk = chunk[:max(0, self.max_chars - stream.size)]
+        if chunk:
+            stream.append(chunk)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        loop = asyncio.get_running_loop()
+        when = loop.time() + self.frame_interval
+        if self._flush_handle is not None:
+            if self._flush_handle.when() <= when:
+                return
+            # 当前只挂着较晚的空闲检查，提前到下一帧
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_at(when, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        now = time.monotonic()
+
+        for msg_id, stream in list(self.streams.items()):
+            if stream.dirty:
+                stream.dirty = False
+                try:
+                    self.on_update(msg_id, stream.chat_id, stream.text())
+                except Exception as e:
+                    print(f"[StreamAssembler] update callback error: {e}")
+            elif now - stream.last_time > self.idle_timeout:
+                del self.streams[msg_id]
+                self._emit_final(stream)
+
+        if self.streams:
+            # 没有新分片时只需定期检查空闲超时；新分片到达时 _schedule_flush 会把它提前到下一帧
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(min(self.idle_timeout, 1.0), self._flush)
+
+    def _emit_final(self, stream: _Stream):
+        """把被放弃的流当作普通消息重新分发给界面；流式分片里没有发送者等字段，不写入本地缓存"""
+        if self.client is None:
+            return
+        ws_pb2, _ = _import_ws_pb2()
+        push = ws_pb2.push_message()
+        push.info.cmd = "push_message"
+        push.data.msg.msg_id = stream.msg_id
+        push.data.msg.chat_id = stream.chat_id
+        push.data.msg.recv_id = stream.recv_id
+        push.data.msg.content_type = 1
+        push.data.msg.content.text = stream.text()
+        push.data.msg.timestamp = int(time.time() * 1000)
+        self.client.dispatch(WsEvent(cmd="push_message", seq="", msg=push, synthetic=True))
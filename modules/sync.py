@@ -0,0 +1,114 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+from modules.async_api import AsyncApi
+from modules.store import MessageStore, _msg_seq, get_message_store
+
+
+def missing_ranges(ranges: List[Tuple[int, int]], lo: int, hi: int) -> List[Tuple[int, int]]:
+    """在 [lo, hi] 内，不被 ranges 覆盖的 msg_seq 区间"""
+    holes = []
+    cursor = lo
+    for start, end in ranges:
+        if end < cursor:
+            continue
+        if start > hi:
+            break
+        if start > cursor:
+            holes.append((cursor, min(start - 1, hi)))
+        cursor = max(cursor, end + 1)
+    if cursor <= hi:
+        holes.append((cursor, hi))
+    return holes
+
+
+class HistorySync:
+    """
+    按 msg_seq 补齐本地消息缓存中的空洞
+
+    本地已缓存的消息按 msg_seq 归并成连续区间，只对区间之间缺失的部分
+    调用 list-message-by-seq，多个空洞并行拉取，并发数受 max_concurrency 限制。
+    每次只补最新 window 条 msg_seq 以内的空洞（离正在查看的消息最近），从新到旧，
+    拉取总量不超过 max_messages；同一会话已有同步在进行时直接跳过。
+    必须在 aio_session 的事件循环中 await。
+    """
+
+    # 正在同步的会话，只在事件循环线程中访问
+    _running = set()
+
+    def __init__(self, store: Optional[MessageStore] = None, max_concurrency: int = 4,
+                 window: int = 1000, max_messages: int = 500):
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self.window = window
+        self.max_messages = max_messages
+
+    def _store(self) -> MessageStore:
+        return self.store or get_message_store()
+
+    async def _fill_range(self, token: str, chat_id: str, chat_type: int, lo: int, hi: int,
+                          sem: asyncio.Semaphore, budget: List[int]) -> int:
+        fetched = 0
+        # 预算不够补完整个空洞时，只补靠近 hi（较新）的一段
+        seq = max(lo, hi - budget[0] + 1)
+        while seq <= hi and budget[0] > 0:
+            async with sem:
+                if budget[0] <= 0:
+                    break
+                data = await AsyncApi.MessageListBySeq(token, chat_id, chat_type, seq)
+            seqs = [_msg_seq(m) for m in (data.get("msg") or [])]
+            fetched += len(seqs)
+            budget[0] -= len(seqs)
+            # 服务器没有更多消息，或没有推进，避免死循环
+            if not seqs or max(seqs) < seq:
+                break
+            seq = max(seqs) + 1
+        return fetched
+
+    async def sync(self, chat_id: str, chat_type: int, lo: Optional[int] = None,
+                   hi: Optional[int] = None, token: Optional[str] = None) -> int:
+        """
+        补齐 [lo, hi] 之间缺失的消息，默认范围为本地最新的 msg_seq 往前 window 条
+
+        Returns:
+            实际拉取的消息条数；同一会话正在同步时返回 0
+        """
+        if chat_id in HistorySync._running:
+            print(f"[HistorySync] {chat_id}: sync already running, skipped")
+            return 0
+        HistorySync._running.add(chat_id)
+        try:
+            return await self._sync(chat_id, chat_type, lo, hi, token)
+        finally:
+            HistorySync._running.discard(chat_id)
+
+    async def _sync(self, chat_id: str, chat_type: int, lo: Optional[int], hi: Optional[int],
+                    token: Optional[str]) -> int:
+        loop = asyncio.get_running_loop()
+        ranges = await loop.run_in_executor(None, self._store().seq_ranges, chat_id)
+        if not ranges and (lo is None or hi is None):
+            return 0
+        hi = ranges[-1][1] if hi is None else hi
+        lo = max(ranges[0][0], hi - self.window + 1) if lo is None else lo
+
+        # 从新到旧，预算用完时优先保证靠近当前查看位置的消息
+        holes = list(reversed(missing_ranges(ranges, lo, hi)))
+        if not holes:
+            return 0
+
+        token = token or AsyncApi._token_from_config()
+        print(f"[HistorySync] {chat_id}: filling {len(holes)} gaps in [{lo}, {hi}]")
+        sem = asyncio.Semaphore(self.max_concurrency)
+        budget = [self.max_messages]
+        results = await asyncio.gather(
+            *(self._fill_range(token, chat_id, int(chat_type), a, b, sem, budget) for a, b in holes),
+            return_exceptions=True,
+        )
+
+        fetched = 0
+        for r in results:
+            if isinstance(r, Exception):
+                print(f"[HistorySync] {chat_id}: gap fill failed: {r}")
+            else:
+                fetched += r
+        return fetched
@@ -0,0 +1,100 @@
+import math
+import re
+import sys
+import threading
+from typing import Optional
+
+# 各显示位置的逻辑尺寸（与页面 XAML 中的控件尺寸一致）
+CONVERSATION_AVATAR = 36
+MESSAGE_AVATAR = 32
+HOME_AVATAR = 48
+MESSAGE_IMAGE_WIDTH = 300
+
+# 请求的像素尺寸向上取到这些档位，同一张图在不同位置、不同缩放下只缓存少数几个版本
+_SIZE_BUCKETS = (48, 64, 96, 128, 192, 256, 384, 512, 768, 1024, 1536, 2048)
+
+_PROCESSING_RE = re.compile(r"[?&]imageView2/[^&]*")
+
+_scale: Optional[float] = None
+_scale_lock = threading.Lock()
+
+
+def display_scale() -> float:
+    """
+    显示缩放比例（1.0 = 96 DPI）
+
+    可通过配置项 display_scale 覆盖；Windows 下读取系统 DPI，其它平台为 1.0。
+    """
+    global _scale
+    with _scale_lock:
+        if _scale is None:
+            from modules.config import Config
+            scale = Config().get("display_scale")
+            if not scale and sys.platform == "win32":
+                try:
+                    import ctypes
+                    scale = ctypes.windll.user32.GetDpiForSystem() / 96.0
+                except Exception as e:
+                    print(f"[thumbnail] read system dpi failed: {e}")
+            _scale = float(scale or 1.0)
+        return _scale
+
+
+def _bucket(pixels: int) -> int:
+    for size in _SIZE_BUCKETS:
+        if size >= pixels:
+            return size
+    return _SIZE_BUCKETS[-1]
+
+
+def original_url(url: str) -> str:
+    """去掉 url 上已有的七牛 imageView2 处理参数"""
+    if not url:
+        return ""
+    stripped = _PROCESSING_RE.sub("", url)
+    if "?" not in stripped and "&" in stripped:
+        stripped = stripped.replace("&", "?", 1)
+    return stripped
+
+
+def thumbnail_url(url: str, width: int, height: Optional[int] = None, scale: Optional[float] = None,
+                  source_width: int = 0, source_height: int = 0) -> str:
+    """
+    按显示位置的逻辑尺寸生成七牛缩略图地址
+
+    Args:
+        width, height: 显示位置的逻辑尺寸；只给 width 时按宽度等比缩放，给出两者时等比缩放到该矩形以内
+        scale: 显示缩放比例，None 时使用 display_scale()
+        source_width, source_height: 原图尺寸（如 Msg.Content.width/height），原图不大于目标档位时直接使用原图
+
+    Returns:
+        带 imageView2 参数的地址；不需要缩放时返回原图地址
+    """
+    if not url:
+        return ""
+    url = original_url(url)
+    scale = display_scale() if scale is None else scale
+
+    w = _bucket(math.ceil(width * scale))
+    h = _bucket(math.ceil(height * scale)) if height else 0
+    if source_width and source_width <= w and (not h or (source_height and source_height <= h)):
+        return url
+
+    op = f"imageView2/2/w/{w}/h/{h}" if h else f"imageView2/2/w/{w}"
+    return url + ("&" if "?" in url else "?") + op
+
+
+def avatar_url(url: str, size: int) -> str:
+    """头像缩略图地址，size 为显示的逻辑边长"""
+    return thumbnail_url(url, size, size)
+
+
+def message_image_url(url: str, content: Optional[dict] = None) -> str:
+    """消息图片缩略图地址，content 为消息的 content 字典，用其中的原图尺寸避免放大请求"""
+    content = content or {}
+    try:
+        source_width = int(content.get("width") or 0)
+        source_height = int(content.get("height") or 0)
+    except (TypeError, ValueError):
+        source_width = source_height = 0
+    return thumbnail_url(url, MESSAGE_IMAGE_WIDTH, source_width=source_width, source_height=source_height)
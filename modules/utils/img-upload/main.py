@@ -1,8 +1,9 @@
+import argparse
 import json
 import os
 import sys
 
-from qiniu_uploader import load_config, upload_image
+from qiniu_uploader import batch_upload, expand_inputs, load_config, upload_image
 
 
 def _prompt_input() -> str:
@@ -10,7 +11,44 @@ def _prompt_input() -> str:
     return s
 
 
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="上传图片到七牛；不带参数时交互输入单张图片")
+    parser.add_argument("inputs", nargs="*", help="图片路径、目录、通配符、URL 或 @列表文件")
+    parser.add_argument("--quality", type=int, help="webp 质量（覆盖 webp_quality）")
+    parser.add_argument("--method", type=int, help="webp 压缩方法 0-6（覆盖 webp_method）")
+    parser.add_argument("--max-dimension", type=int, help="长边上限像素，0 表示不缩放（覆盖 max_dimension）")
+    parser.add_argument("--workers", type=int, help="转码进程数，默认 CPU 核心数（覆盖 workers）")
+    parser.add_argument("--upload-concurrency", type=int, help="并发上传数（覆盖 upload_concurrency）")
+    return parser.parse_args(argv)
+
+
+def _run_batch(inputs, upload_kwargs, workers, upload_concurrency) -> int:
+    sources = expand_inputs(inputs)
+    if not sources:
+        print("没有找到要上传的图片")
+        return 1
+
+    def progress(done, total, source, error):
+        if error is None:
+            print(f"[{done}/{total}] 上传成功: {source}")
+        else:
+            print(f"[{done}/{total}] 上传失败: {source}: {error}")
+
+    try:
+        report = batch_upload(
+            sources, workers=workers, upload_concurrency=upload_concurrency, progress=progress, **upload_kwargs
+        )
+    except Exception as e:
+        print(f"批量上传失败: {e}")
+        return 1
+
+    print(f"完成: 成功 {len(report.results)} 张，失败 {len(report.failures)} 张")
+    print(f"总耗时: {report.elapsed:.2f}s，速度: {report.images_per_sec:.2f} 张/秒")
+    return 0 if not report.failures else 1
+
+
 def main() -> int:
+    args = _parse_args(sys.argv[1:])
     base_dir = os.path.dirname(os.path.abspath(__file__))
     config_path = os.path.join(base_dir, "config.json")
 
@@ -29,24 +67,34 @@ def main() -> int:
         return 1
 
     enable_webp = bool(cfg.get("enable_webp", True))
-    webp_quality = int(cfg.get("webp_quality", 95))
+    webp_quality = args.quality or int(cfg.get("webp_quality", 95))
+    webp_method = args.method if args.method is not None else int(cfg.get("webp_method", 6))
+    max_dimension = args.max_dimension if args.max_dimension is not None else int(cfg.get("max_dimension", 0))
     bucket = str(cfg.get("bucket", "chat68"))
     qiniu_token_url = str(cfg.get("qiniu_token_url", "https://chat-go.jwzhd.com/v1/misc/qiniu-token"))
 
+    upload_kwargs = dict(
+        user_token=user_token,
+        enable_webp=enable_webp,
+        webp_quality=webp_quality,
+        webp_method=webp_method,
+        max_dimension=max_dimension,
+        bucket=bucket,
+        qiniu_token_url=qiniu_token_url,
+    )
+
+    if args.inputs:
+        workers = args.workers or int(cfg.get("workers", 0)) or None
+        upload_concurrency = args.upload_concurrency or int(cfg.get("upload_concurrency", 4))
+        return _run_batch(args.inputs, upload_kwargs, workers, upload_concurrency)
+
     path_or_url = _prompt_input()
     if not path_or_url:
         print("未输入图片地址")
         return 1
 
     try:
-        result = upload_image(
-            path_or_url=path_or_url,
-            user_token=user_token,
-            enable_webp=enable_webp,
-            webp_quality=webp_quality,
-            bucket=bucket,
-            qiniu_token_url=qiniu_token_url,
-        )
+        result = upload_image(path_or_url=path_or_url, **upload_kwargs)
     except Exception as e:
         print(f"上传失败: {e}")
         return 1
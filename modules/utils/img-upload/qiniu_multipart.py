@@ -0,0 +1,475 @@
+"""
+七牛上传凭证缓存与分片上传
+
+与主程序 modules/qiniu.py 的实现相同，复制到这里使本工具可以单独运行；
+缓存和进度记录保存在本工具目录下，不与主程序共用。
+"""
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+DEFAULT_UPLOAD_HOST = "upload-z2.qiniup.com"
+DEFAULT_PART_SIZE = 4 * 1024 * 1024
+# 小于该大小的文件直接用表单上传，分片上传多出的两次请求不划算
+MULTIPART_THRESHOLD = 4 * 1024 * 1024
+
+# send(method, url, headers, body, timeout) -> 响应对象（需有 status_code / text / json()）
+# requests 的响应满足要求
+SendFunc = Callable[[str, str, Dict[str, str], Optional[bytes], float], Any]
+
+
+def _b64decode(s: str) -> bytes:
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+
+def parse_upload_token(upload_token: str) -> Dict[str, Any]:
+    """
+    解析七牛上传凭证中的上传策略（ak:签名:base64(策略JSON)）
+
+    Returns:
+        策略字典，额外带上 ak 和从 scope 中拆出的 bucket
+    """
+    try:
+        ak, _, encoded_policy = upload_token.split(":", 2)
+        policy = json.loads(_b64decode(encoded_policy))
+    except (ValueError, TypeError) as e:
+        raise Exception(f"无法解析七牛上传凭证: {e}")
+    policy["ak"] = ak
+    policy["bucket"] = str(policy.get("scope") or "").split(":", 1)[0]
+    return policy
+
+
+def _requests_send(method: str, url: str, headers: Dict[str, str], body: Optional[bytes], timeout: float):
+    import requests
+    headers = dict(headers, **{"user-agent": "QiniuDart"})
+    return requests.request(method, url, headers=headers, data=body, timeout=timeout)
+
+
+def query_upload_host(upload_token: str, bucket: str = "", send: Optional[SendFunc] = None,
+                      timeout: float = 10.0) -> Tuple[str, float]:
+    """
+    查询 bucket 所在区域的上传域名
+
+    Returns:
+        (域名, 有效期秒数)；查询失败时返回默认域名和较短的有效期
+    """
+    policy = parse_upload_token(upload_token)
+    bucket = bucket or policy["bucket"]
+    url = f"https://api.qiniu.com/v4/query?ak={policy['ak']}&bucket={bucket}"
+    try:
+        resp = (send or _requests_send)("GET", url, {}, None, timeout)
+        if resp.status_code != 200:
+            raise Exception(f"status {resp.status_code}")
+        hosts = resp.json().get("hosts") or []
+        if hosts:
+            first = hosts[0] or {}
+            domains = (first.get("up") or {}).get("domains") or []
+            if domains:
+                return domains[0], float(first.get("ttl") or 86400)
+    except Exception as e:
+        print(f"[qiniu] query upload host failed: {e}")
+    return DEFAULT_UPLOAD_HOST, 600.0
+
+
+class UploadTokenCache:
+    """
+    七牛上传凭证与上传域名缓存
+
+    凭证的过期时间从其上传策略的 deadline 中解析；距过期不足 refresh_margin 秒时
+    先返回旧凭证并在后台线程中刷新，已过期时同步获取，同一用户的并发调用只获取一次。
+    上传域名按 ak + bucket 缓存。
+    缓存同时写入 path 指向的文件，重启后继续使用。
+    """
+
+    def __init__(self, path: Optional[Path] = None, refresh_margin: float = 300.0):
+        self.path = Path(path) if path else None
+        self.refresh_margin = refresh_margin
+        self.lock = threading.Lock()
+        self.tokens: Dict[str, Tuple[str, float]] = {}  # sha1(用户token) -> (上传凭证, deadline)
+        self.hosts: Dict[str, Tuple[str, float]] = {}  # "ak/bucket" -> (域名, 过期时间)
+        self._refreshing = set()
+        self._fetching: Dict[str, Future] = {}  # sha1(用户token) -> 正在同步获取的凭证
+        self._load()
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.tokens = {k: tuple(v) for k, v in (data.get("tokens") or {}).items()}
+            self.hosts = {k: tuple(v) for k, v in (data.get("hosts") or {}).items()}
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[UploadTokenCache] load failed: {e}")
+
+    def _save(self):
+        # 调用方需持有 self.lock
+        if self.path is None:
+            return
+        now = time.time()
+        data = {
+            "tokens": {k: v for k, v in self.tokens.items() if v[1] > now},
+            "hosts": {k: v for k, v in self.hosts.items() if v[1] > now},
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[UploadTokenCache] save failed: {e}")
+
+    @staticmethod
+    def _user_key(user_token: str) -> str:
+        return hashlib.sha1(user_token.encode("utf-8")).hexdigest()
+
+    def _store_token(self, user_key: str, upload_token: str):
+        try:
+            deadline = float(parse_upload_token(upload_token).get("deadline") or 0)
+        except Exception:
+            deadline = 0
+        # 解析不到 deadline 时按 1 小时处理
+        deadline = deadline or time.time() + 3600
+        with self.lock:
+            self.tokens[user_key] = (upload_token, deadline)
+            self._save()
+
+    def _refresh_in_background(self, user_key: str, user_token: str, fetch: Callable[[str], str]):
+        with self.lock:
+            if user_key in self._refreshing:
+                return
+            self._refreshing.add(user_key)
+
+        def run():
+            try:
+                self._store_token(user_key, fetch(user_token))
+            except Exception as e:
+                print(f"[UploadTokenCache] background refresh failed: {e}")
+            finally:
+                with self.lock:
+                    self._refreshing.discard(user_key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get_token(self, user_token: str, fetch: Callable[[str], str]) -> str:
+        """
+        返回有效的上传凭证
+
+        Args:
+            fetch: fetch(user_token) -> 上传凭证，缓存不可用时调用
+        """
+        user_key = self._user_key(user_token)
+        with self.lock:
+            cached = self.tokens.get(user_key)
+            now = time.time()
+            # 留出一次上传所需的时间，快过期的凭证不再使用
+            usable = cached is not None and cached[1] - now > 60
+            if not usable:
+                # 同一用户的并发请求只获取一次，其余等待同一结果
+                future = self._fetching.get(user_key)
+                is_owner = future is None
+                if is_owner:
+                    future = Future()
+                    self._fetching[user_key] = future
+        if usable:
+            if cached[1] - now < self.refresh_margin:
+                self._refresh_in_background(user_key, user_token, fetch)
+            return cached[0]
+        if not is_owner:
+            return future.result()
+
+        try:
+            upload_token = fetch(user_token)
+            self._store_token(user_key, upload_token)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self._fetching.pop(user_key, None)
+        future.set_result(upload_token)
+        return upload_token
+
+    def invalidate(self, user_token: str):
+        """七牛拒绝凭证时调用，下次重新获取"""
+        with self.lock:
+            self.tokens.pop(self._user_key(user_token), None)
+            self._save()
+
+    def get_upload_host(self, upload_token: str, bucket: str = "", send: Optional[SendFunc] = None) -> str:
+        policy = parse_upload_token(upload_token)
+        host_key = f"{policy['ak']}/{bucket or policy['bucket']}"
+        with self.lock:
+            cached = self.hosts.get(host_key)
+        if cached and cached[1] > time.time():
+            return cached[0]
+
+        host, ttl = query_upload_host(upload_token, bucket, send)
+        with self.lock:
+            self.hosts[host_key] = (host, time.time() + ttl)
+            self._save()
+        return host
+
+
+class _Journal:
+    """
+    分片上传进度记录
+
+    保存 uploadId 和已完成分片的 etag，写入时先写临时文件再替换，进程中断后可据此续传。
+    """
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data: Dict[str, Any] = {}
+
+    def load(self, fingerprint: str) -> Dict[str, Any]:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        # 文件内容、分片大小或 uploadId 过期时不能续传
+        if data.get("fingerprint") != fingerprint or data.get("expire_at", 0) <= time.time() + 60:
+            return {}
+        self.data = data
+        return data
+
+    def save(self, **updates):
+        with self.lock:
+            self.data.update(updates)
+            if self.path is None:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(self.data, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+
+    def part_done(self, part_number: int, etag: str):
+        with self.lock:
+            parts = dict(self.data.get("parts") or {})
+            parts[str(part_number)] = etag
+        self.save(parts=parts)
+
+    def remove(self):
+        if self.path is not None:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class _ResumeFailed(Exception):
+    pass
+
+
+class _RequestFailed(Exception):
+    """分片上传请求最终失败；status_code 为最后一次响应的状态码，网络错误时为 None"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class MultipartUploader:
+    """
+    七牛分片上传（v2 / resumable upload）
+
+    流程：初始化得到 uploadId → 多个线程并行上传分片（每片失败单独重试）→ 按分片号合并。
+    进度写入 journal_dir 下的记录文件，中断后用相同内容、相同 key 再次上传时跳过已完成的分片。
+    数据可以是 bytes 或文件路径；传入路径时按分片读取，不会把整个文件读进内存。
+    """
+
+    def __init__(self, upload_token: str, host: str = DEFAULT_UPLOAD_HOST,
+                 send: Optional[SendFunc] = None,
+                 part_size: int = DEFAULT_PART_SIZE,
+                 concurrency: int = 4,
+                 retries: int = 3,
+                 timeout: float = 60.0,
+                 journal_dir: Optional[Path] = None,
+                 scheme: str = "https"):
+        if part_size < 1024 * 1024:
+            raise ValueError("七牛分片大小不能小于 1MB")
+        self.upload_token = upload_token
+        self.bucket = parse_upload_token(upload_token)["bucket"]
+        self.base_url = host if "://" in host else f"{scheme}://{host}"
+        self.send = send or _requests_send
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.retries = retries
+        self.timeout = timeout
+        self.journal_dir = journal_dir
+
+    def _headers(self, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        headers = {"Authorization": f"UpToken {self.upload_token}"}
+        if extra:
+            headers.update(extra)
+        return headers
+
+    def _object_url(self, key: str) -> str:
+        encoded_key = base64.urlsafe_b64encode(key.encode("utf-8")).decode() if key else "~"
+        return f"{self.base_url}/buckets/{self.bucket}/objects/{encoded_key}/uploads"
+
+    def _call(self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes]) -> Dict:
+        last_error = None
+        last_status = None
+        for attempt in range(self.retries):
+            try:
+                resp = self.send(method, url, headers, body, self.timeout)
+                if 200 <= resp.status_code < 300:
+                    return resp.json()
+                last_error = f"{resp.status_code} {resp.text}"
+                last_status = resp.status_code
+                # 4xx（除 408/429）和 612 不是临时错误，不必重试
+                if _is_permanent(resp.status_code):
+                    break
+            except Exception as e:
+                last_error = str(e)
+                last_status = None
+            if attempt + 1 < self.retries:
+                time.sleep(min(0.5 * 2 ** attempt, 4.0))
+        raise _RequestFailed(f"七牛分片上传请求失败: {method} {url}: {last_error}", last_status)
+
+    @staticmethod
+    def _fingerprint(source: Union[bytes, str, Path], size: int, key: str, part_size: int) -> str:
+        h = hashlib.sha1(f"{key}\0{size}\0{part_size}\0".encode("utf-8"))
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            h.update(source)
+        else:
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+        return h.hexdigest()
+
+    def upload(self, source: Union[bytes, str, Path], key: str,
+               mime_type: str = "application/octet-stream", fname: str = "",
+               progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        上传 source 到 key，返回七牛合并分片的响应（与表单上传的响应一致）
+
+        Args:
+            progress: progress(已上传字节, 总字节)，在上传线程中调用
+        """
+        try:
+            return self._upload(source, key, mime_type, fname, progress, resume=True)
+        except _ResumeFailed as e:
+            # 服务端的 uploadId 已失效等情况，丢弃进度从头上传
+            print(f"[MultipartUploader] resume failed, restarting {key}: {e}")
+            return self._upload(source, key, mime_type, fname, progress, resume=False)
+
+    def _upload(self, source, key: str, mime_type: str, fname: str,
+                progress: Optional[Callable[[int, int], None]], resume: bool) -> Dict:
+        is_bytes = isinstance(source, (bytes, bytearray, memoryview))
+        size = len(source) if is_bytes else os.path.getsize(source)
+        part_count = max(1, -(-size // self.part_size))
+        if part_count > 10000:
+            raise Exception("分片数量超过七牛上限 10000，请增大分片大小")
+
+        fingerprint = self._fingerprint(source, size, key, self.part_size)
+        journal = _Journal(self.journal_dir / f"{fingerprint}.json" if self.journal_dir else None)
+        state = journal.load(fingerprint) if resume else {}
+        object_url = self._object_url(key)
+
+        if state.get("upload_id"):
+            upload_id = state["upload_id"]
+            print(f"[MultipartUploader] resume {key}: {len(state.get('parts') or {})}/{part_count} parts done")
+        else:
+            init = self._call("POST", object_url, self._headers(), None)
+            upload_id = init["uploadId"]
+            journal.save(fingerprint=fingerprint, upload_id=upload_id,
+                         expire_at=init.get("expireAt") or time.time() + 7 * 24 * 3600, parts={})
+
+        done_parts = {int(n): etag for n, etag in (journal.data.get("parts") or {}).items()}
+        uploaded = [sum(min(self.part_size, size - (n - 1) * self.part_size) for n in done_parts)]
+        progress_lock = threading.Lock()
+        if progress is not None:
+            progress(uploaded[0], size)
+
+        def read_part(part_number: int) -> bytes:
+            offset = (part_number - 1) * self.part_size
+            if is_bytes:
+                return bytes(memoryview(source)[offset:offset + self.part_size])
+            with open(source, "rb") as f:
+                f.seek(offset)
+                return f.read(self.part_size)
+
+        def upload_part(part_number: int) -> str:
+            data = read_part(part_number)
+            result = self._call(
+                "PUT",
+                f"{object_url}/{upload_id}/{part_number}",
+                self._headers({
+                    "Content-Type": "application/octet-stream",
+                    "Content-MD5": hashlib.md5(data).hexdigest(),
+                }),
+                data,
+            )
+            etag = result["etag"]
+            journal.part_done(part_number, etag)
+            if progress is not None:
+                with progress_lock:
+                    uploaded[0] += len(data)
+                    progress(uploaded[0], size)
+            return etag
+
+        completing = False
+        try:
+            pending = [n for n in range(1, part_count + 1) if n not in done_parts]
+            if pending:
+                with ThreadPoolExecutor(max_workers=min(self.concurrency, len(pending))) as executor:
+                    for part_number, etag in zip(pending, executor.map(upload_part, pending)):
+                        done_parts[part_number] = etag
+
+            body = {
+                "parts": [{"partNumber": n, "etag": done_parts[n]} for n in sorted(done_parts)],
+                "fname": fname or key,
+                "mimeType": mime_type,
+            }
+            completing = True
+            result = self._call(
+                "POST",
+                f"{object_url}/{upload_id}",
+                self._headers({"Content-Type": "application/json"}),
+                json.dumps(body).encode("utf-8"),
+            )
+        except Exception as e:
+            if state.get("upload_id") and _upload_id_rejected(e, completing):
+                journal.remove()
+                raise _ResumeFailed(str(e))
+            # 网络错误、5xx 等临时失败保留进度记录，下次上传同样的内容时续传
+            raise
+        journal.remove()
+        return result
+
+
+def _is_permanent(status_code: int) -> bool:
+    return (400 <= status_code < 500 and status_code not in (408, 429)) or status_code == 612
+
+
+def _upload_id_rejected(error: Exception, completing: bool) -> bool:
+    """
+    续传失败是否因为记录的 uploadId 已不可用（需要丢弃进度从头上传）
+
+    上传分片时只有 404 / 612（uploadId 不存在或已过期）算作失效；
+    合并分片时服务端拒绝（非鉴权类的 4xx）说明已上传的分片不能再用。
+    """
+    status = getattr(error, "status_code", None)
+    if status in (404, 612):
+        return True
+    return completing and status is not None and _is_permanent(status) and status not in (401, 403)
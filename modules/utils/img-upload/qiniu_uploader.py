@@ -1,16 +1,50 @@
+import glob
 import hashlib
 import json
 import mimetypes
 import os
-from dataclasses import dataclass
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
 from io import BytesIO
-from typing import Any, Dict, Optional, Tuple
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import requests
 from PIL import Image
 
+from qiniu_multipart import MULTIPART_THRESHOLD, MultipartUploader, UploadTokenCache
+from upload_ledger import UploadLedger
+
 
 DEFAULT_UPLOAD_HOST = "upload-z2.qiniup.com"
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload_journal")
+LEDGER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload_ledger.db")
+TOKEN_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload_token_cache.json")
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tif", ".tiff"}
+
+_ledger: Optional[UploadLedger] = None
+_ledger_lock = threading.Lock()
+_token_cache: Optional[UploadTokenCache] = None
+_token_cache_lock = threading.Lock()
+
+
+def _get_ledger() -> UploadLedger:
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UploadLedger(Path(LEDGER_FILE))
+        return _ledger
+
+
+def _get_token_cache() -> UploadTokenCache:
+    global _token_cache
+    with _token_cache_lock:
+        if _token_cache is None:
+            _token_cache = UploadTokenCache(Path(TOKEN_CACHE_FILE))
+        return _token_cache
 
 
 @dataclass
@@ -21,6 +55,16 @@ class UploadResult:
     raw: Dict[str, Any]
 
 
+@dataclass
+class PreparedImage:
+    """读取/转码完成、等待上传的图片（可在进程间传递）"""
+    source: str
+    name: str
+    data: bytes
+    key: str
+    mime_type: str
+
+
 def load_config(config_path: str) -> Dict[str, Any]:
     with open(config_path, "r", encoding="utf-8") as f:
         return json.load(f)
@@ -49,8 +93,12 @@ def _read_input_bytes(path_or_url: str, timeout: int = 60) -> Tuple[bytes, str,
     return data, name, mime
 
 
-def _to_webp(image_bytes: bytes, quality: int) -> bytes:
+def _to_webp(image_bytes: bytes, quality: int, method: int = 6, max_dimension: int = 0) -> bytes:
     img = Image.open(BytesIO(image_bytes))
+    if max_dimension and max(img.size) > max_dimension:
+        # draft 让 JPEG 直接按缩小后的尺寸解码
+        img.draft("RGB", (max_dimension, max_dimension))
+        img.thumbnail((max_dimension, max_dimension))
     if img.mode in ("RGBA", "LA"):
         background = Image.new("RGBA", img.size, (255, 255, 255, 255))
         background.paste(img, mask=img.split()[-1])
@@ -59,7 +107,7 @@ def _to_webp(image_bytes: bytes, quality: int) -> bytes:
         img = img.convert("RGB")
 
     out = BytesIO()
-    img.save(out, format="WEBP", quality=quality, method=6)
+    img.save(out, format="WEBP", quality=quality, method=method)
     return out.getvalue()
 
 
@@ -67,7 +115,19 @@ def _md5_hex(b: bytes) -> str:
     return hashlib.md5(b).hexdigest()
 
 
+def _requests_send(method: str, url: str, headers: Dict[str, str], body: Optional[bytes], timeout: float):
+    headers = dict(headers, **{"user-agent": "QiniuDart"})
+    return requests.request(method, url, headers=headers, data=body, timeout=timeout)
+
+
 def get_qiniu_upload_token(user_token: str, qiniu_token_url: str, timeout: int = 60) -> str:
+    """获取上传凭证，缓存在本工具目录下，未过期时不发请求"""
+    return _get_token_cache().get_token(
+        user_token, lambda t: _fetch_qiniu_upload_token(t, qiniu_token_url, timeout)
+    )
+
+
+def _fetch_qiniu_upload_token(user_token: str, qiniu_token_url: str, timeout: int = 60) -> str:
     resp = requests.get(
         qiniu_token_url,
         headers={"token": user_token, "Content-Type": "application/json"},
@@ -85,36 +145,26 @@ def get_qiniu_upload_token(user_token: str, qiniu_token_url: str, timeout: int =
 
 
 def query_upload_host(upload_token: str, bucket: str, timeout: int = 60) -> str:
-    ak = upload_token.split(":")[0]
-    url = f"https://api.qiniu.com/v4/query?ak={ak}&bucket={bucket}"
+    """查询上传域名，结果按 ak + bucket 缓存"""
     try:
-        resp = requests.get(url, timeout=timeout)
-        resp.raise_for_status()
-        payload = resp.json()
-        hosts = payload.get("hosts") or []
-        if not hosts:
-            return DEFAULT_UPLOAD_HOST
-        up = (hosts[0] or {}).get("up") or {}
-        domains = up.get("domains") or []
-        return domains[0] if domains else DEFAULT_UPLOAD_HOST
+        return _get_token_cache().get_upload_host(upload_token, bucket, send=_requests_send)
     except Exception:
         return DEFAULT_UPLOAD_HOST
 
 
-def upload_image(
-    *,
+def prepare_image(
     path_or_url: str,
-    user_token: str,
     enable_webp: bool,
     webp_quality: int,
-    bucket: str,
-    qiniu_token_url: str,
+    webp_method: int = 6,
+    max_dimension: int = 0,
     timeout: int = 120,
-) -> UploadResult:
+) -> PreparedImage:
+    """读取并（按需）转码图片，计算对象 key；不访问七牛，可在进程池中运行"""
     original_bytes, original_name, original_mime = _read_input_bytes(path_or_url, timeout=timeout)
 
     if enable_webp:
-        upload_bytes = _to_webp(original_bytes, quality=webp_quality)
+        upload_bytes = _to_webp(original_bytes, quality=webp_quality, method=webp_method, max_dimension=max_dimension)
         mime_type = "image/webp"
         extension = "webp"
     else:
@@ -124,11 +174,69 @@ def upload_image(
         extension = ext if ext else (mimetypes.guess_extension(mime_type) or "bin").lstrip(".")
 
     md5 = _md5_hex(upload_bytes)
-    key = f"{md5}.{extension}"
+    return PreparedImage(path_or_url, original_name, upload_bytes, f"{md5}.{extension}", mime_type)
+
+
+def upload_image(
+    *,
+    path_or_url: str,
+    user_token: str,
+    enable_webp: bool,
+    webp_quality: int,
+    bucket: str,
+    qiniu_token_url: str,
+    webp_method: int = 6,
+    max_dimension: int = 0,
+    timeout: int = 120,
+) -> UploadResult:
+    prepared = prepare_image(path_or_url, enable_webp, webp_quality, webp_method, max_dimension, timeout)
+    return upload_prepared(
+        prepared, user_token=user_token, bucket=bucket, qiniu_token_url=qiniu_token_url, timeout=timeout
+    )
+
+
+def upload_prepared(
+    prepared: PreparedImage,
+    *,
+    user_token: str,
+    bucket: str,
+    qiniu_token_url: str,
+    timeout: int = 120,
+) -> UploadResult:
+    upload_bytes = prepared.data
+    key = prepared.key
+    mime_type = prepared.mime_type
+    original_name = prepared.name
+
+    # 同一 bucket 中相同内容上传过则直接复用结果
+    ledger_key = f"{bucket}/{key}"
+    cached = _get_ledger().get(ledger_key)
+    if cached:
+        return UploadResult(**cached)
 
     utoken = get_qiniu_upload_token(user_token=user_token, qiniu_token_url=qiniu_token_url, timeout=timeout)
     host = query_upload_host(upload_token=utoken, bucket=bucket, timeout=timeout)
 
+    if len(upload_bytes) >= MULTIPART_THRESHOLD:
+        # 大文件分片并行上传，中断后重新运行会从进度记录续传
+        uploader = MultipartUploader(
+            utoken, host=host, send=_requests_send, timeout=timeout, journal_dir=Path(JOURNAL_DIR)
+        )
+        payload = uploader.upload(upload_bytes, key, mime_type=mime_type, fname=original_name)
+    else:
+        payload = _form_upload(host, utoken, key, upload_bytes, mime_type, timeout)
+
+    result = UploadResult(
+        key=str(payload.get("key", "")),
+        hash=str(payload.get("hash", "")),
+        fsize=int(payload.get("fsize", 0) or len(upload_bytes)),
+        raw=payload,
+    )
+    _get_ledger().put(ledger_key, asdict(result))
+    return result
+
+
+def _form_upload(host: str, utoken: str, key: str, upload_bytes: bytes, mime_type: str, timeout: int) -> Dict[str, Any]:
     upload_url = f"https://{host}"
 
     data = {"token": utoken, "key": key}
@@ -143,11 +251,144 @@ def upload_image(
     )
     if resp.status_code < 200 or resp.status_code >= 300:
         raise RuntimeError(f"qiniu upload failed: {resp.status_code} {resp.text}")
+    return resp.json()
 
-    payload = resp.json()
-    return UploadResult(
-        key=str(payload.get("key", "")),
-        hash=str(payload.get("hash", "")),
-        fsize=int(payload.get("fsize", 0)),
-        raw=payload,
-    )
+
+@dataclass
+class BatchReport:
+    results: List[Tuple[str, UploadResult]] = field(default_factory=list)
+    failures: List[Tuple[str, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def images_per_sec(self) -> float:
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+
+def expand_inputs(items: Iterable[str]) -> List[str]:
+    """
+    展开批量输入：目录（递归查找图片）、通配符、@列表文件（每行一个路径或URL）、URL 或单个文件路径
+    """
+    out: List[str] = []
+    seen = set()
+
+    def add(s: str):
+        if s and s not in seen:
+            seen.add(s)
+            out.append(s)
+
+    for item in items:
+        item = item.strip()
+        if not item:
+            continue
+        if _is_url(item):
+            add(item)
+        elif item.startswith("@"):
+            with open(item[1:], "r", encoding="utf-8") as f:
+                lines = [line.strip() for line in f]
+            for sub in expand_inputs(line for line in lines if line and not line.startswith("#")):
+                add(sub)
+        elif os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                        add(os.path.join(root, name))
+        elif glob.has_magic(item):
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path):
+                    add(path)
+        else:
+            add(item)
+    return out
+
+
+def batch_upload(
+    inputs: List[str],
+    *,
+    user_token: str,
+    bucket: str,
+    qiniu_token_url: str,
+    enable_webp: bool,
+    webp_quality: int,
+    webp_method: int = 6,
+    max_dimension: int = 0,
+    workers: Optional[int] = None,
+    upload_concurrency: int = 4,
+    queue_size: int = 0,
+    timeout: int = 120,
+    progress: Optional[Callable[[int, int, str, Optional[str]], None]] = None,
+) -> BatchReport:
+    """
+    批量上传
+
+    读取/转码在进程池中进行（默认占满所有 CPU 核心），上传由 upload_concurrency 个线程完成，
+    两者通过容量为 queue_size 的队列衔接：队列满时暂停提交转码，内存中最多只有这么多张待上传的图片。
+
+    Args:
+        progress: 每张图片完成时调用 progress(done, total, source, error)，error 为 None 表示成功
+    """
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or workers * 2
+    report = BatchReport()
+    total = len(inputs)
+    if not total:
+        return report
+
+    # 先取一次上传凭证和上传域名，避免各上传线程同时请求
+    utoken = get_qiniu_upload_token(user_token=user_token, qiniu_token_url=qiniu_token_url, timeout=timeout)
+    query_upload_host(upload_token=utoken, bucket=bucket, timeout=timeout)
+
+    pending: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def finish(source: str, result: Optional[UploadResult], error: Optional[str]):
+        with lock:
+            if error is None:
+                report.results.append((source, result))
+            else:
+                report.failures.append((source, error))
+            done = len(report.results) + len(report.failures)
+        if progress is not None:
+            progress(done, total, source, error)
+
+    def produce(pool: ProcessPoolExecutor):
+        try:
+            for source in inputs:
+                fut = pool.submit(
+                    prepare_image, source, enable_webp, webp_quality, webp_method, max_dimension, timeout
+                )
+                pending.put((source, fut))
+        finally:
+            for _ in range(upload_concurrency):
+                pending.put(None)
+
+    def consume():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            source, fut = item
+            try:
+                prepared = fut.result()
+                result = upload_prepared(
+                    prepared, user_token=user_token, bucket=bucket, qiniu_token_url=qiniu_token_url, timeout=timeout
+                )
+            except Exception as e:
+                finish(source, None, str(e))
+            else:
+                finish(source, result, None)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        uploaders = [
+            threading.Thread(target=consume, name=f"BatchUpload-{i}", daemon=True)
+            for i in range(upload_concurrency)
+        ]
+        for t in uploaders:
+            t.start()
+        produce(pool)
+        for t in uploaders:
+            t.join()
+
+    report.elapsed = time.perf_counter() - started
+    return report
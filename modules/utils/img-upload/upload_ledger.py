@@ -0,0 +1,67 @@
+"""
+已上传文件记录，与主程序 modules/upload_ledger.py 相同，复制到这里使本工具可以单独运行
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+DEFAULT_TTL = 30 * 24 * 3600
+
+
+class UploadLedger:
+    """
+    已上传文件记录
+
+    以对象 key（内容 md5 + 扩展名）为键保存上传结果，再次上传相同内容时直接复用，
+    不再请求上传凭证和七牛。记录超过 ttl 秒后视为失效（服务端对象可能已被清理）。
+    """
+
+    def __init__(self, path: Path, ttl: float = DEFAULT_TTL):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS uploads (
+                key         TEXT PRIMARY KEY,
+                meta        TEXT NOT NULL,
+                uploaded_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("DELETE FROM uploads WHERE uploaded_at < ?", (time.time() - ttl,))
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """未过期时返回上次上传的结果，否则返回 None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT meta, uploaded_at FROM uploads WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time() - self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, meta: Dict):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO uploads (key, meta, uploaded_at) VALUES (?, ?, ?)",
+                (key, json.dumps(meta, ensure_ascii=False), time.time()),
+            )
+            self.conn.commit()
+
+    def discard(self, key: str):
+        """服务端对象失效（例如发送时报错）时删除记录，下次重新上传"""
+        with self.lock:
+            self.conn.execute("DELETE FROM uploads WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
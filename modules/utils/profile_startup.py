@@ -0,0 +1,225 @@
+"""
+无界面启动耗时分析
+
+把 win32more 换成空壳模块（不创建窗口），在已登录状态下依次执行：
+导入 main.py → LoginApp.OnLaunched → 构造 HomePage，
+记录每一步在 UI 线程上的耗时、此时已导入的重型模块和线程数，以及首屏数据全部返回的时间。
+网络请求不出本机：httpx 的传输层被替换为固定延迟的空响应。
+
+用法:
+    python modules/utils/profile_startup.py [--root 仓库目录] [--latency 0.2] [--runs 5]
+
+对比改动前后时，可以用 git worktree 检出旧版本，再用 --root 指向它。
+"""
+import argparse
+import importlib.abc
+import importlib.machinery
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+
+HEAVY_MODULES = ("httpx", "PIL", "google.protobuf", "numpy", "login", "home", "chat", "modules.api")
+
+
+class _StubMeta(type):
+    def __getattr__(cls, name):
+        return _Stub()
+
+
+class _Stub(metaclass=_StubMeta):
+    """任意属性、调用、继承都可以的占位对象"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return _Stub()
+
+    def __call__(self, *args, **kwargs):
+        return _Stub()
+
+    def __iter__(self):
+        return iter(())
+
+    def __iadd__(self, handler):
+        # 事件订阅：root.Loaded += handler
+        return self
+
+    @staticmethod
+    def Start(app_class):
+        pass
+
+
+class _StubModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        cls = _StubMeta(name, (_Stub,), {})
+        setattr(self, name, cls)
+        return cls
+
+
+class _StubFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """win32more 及其子模块都返回空壳模块"""
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname == "win32more" or fullname.startswith("win32more."):
+            return importlib.machinery.ModuleSpec(fullname, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        return _StubModule(spec.name)
+
+    def exec_module(self, module):
+        module.__path__ = []
+
+
+class _OfflineHttpx(importlib.abc.MetaPathFinder):
+    """httpx 被导入后把传输层替换为固定延迟的空响应，不影响 httpx 本身的导入耗时"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != "httpx":
+            return None
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            spec = finder.find_spec(fullname, path, target) if hasattr(finder, "find_spec") else None
+            if spec is not None:
+                exec_module = spec.loader.exec_module
+
+                def exec_and_patch(module):
+                    exec_module(module)
+                    self._patch(module)
+                spec.loader.exec_module = exec_and_patch
+                return spec
+        return None
+
+    def _count(self):
+        with self.lock:
+            self.requests += 1
+
+    def _patch(self, httpx):
+        latency = self.latency
+
+        def handle_request(transport, request):
+            self._count()
+            time.sleep(latency)
+            return httpx.Response(200, content=b"", request=request)
+
+        async def handle_async_request(transport, request):
+            import asyncio
+            self._count()
+            await asyncio.sleep(latency)
+            return httpx.Response(200, content=b"", request=request)
+
+        httpx.HTTPTransport.handle_request = handle_request
+        httpx.AsyncHTTPTransport.handle_async_request = handle_async_request
+
+
+def _loaded(names):
+    return [name for name in names if name in sys.modules]
+
+
+def profile_once(root: str, latency: float) -> dict:
+    """在当前进程中执行一次，需在全新的解释器里调用"""
+    home = tempfile.mkdtemp(prefix="lakeneko-profile-")
+    os.environ["HOME"] = os.environ["USERPROFILE"] = home
+    config_dir = os.path.join(home, "AppData", "Roaming", "yhchat-winui3")
+    os.makedirs(config_dir)
+    with open(os.path.join(config_dir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump({"token": "profile-token"}, f)
+
+    sys.path[:] = [p for p in sys.path if os.path.abspath(p or ".") != os.path.dirname(os.path.abspath(__file__))]
+    sys.path.insert(0, root)
+    os.chdir(root)
+    offline = _OfflineHttpx(latency)
+    sys.meta_path[:0] = [_StubFinder(), offline]
+    threads_before = threading.active_count()
+    result = {}
+
+    start = time.perf_counter()
+    import main
+    result["import_main"] = time.perf_counter() - start
+    result["modules_after_import"] = _loaded(HEAVY_MODULES)
+
+    app = main.LoginApp()
+    start = time.perf_counter()
+    app.OnLaunched(None)
+    result["on_launched"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from home import HomePage
+    HomePage(app)
+    result["home_page"] = time.perf_counter() - start
+    result["ui_blocked"] = result["import_main"] + result["on_launched"] + result["home_page"]
+    result["modules_after_home"] = _loaded(HEAVY_MODULES)
+    result["threads_started"] = threading.active_count() - threads_before
+
+    # 首屏数据（用户信息、头像、会话列表）全部返回的时间；旧版本在 UI 线程上同步请求，已包含在上面
+    boot = sys.modules.get("modules.boot")
+    fetches = boot.get_boot_fetches() if boot is not None and hasattr(boot, "get_boot_fetches") else None
+    if fetches is not None:
+        for future in (fetches.user_info, fetches.avatar, fetches.conversations):
+            if future is None:
+                continue
+            try:
+                future.result(timeout=30)
+            except Exception:
+                pass
+    result["boot_data_ready"] = time.perf_counter() - start + result["import_main"] + result["on_launched"]
+    result["requests"] = offline.requests
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无界面启动耗时分析")
+    parser.add_argument("--root", default=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                        help="要分析的仓库目录（main.py 所在目录）")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟的每个请求的网络延迟（秒）")
+    parser.add_argument("--runs", type=int, default=5, help="重复次数，每次使用新的进程")
+    parser.add_argument("--once", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+
+    if args.once:
+        # 页面里的 print 输出到 stderr，stdout 只留结果
+        real_stdout, sys.stdout = sys.stdout, sys.stderr
+        result = profile_once(root, args.latency)
+        real_stdout.write(json.dumps(result) + "\n")
+        real_stdout.flush()
+        os._exit(0)
+
+    results = []
+    for _ in range(args.runs):
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--once", "--root", root, "--latency", str(args.latency)],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=120,
+        )
+        if proc.returncode != 0 or not proc.stdout.strip():
+            raise Exception(f"分析进程失败（退出码 {proc.returncode}）")
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"root: {root}  latency: {args.latency}s  runs: {args.runs}")
+    for key in ("import_main", "on_launched", "home_page", "ui_blocked", "boot_data_ready"):
+        values = [r[key] * 1000 for r in results]
+        print(f"  {key:<16} median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms")
+    last = results[-1]
+    print(f"  requests         {last['requests']}")
+    print(f"  threads started  {last['threads_started']}")
+    print(f"  after import:    {', '.join(last['modules_after_import']) or '-'}")
+    print(f"  after HomePage:  {', '.join(last['modules_after_home']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from modules.async_api import AsyncApi, aio_session
+
+WS_URL = "wss://chat-ws-go.jwzhd.com/ws"
+
+# INFO.cmd -> chat_ws_go_pb2 中对应的消息类型名
+_CMD_TYPES = {
+    "heartbeat_ack": "heartbeat_ack",
+    "push_message": "push_message",
+    "edit_message": "edit_message",
+    "file_send_message": "file_send_message",
+    "draft_input": "draft_input",
+    "bot_board_message": "bot_board_message",
+    "stream_message": "stream_message",
+}
+
+
+@dataclass
+class WsEvent:
+    cmd: str
+    seq: str
+    msg: Any  # 按 cmd 解析后的 protobuf 对象
+    synthetic: bool = False  # 本地拼出的事件（如放弃的流式消息），不是服务器推送的完整消息
+
+
+def _import_ws_pb2():
+    from google.protobuf import json_format
+    from modules.proto import chat_ws_go_pb2
+    return chat_ws_go_pb2, json_format
+
+
+def decode_frame(frame: bytes) -> Optional[WsEvent]:
+    """按 INFO.cmd 把一帧数据解析成对应类型的事件，未知 cmd 返回 None"""
+    ws_pb2, _ = _import_ws_pb2()
+    # 所有下行消息的第1个字段都是 INFO，先只解析它拿到 cmd
+    head = ws_pb2.heartbeat_ack()
+    head.ParseFromString(frame)
+    cmd = head.info.cmd
+
+    type_name = _CMD_TYPES.get(cmd)
+    if type_name is None:
+        return None
+    if type_name == "heartbeat_ack":
+        return WsEvent(cmd=cmd, seq=head.info.seq, msg=head)
+
+    msg = getattr(ws_pb2, type_name)()
+    msg.ParseFromString(frame)
+    return WsEvent(cmd=cmd, seq=head.info.seq, msg=msg)
+
+
+def ws_msg_to_dict(ws_msg, user_id: str = "") -> Dict:
+    """把 WsMsg 转成与 Api.MessageList 中单条消息一致的字典格式"""
+    _, json_format = _import_ws_pb2()
+    data = json_format.MessageToDict(ws_msg)
+    if "timestamp" in data:
+        data["sendTime"] = data.pop("timestamp")
+    sender_id = (data.get("sender") or {}).get("chatId")
+    data["direction"] = "right" if user_id and sender_id == user_id else "left"
+    return data
+
+
+def ws_msg_chat_id(m: Dict, user_id: str = "") -> str:
+    """
+    ws_msg_to_dict 结果对应的会话ID
+
+    私聊消息的 chat_id 指向接收者：别人发来的按发送者归属，
+    自己（其他设备）发出的按接收者 recvId 归属。
+    """
+    if int(m.get("chatType") or 0) == 1:
+        sender_id = (m.get("sender") or {}).get("chatId") or ""
+        if user_id and sender_id == user_id:
+            return m.get("recvId") or m.get("chatId") or ""
+        return sender_id
+    return m.get("chatId") or ""
+
+
+# 推送消息的写库线程：SQLite 写入和检索索引更新不占用事件循环；只有一个线程，保证编辑晚于原消息写入
+_store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="WsStore")
+
+
+def _put_pushed(token: str, chat_id: str, m: Dict):
+    try:
+        from modules.store import get_message_store
+        get_message_store(token).put_messages(chat_id, [m])
+    except Exception as e:
+        print(f"[WsClient] store pushed message failed: {e}")
+
+
+def _store_pushed(event: WsEvent, user_id: str, token: str):
+    """把推送/编辑的消息交给写库线程写入本地缓存，使检索索引随消息到达增量更新"""
+    if event.synthetic:
+        # 缺少发送者、会话类型和序号，写入后会污染缓存；完整消息在下次拉取时再写入
+        return
+    try:
+        m = ws_msg_to_dict(event.msg.data.msg, user_id)
+        chat_id = ws_msg_chat_id(m, user_id)
+        if chat_id:
+            _store_executor.submit(_put_pushed, token, chat_id, m)
+    except Exception as e:
+        print(f"[WsClient] store pushed message failed: {e}")
+
+
+class WsClient:
+    """
+    chat-ws-go 长连接客户端
+
+    运行在 aio_session 的事件循环上：登录、定时心跳、断线重连，
+    并把收到的帧按 cmd 分发给订阅者。订阅回调在事件循环线程中执行，需尽快返回。
+    """
+
+    def __init__(self, token: str, user_id: str,
+                 device_id: str = "yunhu-device-id-winui3-app",
+                 platform: str = "windows",
+                 url: str = WS_URL,
+                 heartbeat_interval: float = 30.0,
+                 reconnect_delay: float = 3.0):
+        self.token = token
+        self.user_id = user_id
+        self.device_id = device_id
+        self.platform = platform
+        self.url = url
+        self.heartbeat_interval = heartbeat_interval
+        self.reconnect_delay = reconnect_delay
+
+        self._subscribers: Dict[str, List[Callable]] = {}
+        self._running = False
+        self._future = None
+
+    def subscribe(self, cmd: str, callback: Callable[[WsEvent], None]) -> Callable[[], None]:
+        """
+        订阅指定 cmd 的事件，cmd 为 "*" 时接收全部事件
+
+        Returns:
+            取消订阅的函数
+        """
+        self._subscribers.setdefault(cmd, []).append(callback)
+
+        def unsubscribe():
+            callbacks = self._subscribers.get(cmd) or []
+            if callback in callbacks:
+                callbacks.remove(callback)
+        return unsubscribe
+
+    def dispatch(self, event: WsEvent):
+        for callback in list(self._subscribers.get(event.cmd, [])) + list(self._subscribers.get("*", [])):
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"[WsClient] subscriber error for {event.cmd}: {e}")
+
+    def _packet(self, cmd: str, data: Dict) -> str:
+        return json.dumps({"seq": uuid.uuid4().hex, "cmd": cmd, "data": data})
+
+    async def _heartbeat(self, ws):
+        while self._running:
+            await asyncio.sleep(self.heartbeat_interval)
+            await ws.send(self._packet("heartbeat", {}))
+
+    async def _run_once(self):
+        import websockets
+
+        async with websockets.connect(self.url, max_size=None) as ws:
+            await ws.send(self._packet("login", {
+                "userId": self.user_id,
+                "token": self.token,
+                "platform": self.platform,
+                "deviceId": self.device_id,
+            }))
+            print("[WsClient] connected")
+            heartbeat = asyncio.ensure_future(self._heartbeat(ws))
+            try:
+                async for frame in ws:
+                    if isinstance(frame, str):
+                        continue
+                    try:
+                        event = decode_frame(frame)
+                    except Exception as e:
+                        print(f"[WsClient] decode failed: {e}")
+                        continue
+                    if event is not None:
+                        self.dispatch(event)
+            finally:
+                heartbeat.cancel()
+
+    async def _run(self):
+        while self._running:
+            try:
+                await self._run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WsClient] connection error: {e}")
+            if self._running:
+                await asyncio.sleep(self.reconnect_delay)
+
+    def start(self):
+        """在 aio_session 的事件循环上启动连接"""
+        if self._running:
+            return
+        self._running = True
+        self._future = aio_session.submit(self._run())
+
+    def stop(self):
+        self._running = False
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+
+
+# 全局长连接及其 token；正在建立的连接为 (token, Task)。只在 aio_session 的事件循环线程中访问
+_shared_client: Optional[WsClient] = None
+_connecting = None
+
+
+async def _connect(token: str) -> WsClient:
+    global _shared_client
+    info = await AsyncApi.UserInfo(token)
+    user_id = (info.get("data") or {}).get("id") or ""
+    if not user_id:
+        raise Exception("获取用户ID失败")
+
+    # 本地消息缓存切换到该账号；关闭旧数据库可能要等写入完成，不在事件循环上做
+    from modules.store import use_message_store
+    await asyncio.get_running_loop().run_in_executor(_store_executor, use_message_store, user_id, token)
+
+    client = WsClient(token, user_id)
+    for cmd in ("push_message", "edit_message"):
+        client.subscribe(cmd, lambda event: _store_pushed(event, user_id, token))
+    client.start()
+    _shared_client = client
+    return client
+
+
+async def connect_from_config() -> WsClient:
+    """
+    用配置中的 token 建立（或复用）全局长连接
+
+    token 变化（换了账号登录）时先停止旧连接；并发调用共用同一次建立过程。
+    """
+    global _shared_client, _connecting
+    token = AsyncApi._token_from_config()
+    if _shared_client is not None and _shared_client.token == token:
+        return _shared_client
+
+    if _connecting is None or _connecting[0] != token:
+        if _connecting is not None:
+            _connecting[1].cancel()
+        if _shared_client is not None:
+            _shared_client.stop()
+            _shared_client = None
+        _connecting = (token, asyncio.ensure_future(_connect(token)))
+
+    task = _connecting[1]
+    try:
+        return await asyncio.shield(task)
+    finally:
+        if _connecting is not None and _connecting[1] is task and task.done():
+            _connecting = None
+
+
+def _disconnect():
+    global _shared_client, _connecting
+    if _connecting is not None:
+        _connecting[1].cancel()
+        _connecting = None
+    if _shared_client is not None:
+        _shared_client.stop()
+        _shared_client = None
+
+
+def disconnect_shared():
+    """退出登录时调用：停止全局长连接（可在任意线程调用）"""
+    if aio_session.loop is not None:
+        aio_session.loop.call_soon_threadsafe(_disconnect)
@@ -0,0 +1,150 @@
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 配置文件和各类缓存都放在 ~/AppData/Roaming/yhchat-winui3 下，测试期间指向临时目录，不碰真实数据
+os.environ["HOME"] = tempfile.mkdtemp(prefix="lakeneko-test-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubServer:
+    """
+    本地 HTTP 测试服务器
+
+    handle(method, path, headers, body) 返回 (status, headers, body)；body 也可以是分块的可迭代对象，
+    此时 headers 中需要给出 Content-Length。收到的请求按顺序记录在 requests 中，
+    建立的 TCP（TLS）连接数记录在 connections 中。传入 cert=(证书, 私钥) 时使用 HTTPS。
+    """
+
+    def __init__(self, handle, cert=None):
+        self.handle = handle
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 响应头和响应体分两次写出，开启 Nagle 时保活连接上的每个请求都会多等 40ms 的延迟确认
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                with server.lock:
+                    server.connections += 1
+                super().setup()
+
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                with server.lock:
+                    server.requests.append((self.command, self.path, dict(self.headers)))
+                status, headers, payload = server.handle(self.command, self.path, self.headers, body)
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                if isinstance(payload, bytes):
+                    self.send_header("Content-Length", str(len(payload)))
+                    payload = [payload]
+                self.end_headers()
+                if self.command != "HEAD":
+                    for chunk in payload:
+                        self.wfile.write(chunk)
+
+            do_GET = do_POST = do_PUT = do_HEAD = _serve
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # 默认的 listen 队列只有 5，突发的并发连接会被重置
+            request_queue_size = 128
+
+        self.httpd = Server(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        scheme = "http"
+        if cert is not None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*cert)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+            scheme = "https"
+        self.url = f"{scheme}://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def count(self, method=None, path=None) -> int:
+        with self.lock:
+            return sum(1 for m, p, _ in self.requests
+                       if (method is None or m == method) and (path is None or p == path))
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def local_session(server, **kwargs):
+    """
+    所有请求都改发到 server 的 HTTPThreadingClient（保留路径和查询参数），用来替换 modules.api.session
+
+    包括直接使用 session.client 的请求（七牛表单上传、上传域名查询）。
+    """
+    import httpx
+    from modules.req import HTTPThreadingClient
+
+    target = httpx.URL(server.url)
+
+    class LocalSession(HTTPThreadingClient):
+        def _create_client(self):
+            client = super()._create_client()
+
+            def rewrite(request):
+                request.url = request.url.copy_with(scheme=target.scheme, host=target.host, port=target.port)
+            client.event_hooks["request"].append(rewrite)
+            return client
+
+    return LocalSession(**kwargs)
+
+
+@pytest.fixture(scope="session")
+def tls_cert(tmp_path_factory):
+    """127.0.0.1 的自签名证书 (证书, 私钥)，需要 openssl 命令"""
+    directory = tmp_path_factory.mktemp("tls")
+    cert, key = str(directory / "cert.pem"), str(directory / "key.pem")
+    try:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert,
+             "-days", "1", "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"],
+            check=True, capture_output=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        pytest.skip(f"无法生成测试证书: {e}")
+    return cert, key
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(handle, cert=None):
+        server = StubServer(handle, cert)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def message_store(tmp_path, monkeypatch):
+    """绑定到测试账号（token 为 "t"）的消息缓存，数据库放在临时目录"""
+    from modules import store
+    monkeypatch.setattr(store, "STORE_DIR", tmp_path / "messages")
+    store.use_message_store("test-user", "t")
+    yield store.get_message_store()
+    store.close_message_store()
@@ -0,0 +1,131 @@
+import threading
+
+from modules.api import Api
+from modules.async_api import AsyncApi, aio_session
+
+
+class _Resp:
+    status_code = 200
+
+    def __init__(self, content: bytes):
+        self.content = content
+        self.headers = {}
+
+
+def _page(*seqs) -> bytes:
+    from modules.proto import msg_pb2
+    page = msg_pb2.list_message()
+    for seq in seqs:
+        m = page.msg.add()
+        m.msg_id = f"m{seq}"
+        m.msg_seq = seq
+    return page.SerializeToString()
+
+
+def test_message_pages_are_stored_off_the_event_loop(monkeypatch):
+    threads = []
+
+    async def request(method, url, **kwargs):
+        return _Resp(_page(1, 2, 3))
+
+    monkeypatch.setattr(AsyncApi, "_request", staticmethod(request))
+    monkeypatch.setattr(Api, "_store_message_page",
+                        staticmethod(lambda token, chat_id, data: threads.append(threading.current_thread().name)))
+
+    aio_session.run(AsyncApi.MessageList("t", "c1", 1), timeout=5)
+    aio_session.run(AsyncApi.MessageListBySeq("t", "c1", 1, 1), timeout=5)
+
+    assert len(threads) == 2
+    assert "HTTPEventLoop" not in threads
+
+
+def _client_threads() -> int:
+    # ThreadingHTTPServer 为每个连接起一个线程，不算在客户端里
+    return sum(1 for t in threading.enumerate() if "process_request_thread" not in t.name)
+
+
+class _PeakThreads:
+    """后台每 5ms 采样一次客户端线程数"""
+
+    def __init__(self):
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, _client_threads())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def test_500_concurrent_fetches_benchmark(stub_server):
+    import asyncio
+    import time
+    import tracemalloc
+
+    import httpx
+
+    from modules.req import AsyncHTTPClient
+
+    def handle(method, path, headers, body):
+        time.sleep(0.02)
+        return 200, {}, b"x" * 2048
+
+    server = stub_server(handle)
+    urls = [f"{server.url}/img/{i}" for i in range(500)]
+    base_threads = _client_threads()
+
+    # 改动前：每个请求一个系统线程
+    tracemalloc.start()
+    client = httpx.Client(limits=httpx.Limits(max_connections=100, max_keepalive_connections=20))
+    sizes = []
+
+    def fetch(url):
+        sizes.append(len(client.get(url).content))
+
+    start = time.perf_counter()
+    with _PeakThreads() as threaded_peak:
+        threads = [threading.Thread(target=fetch, args=(url,)) for url in urls]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    threaded_time = time.perf_counter() - start
+    threaded_mem = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    client.close()
+    assert sizes == [2048] * 500
+
+    # 改动后：同一个事件循环线程上的 500 个协程
+    session = AsyncHTTPClient(max_connections=100)
+    try:
+        session.run(session.request("get", server.url + "/warmup"), timeout=10)
+
+        async def fetch_all():
+            return await asyncio.gather(*(session.request("get", url) for url in urls))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with _PeakThreads() as async_peak:
+            responses = session.run(fetch_all(), timeout=60)
+        async_time = time.perf_counter() - start
+        async_mem = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        session.shutdown()
+    assert [len(r.content) for r in responses] == [2048] * 500
+
+    print(f"\n500 concurrent fetches: threads {threaded_peak.peak - base_threads} extra, "
+          f"{threaded_mem / 1024:.0f} KiB peak traced, {500 / threaded_time:.0f} req/s; "
+          f"asyncio {async_peak.peak - base_threads} extra, "
+          f"{async_mem / 1024:.0f} KiB peak traced, {500 / async_time:.0f} req/s")
+    assert threaded_peak.peak - base_threads > 100
+    # 事件循环线程 + 采样线程
+    assert async_peak.peak - base_threads <= 2
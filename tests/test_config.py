@@ -0,0 +1,71 @@
+import json
+import time
+import types
+
+import pytest
+
+from modules import config as config_mod
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    monkeypatch.setattr(config_mod, "CONFIG_FILE", path)
+    monkeypatch.setattr(config_mod, "_snapshot", None)
+    monkeypatch.setattr(config_mod, "_snapshot_mtime", None)
+    monkeypatch.setattr(config_mod, "_checked_at", 0.0)
+    monkeypatch.setattr(config_mod, "_dirty", False)
+    monkeypatch.setattr(config_mod, "_initialized", False)
+    monkeypatch.setattr(config_mod, "_flush_timer", None)
+    yield path
+    timer = config_mod._flush_timer
+    if timer is not None:
+        timer.cancel()
+
+
+def test_set_is_coalesced_and_flushed(config_file):
+    cfg = config_mod.Config()
+    for i in range(100):
+        cfg.set("token", f"t{i}")
+    cfg.flush()
+
+    assert json.loads(config_file.read_text(encoding="utf-8")) == {"token": "t99"}
+    assert not config_mod._dirty
+
+
+def test_failed_write_keeps_old_file(config_file, monkeypatch):
+    cfg = config_mod.Config()
+    cfg.set("token", "old")
+    cfg.flush()
+    before = config_file.read_bytes()
+
+    def broken_dump(content, file, **kwargs):
+        # 写到一半时进程崩溃
+        file.write('{"token": "ne')
+        raise OSError("disk full")
+
+    monkeypatch.setattr(config_mod, "json", types.SimpleNamespace(
+        dump=broken_dump, load=json.load, JSONDecodeError=json.JSONDecodeError))
+    cfg.set("token", "new")
+    cfg.flush()
+
+    assert config_file.read_bytes() == before
+    assert [p.name for p in config_file.parent.iterdir()] == ["config.json"]
+    # 写入失败时保留未写入标记，下次 flush 重试
+    assert config_mod._dirty
+    assert cfg.get("token") == "new"
+
+
+def test_get_token_benchmark(config_file):
+    cfg = config_mod.Config()
+    cfg.set("token", "abc")
+    cfg.flush()
+
+    start = time.perf_counter()
+    for _ in range(100000):
+        assert cfg.get("token") == "abc"
+    elapsed = time.perf_counter() - start
+
+    print(f"100k get('token'): {elapsed:.3f}s ({elapsed * 10:.2f}us/call)")
+    # 内存快照命中，不读文件；逐次读取解析 JSON 的实现大约慢两个数量级
+    assert elapsed < 2.0
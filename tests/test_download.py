@@ -0,0 +1,151 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+from modules.download import CHUNK_SIZE, download, download_async
+
+CONTENT = b"".join(b"line %06d of the file\n" % i for i in range(20000))
+
+
+class _Interrupt(Exception):
+    pass
+
+
+class _StopAfterFirstChunk:
+    """用作限速器，在写入第一块后中断下载"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def acquire(self, n):
+        self.calls += 1
+        if self.calls > 1:
+            raise _Interrupt()
+
+
+def _file_server(stub_server, force_gzip=False):
+    def handle(method, path, headers, body):
+        # 压缩时 Range 作用于压缩后的字节，与真实服务器一致
+        use_gzip = force_gzip or "gzip" in (headers.get("Accept-Encoding") or "")
+        payload = gzip.compress(CONTENT, mtime=0) if use_gzip else CONTENT
+        resp_headers = {"ETag": '"v1"'}
+        if use_gzip:
+            resp_headers["Content-Encoding"] = "gzip"
+        range_header = headers.get("Range")
+        if range_header and headers.get("If-Range") == '"v1"':
+            start = int(range_header[len("bytes="):].rstrip("-"))
+            resp_headers["Content-Range"] = f"bytes {start}-{len(payload) - 1}/{len(payload)}"
+            return 206, resp_headers, payload[start:]
+        return 200, resp_headers, payload
+
+    return stub_server(handle)
+
+
+def test_resume_after_interruption_writes_original_bytes(stub_server, tmp_path):
+    server = _file_server(stub_server)
+    dest = tmp_path / "file.txt"
+
+    with pytest.raises(_Interrupt):
+        download(server.url + "/file.txt", dest, limiter=_StopAfterFirstChunk())
+    assert (tmp_path / "file.txt.part").stat().st_size == CHUNK_SIZE
+
+    result = download(server.url + "/file.txt", dest)
+    assert dest.read_bytes() == CONTENT
+    assert result.sha1 == hashlib.sha1(CONTENT).hexdigest()
+
+    sent = [h for _, _, h in server.requests]
+    assert all(h.get("Accept-Encoding") == "identity" for h in sent)
+    assert sent[1]["Range"] == f"bytes={CHUNK_SIZE}-"
+
+
+def test_compressed_response_is_not_resumed(stub_server, tmp_path):
+    server = _file_server(stub_server, force_gzip=True)
+    dest = tmp_path / "file.txt"
+
+    with pytest.raises(_Interrupt):
+        download(server.url + "/file.txt", dest, limiter=_StopAfterFirstChunk())
+    assert not (tmp_path / "file.txt.part.json").exists()
+
+    download(server.url + "/file.txt", dest)
+    assert dest.read_bytes() == CONTENT
+    assert "Range" not in server.requests[1][2]
+
+
+def test_async_download_touches_files_off_the_event_loop(stub_server, tmp_path, monkeypatch):
+    from modules import download as download_mod
+    from modules.async_api import aio_session
+
+    server = _file_server(stub_server)
+    threads = []
+    for name in ("prepare", "begin", "write", "close", "finish"):
+        method = getattr(download_mod._Download, name)
+
+        def record(self, *args, _method=method):
+            threads.append(threading.current_thread().name)
+            return _method(self, *args)
+        monkeypatch.setattr(download_mod._Download, name, record)
+
+    dest = tmp_path / "file.txt"
+    aio_session.run(download_async(server.url + "/file.txt", dest), timeout=30)
+    assert dest.read_bytes() == CONTENT
+    assert len(threads) >= 5
+    assert "HTTPEventLoop" not in threads
+
+
+def _rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_2gb_download_keeps_memory_flat(stub_server, tmp_path, mode):
+    if not os.path.exists("/proc/self/statm"):
+        pytest.skip("需要 /proc 读取内存占用")
+    from modules.async_api import aio_session
+
+    size = 2 * 1024 ** 3
+    block = os.urandom(1024 * 1024)
+
+    def handle(method, path, headers, body):
+        return 200, {"Content-Length": str(size), "ETag": '"big"'}, (block for _ in range(size // len(block)))
+
+    server = stub_server(handle)
+    dest = tmp_path / "big.bin"
+    progress = []
+
+    # 下载期间每 20ms 采样一次当前 RSS
+    baseline = peak = _rss()
+    stop = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not stop.wait(0.02):
+            peak = max(peak, _rss())
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    start = time.perf_counter()
+    try:
+        if mode == "sync":
+            result = download(server.url + "/big.bin", dest, progress=lambda done, total: progress.append(done))
+        else:
+            result = aio_session.run(download_async(server.url + "/big.bin", dest,
+                                                    progress=lambda done, total: progress.append(done)), timeout=600)
+    finally:
+        elapsed = time.perf_counter() - start
+        stop.set()
+        sampler.join()
+    size_on_disk = dest.stat().st_size
+    dest.unlink()
+
+    print(f"{mode} 2 GiB download: {elapsed:.1f}s ({size / elapsed / 2 ** 20:.0f} MiB/s), "
+          f"RSS before {baseline / 2 ** 20:.0f} MiB, peak {peak / 2 ** 20:.0f} MiB "
+          f"(+{(peak - baseline) / 2 ** 20:.1f} MiB)")
+    assert result.size == size_on_disk == size
+    assert progress[-1] == size
+    # 整个响应缓存在内存里的旧实现至少多占 2 GiB
+    assert peak - baseline < 64 * 2 ** 20
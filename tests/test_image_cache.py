@@ -0,0 +1,133 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules import media_cache, memory_cache
+from modules.api import Api
+from modules.async_api import AsyncApi, aio_session
+
+
+@pytest.fixture
+def caches(tmp_path, monkeypatch):
+    cache = media_cache.MediaCache(root=tmp_path / "media")
+    monkeypatch.setattr(media_cache, "_cache", cache)
+    monkeypatch.setattr(memory_cache, "_cache", memory_cache.ImageMemoryCache())
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def image_server(stub_server):
+    def handle(method, path, headers, body):
+        time.sleep(0.05)  # 让并发请求在下载完成前堆积
+        return 200, {"Content-Type": "image/png", "ETag": f'"{path}"'}, path.encode() * 64
+
+    return stub_server(handle)
+
+
+def test_concurrent_sync_requests_download_each_url_once(caches, image_server):
+    urls = [f"{image_server.url}/img/{i}.png" for i in range(20)]
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        paths = list(pool.map(Api.GetCachedImage, [urls[i % 20] for i in range(1000)]))
+
+    assert all(paths)
+    assert len(set(paths)) == 20
+    assert image_server.count("GET") == 20
+
+
+def test_concurrent_async_requests_download_each_url_once(caches, image_server):
+    urls = [f"{image_server.url}/img/{i}.png" for i in range(20)]
+
+    async def fetch_all():
+        return await asyncio.gather(*(AsyncApi.GetCachedImage(urls[i % 20]) for i in range(1000)))
+
+    paths = aio_session.run(fetch_all(), timeout=30)
+
+    assert all(paths)
+    assert len(set(paths)) == 20
+    assert image_server.count("GET") == 20
+
+
+@pytest.fixture
+def etag_server(stub_server):
+    state = {"version": 1, "full": 0, "not_modified": 0}
+
+    def handle(method, path, headers, body):
+        etag = f'"v{state["version"]}"'
+        if headers.get("If-None-Match") == etag:
+            state["not_modified"] += 1
+            return 304, {"ETag": etag}, b""
+        state["full"] += 1
+        return 200, {"Content-Type": "image/png", "ETag": etag}, f"image v{state['version']}".encode() * 64
+
+    server = stub_server(handle)
+    server.state = state
+    return server
+
+
+@pytest.mark.parametrize("get_image", [
+    Api.GetCachedImage,
+    lambda url, max_age=None: aio_session.run(AsyncApi.GetCachedImage(url, max_age), timeout=10),
+], ids=["sync", "async"])
+def test_stale_images_are_revalidated_with_304(caches, etag_server, get_image):
+    url = etag_server.url + "/avatar.png"
+    state = etag_server.state
+
+    path = get_image(url)
+    assert (state["full"], state["not_modified"]) == (1, 0)
+
+    # 未过期时直接用缓存，不发请求
+    assert get_image(url) == path
+    assert etag_server.count("GET") == 1
+
+    # 要求确认时只收到 304，不重新下载内容
+    for _ in range(3):
+        assert get_image(url, max_age=0) == path
+    assert (state["full"], state["not_modified"]) == (1, 3)
+    assert caches.get_stats()["revalidated"] == 3
+
+    # 内容更新后拿到新文件
+    state["version"] = 2
+    new_path = get_image(url, max_age=0)
+    assert (state["full"], state["not_modified"]) == (2, 3)
+    with open(new_path, "rb") as file:
+        assert file.read().startswith(b"image v2")
+
+
+def test_sync_and_async_requests_share_downloads(caches, image_server):
+    urls = [f"{image_server.url}/img/{i}.png" for i in range(20)]
+
+    async def fetch_all():
+        return await asyncio.gather(*(AsyncApi.GetCachedImage(urls[i % 20]) for i in range(200)))
+
+    # 同一 url 的同步和异步请求同时进行时只下载一次，也不会同时写同一个临时文件
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        sync_paths = pool.map(Api.GetCachedImage, [urls[i % 20] for i in range(200)])
+        async_paths = aio_session.run(fetch_all(), timeout=30)
+        sync_paths = list(sync_paths)
+
+    assert all(sync_paths) and all(async_paths)
+    assert set(sync_paths) == set(async_paths)
+    assert image_server.count("GET") == 20
+
+
+def test_async_cache_index_calls_run_off_the_event_loop(caches, etag_server, monkeypatch):
+    import threading
+
+    threads = []
+    for name in ("lookup_entry", "conditional_headers", "revalidated", "put_file"):
+        method = getattr(caches, name)
+
+        def record(*args, _method=method, **kwargs):
+            threads.append(threading.current_thread().name)
+            return _method(*args, **kwargs)
+        monkeypatch.setattr(caches, name, record)
+
+    url = etag_server.url + "/avatar.png"
+    path = aio_session.run(AsyncApi.GetCachedImage(url), timeout=10)
+    assert aio_session.run(AsyncApi.GetCachedImage(url, max_age=0), timeout=10) == path
+
+    assert len(threads) >= 6
+    assert "HTTPEventLoop" not in threads
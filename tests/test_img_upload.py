@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+import pytest
+
+TOOL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modules", "utils", "img-upload")
+
+
+def test_tool_imports_without_the_app_package():
+    pytest.importorskip("requests")
+    # 在工具目录下单独运行，与 python main.py 相同：仓库根目录不在 sys.path 中
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONPATH"}
+    proc = subprocess.run(
+        [sys.executable, "-c", "import sys, qiniu_uploader; print('modules' in sys.modules)"],
+        cwd=TOOL_DIR, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == "False"
+
+
+@pytest.fixture
+def tool(tmp_path, monkeypatch):
+    pytest.importorskip("requests")
+    monkeypatch.syspath_prepend(TOOL_DIR)
+    import qiniu_uploader
+    monkeypatch.setattr(qiniu_uploader, "TOKEN_CACHE_FILE", str(tmp_path / "upload_token_cache.json"))
+    monkeypatch.setattr(qiniu_uploader, "LEDGER_FILE", str(tmp_path / "upload_ledger.db"))
+    monkeypatch.setattr(qiniu_uploader, "JOURNAL_DIR", str(tmp_path / "upload_journal"))
+    monkeypatch.setattr(qiniu_uploader, "_token_cache", None)
+    monkeypatch.setattr(qiniu_uploader, "_ledger", None)
+    yield qiniu_uploader
+    if qiniu_uploader._ledger is not None:
+        qiniu_uploader._ledger.close()
+
+
+@pytest.fixture
+def qiniu_server(stub_server, tls_cert, monkeypatch, tool):
+    from tests.test_qiniu import _upload_token
+
+    def handle(method, path, headers, body):
+        if path.startswith("/v1/misc/qiniu-token"):
+            return 200, {"Content-Type": "application/json"}, json.dumps(
+                {"code": 1, "data": {"token": _upload_token(time.time() + 3600)}}).encode()
+        if path.startswith("/v4/query"):
+            return 200, {"Content-Type": "application/json"}, json.dumps(
+                {"hosts": [{"ttl": 86400, "up": {"domains": [server.url.split("://", 1)[1]]}}]}).encode()
+        return 200, {"Content-Type": "application/json"}, json.dumps({"key": "k", "hash": "h", "fsize": len(body)}).encode()
+
+    server = stub_server(handle, cert=tls_cert)
+    monkeypatch.setenv("REQUESTS_CA_BUNDLE", tls_cert[0])
+    send = tool._requests_send
+    monkeypatch.setattr(tool, "_requests_send",
+                        lambda method, url, *args: send(method, url.replace("https://api.qiniu.com", server.url), *args))
+    return server
+
+
+def _png(color) -> bytes:
+    from PIL import Image
+    buf = BytesIO()
+    Image.new("RGB", (8, 8), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_upload_uses_the_tool_token_cache(tool, qiniu_server, tmp_path):
+    from modules.config import CONFIG_FILE
+
+    upload = dict(user_token="user", bucket="bucket", qiniu_token_url=qiniu_server.url + "/v1/misc/qiniu-token")
+    for i, color in enumerate(((255, 0, 0), (0, 255, 0))):
+        path = tmp_path / f"{i}.png"
+        path.write_bytes(_png(color))
+        result = tool.upload_image(path_or_url=str(path), enable_webp=False, webp_quality=80, **upload)
+        assert result.key == "k"
+
+    # 凭证和上传域名各只请求一次，缓存写在工具自己的目录，不写主程序的配置目录
+    assert qiniu_server.count("GET", "/v1/misc/qiniu-token") == 1
+    assert sum(1 for m, p, _ in qiniu_server.requests if p.startswith("/v4/query")) == 1
+    cached = json.loads((tmp_path / "upload_token_cache.json").read_text(encoding="utf-8"))
+    assert len(cached["tokens"]) == 1
+    assert not (CONFIG_FILE.parent / "cache" / "qiniu_token.json").exists()
+
+    # 相同内容再次上传直接复用记录
+    tool.upload_image(path_or_url=str(tmp_path / "0.png"), enable_webp=False, webp_quality=80, **upload)
+    assert qiniu_server.count("POST") == 2
@@ -0,0 +1,106 @@
+import hashlib
+import random
+import time
+
+from modules.media_cache import MediaCache
+
+
+def test_same_content_under_different_urls_is_stored_once(tmp_path):
+    cache = MediaCache(root=tmp_path)
+    content = b"avatar" * 100
+    first = cache.put("https://img/a.png?imageView2/2/w/60/h/60", content, ".png")
+    second = cache.put("https://img/a.png?imageView2/2/w/80/h/80", content, ".png")
+
+    assert first == second
+    stats = cache.get_stats()
+    assert (stats["files"], stats["bytes"], stats["dedup"]) == (1, len(content), 1)
+    cache.close()
+
+
+def test_least_recently_used_file_is_evicted(tmp_path):
+    cache = MediaCache(root=tmp_path, budget=300, access_flush_interval=0)
+    for name in "abc":
+        cache.put(f"https://img/{name}", name.encode() * 100)
+        time.sleep(0.01)
+    assert cache.lookup("https://img/a")
+
+    # a 刚被访问，超出容量时先淘汰 b
+    cache.put("https://img/d", b"d" * 100)
+    assert cache.lookup("https://img/b") is None
+    assert cache.lookup("https://img/a") and cache.lookup("https://img/c") and cache.lookup("https://img/d")
+    stats = cache.get_stats()
+    assert (stats["files"], stats["bytes"], stats["evictions"]) == (3, 300, 1)
+    cache.close()
+
+
+def test_index_survives_reopen(tmp_path):
+    cache = MediaCache(root=tmp_path)
+    path = cache.put("https://img/a", b"a" * 10)
+    cache.close()
+
+    reopened = MediaCache(root=tmp_path)
+    assert reopened.lookup("https://img/a") == path
+    assert reopened.total_bytes == 10
+    reopened.close()
+
+
+def _fill(cache: MediaCache, count: int, size: int):
+    """直接写入 count 个文件和对应索引，访问时间依次递增"""
+    now = time.time() - count
+    blobs, urls = [], []
+    for i in range(count):
+        digest = hashlib.sha1(b"%d" % i).hexdigest()
+        name = digest + ".img"
+        path = cache._blob_path(name)
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"x" * size)
+        blobs.append((digest, name, size, now + i))
+        urls.append((f"https://img/{i}.png", digest, now))
+    cache.conn.executemany("INSERT INTO blobs (hash, name, size, last_access) VALUES (?, ?, ?, ?)", blobs)
+    cache.conn.executemany("INSERT INTO urls (url, hash, fetched_at) VALUES (?, ?, ?)", urls)
+    cache.conn.commit()
+
+
+def test_200k_file_cache_benchmark(tmp_path):
+    count, size = 200000, 64
+    cache = MediaCache(root=tmp_path)
+    _fill(cache, count, size)
+    cache.close()
+
+    start = time.perf_counter()
+    cache = MediaCache(root=tmp_path, budget=count * size)
+    open_time = time.perf_counter() - start
+    assert cache.total_bytes == count * size
+
+    rng = random.Random(0)
+    keys = [rng.randrange(count) for _ in range(20000)]
+    start = time.perf_counter()
+    for i in keys:
+        assert cache.lookup(f"https://img/{i}.png")
+    hit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(20000):
+        assert cache.lookup(f"https://img/missing-{i}.png") is None
+    miss_time = time.perf_counter() - start
+
+    # 一次放入 10% 容量的新内容，淘汰最久未访问的 2 万个文件
+    start = time.perf_counter()
+    cache.put("https://img/big.bin", b"y" * (count * size // 10))
+    evict_time = time.perf_counter() - start
+    stats = cache.get_stats()
+
+    print(f"200k files: open {open_time * 1000:.0f} ms, "
+          f"hit {hit_time / len(keys) * 1e6:.1f} us/lookup, miss {miss_time / 20000 * 1e6:.1f} us/lookup, "
+          f"evict {stats['evictions']} files in {evict_time * 1000:.0f} ms "
+          f"({evict_time / stats['evictions'] * 1e6:.1f} us/file)")
+    cache.close()
+
+    assert stats["evictions"] == count // 10
+    assert stats["bytes"] <= cache.budget
+    # 最早写入、此后没被访问过的文件先被淘汰，刚查过的保留
+    oldest = min(set(range(count)) - set(keys))
+    assert not cache._blob_path(hashlib.sha1(b"%d" % oldest).hexdigest() + ".img").exists()
+    assert cache._blob_path(hashlib.sha1(b"%d" % keys[0]).hexdigest() + ".img").exists()
+    assert hit_time / len(keys) < 0.001
+    assert evict_time / stats["evictions"] < 0.002
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import pytest
+
+from modules import media_cache, memory_cache
+from modules.api import Api
+from modules.media_scheduler import NEAR_VIEWPORT, PREFETCH, VISIBLE, MediaScheduler
+
+
+class _FakeFetch:
+    """记录开始顺序和每个 host 的最大并发，delay 秒后返回假路径"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.started = []
+        self.active = {}
+        self.peak = {}
+
+    async def __call__(self, url):
+        host = urlsplit(url).netloc
+        self.started.append(url)
+        self.active[host] = self.active.get(host, 0) + 1
+        self.peak[host] = max(self.peak.get(host, 0), self.active[host])
+        await asyncio.sleep(self.delay)
+        self.active[host] -= 1
+        return "/cache/" + url.rsplit("/", 1)[1]
+
+
+def test_higher_priority_jobs_start_first():
+    fetch = _FakeFetch()
+    scheduler = MediaScheduler(fetch, max_inflight=1)
+    futures = [scheduler.submit(f"http://h/p{i}", PREFETCH) for i in range(3)]
+    futures.append(scheduler.submit("http://h/n0", NEAR_VIEWPORT))
+    futures.append(scheduler.submit("http://h/v0", VISIBLE))
+
+    assert [f.result(timeout=5) for f in futures][-1] == "/cache/v0"
+    # p0 提交时队列为空，直接开始；其余按优先级出队
+    assert fetch.started == ["http://h/p0", "http://h/v0", "http://h/n0", "http://h/p1", "http://h/p2"]
+
+
+def test_cancelled_group_is_not_downloaded():
+    fetch = _FakeFetch()
+    scheduler = MediaScheduler(fetch, max_inflight=1)
+    old = [scheduler.submit(f"http://h/old{i}", VISIBLE, group="chat-1") for i in range(5)]
+    scheduler.cancel("chat-1")
+    new = scheduler.submit("http://h/new0", VISIBLE, group="chat-2")
+
+    assert new.result(timeout=5) == "/cache/new0"
+    assert all(f.cancelled() for f in old)
+    # 只有取消前已经开始的 old0 下载了
+    assert fetch.started == ["http://h/old0", "http://h/new0"]
+
+
+def test_same_url_is_fetched_once_across_groups():
+    fetch = _FakeFetch()
+    scheduler = MediaScheduler(fetch, max_inflight=1)
+    scheduler.submit("http://h/busy", VISIBLE)
+    first = scheduler.submit("http://h/avatar", PREFETCH, group="conversations")
+    second = scheduler.submit("http://h/avatar", VISIBLE, group="chat-1")
+    scheduler.cancel("conversations")
+
+    # 另一个分组仍在等待，不丢弃任务
+    assert second.result(timeout=5) == "/cache/avatar"
+    assert first.cancelled()
+    assert fetch.started.count("http://h/avatar") == 1
+
+
+def test_per_host_limit_lets_other_hosts_through():
+    fetch = _FakeFetch(delay=0.05)
+    scheduler = MediaScheduler(fetch, max_inflight=8, max_per_host=2)
+    futures = [scheduler.submit(f"http://a/{i}", VISIBLE) for i in range(6)]
+    futures += [scheduler.submit(f"http://b/{i}", PREFETCH) for i in range(2)]
+    wait(futures, timeout=5)
+
+    assert fetch.peak == {"a": 2, "b": 2}
+    # a 已经占满，b 的低优先级任务不用等 a 全部下完
+    assert set(fetch.started[:4]) == {"http://a/0", "http://a/1", "http://b/0", "http://b/1"}
+
+
+@pytest.fixture
+def caches(tmp_path, monkeypatch):
+    cache = media_cache.MediaCache(root=tmp_path / "media")
+    monkeypatch.setattr(media_cache, "_cache", cache)
+    monkeypatch.setattr(memory_cache, "_cache", memory_cache.ImageMemoryCache())
+    yield cache
+    cache.close()
+
+
+def _open_chats(server, prefix, load):
+    """
+    模拟快速切换会话：每 30ms 打开一个新会话，最后停在第 10 个
+
+    每个会话先按消息顺序提交 30 张历史图片，再提交屏幕上可见的 10 张；
+    load(url, priority, chat) 返回 Future。返回最后一个会话从打开到第一张可见图片就绪的时间。
+    """
+    first_visible = threading.Event()
+    shown = {}
+    for chat in range(10):
+        opened = time.perf_counter()
+        urls = [f"{server.url}/{prefix}/chat{chat}/{i}.png" for i in range(40)]
+        for i, url in enumerate(urls):
+            priority = VISIBLE if i >= 30 else PREFETCH
+            future = load(url, priority, chat)
+            if chat == 9 and priority == VISIBLE:
+                def on_done(f, opened=opened):
+                    if not f.cancelled() and f.result():
+                        shown.setdefault("at", time.perf_counter() - opened)
+                        first_visible.set()
+                future.add_done_callback(on_done)
+        if chat < 9:
+            time.sleep(0.03)
+    assert first_visible.wait(60)
+    return shown["at"]
+
+
+def test_rapid_chat_switching_time_to_first_visible_image(caches, stub_server):
+    def handle(method, path, headers, body):
+        time.sleep(0.05)
+        return 200, {"Content-Type": "image/png"}, path.encode() * 64
+
+    server = stub_server(handle)
+
+    # 改动前：8 个线程的 FIFO 线程池，切换会话不取消已排队的任务
+    pool = ThreadPoolExecutor(max_workers=8)
+    fifo_first = _open_chats(server, "fifo", lambda url, priority, chat: pool.submit(Api.GetCachedImage, url))
+    pool.shutdown(wait=True)
+    fifo_downloads = server.count("GET")
+
+    scheduler = MediaScheduler(max_inflight=8, max_per_host=8)
+
+    def load(url, priority, chat):
+        if priority == PREFETCH and url.endswith("/0.png"):
+            # 切换会话时取消上一个会话的全部请求
+            scheduler.cancel(("chat", chat - 1))
+        return scheduler.submit(url, priority, ("chat", chat))
+
+    sched_first = _open_chats(server, "sched", load)
+    time.sleep(0.5)
+    sched_downloads = server.count("GET") - fifo_downloads
+    stats = scheduler.get_stats()
+
+    print(f"rapid switching over 10 chats: first visible image FIFO {fifo_first * 1000:.0f} ms "
+          f"({fifo_downloads} downloads), scheduler {sched_first * 1000:.0f} ms ({sched_downloads} downloads, "
+          f"{stats['cancelled']} cancelled)")
+    assert fifo_downloads == 400
+    assert sched_downloads < 200
+    assert sched_first * 5 < fifo_first
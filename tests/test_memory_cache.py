@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from modules import media_cache, memory_cache
+from modules.api import Api
+from modules.async_api import AsyncApi, aio_session
+
+
+@pytest.fixture
+def caches(tmp_path, monkeypatch):
+    cache = media_cache.MediaCache(root=tmp_path / "media", fresh_for=10)
+    memory = memory_cache.ImageMemoryCache()
+    monkeypatch.setattr(media_cache, "_cache", cache)
+    monkeypatch.setattr(memory_cache, "_cache", memory)
+    yield cache, memory
+    cache.close()
+
+
+def _age(cache, url, seconds):
+    with cache.lock:
+        cache.conn.execute("UPDATE urls SET fetched_at = ? WHERE url = ?", (time.time() - seconds, url))
+        cache.conn.commit()
+
+
+@pytest.mark.parametrize("get_image", [
+    Api.GetCachedImage,
+    lambda url: aio_session.run(AsyncApi.GetCachedImage(url), timeout=10),
+], ids=["sync", "async"])
+def test_memory_entry_expires_with_the_disk_entry(caches, get_image):
+    cache, memory = caches
+    url = "https://example.invalid/avatar.png"
+    path = cache.put(url, b"avatar")
+    # 磁盘记录还剩 0.2 秒有效，内存不应再给它完整的 fresh_for
+    _age(cache, url, 9.8)
+
+    assert get_image(url) == path
+    assert memory.get(url) == path
+    time.sleep(0.3)
+    assert memory.get(url) is None
+
+
+def test_fresh_disk_entry_keeps_memory_entry(caches):
+    cache, memory = caches
+    url = "https://example.invalid/avatar.png"
+    path = cache.put(url, b"avatar")
+
+    assert Api.GetCachedImage(url) == path
+    time.sleep(0.3)
+    assert memory.get(url) == path
+
+
+def test_lookup_entry_reports_remaining_freshness(caches):
+    cache, _ = caches
+    url = "https://example.invalid/avatar.png"
+    path = cache.put(url, b"avatar")
+    _age(cache, url, 4)
+
+    found_path, fresh_for = cache.lookup_entry(url)
+    assert found_path == path
+    assert 5.5 < fresh_for <= 6
+    # 要求更短的有效期时视为过期，但剩余有效期仍按 fresh_for 计算
+    assert cache.lookup_entry(url, max_age=1) is None
+
+
+def test_zipf_avatar_lookup_benchmark(caches, monkeypatch):
+    import random
+
+    cache, memory = caches
+    cache.fresh_for = 3600
+    avatars, lookups = 2000, 10000
+    urls = [f"https://example.invalid/avatar/{i}.png" for i in range(avatars)]
+    for url in urls:
+        cache.put(url, url.encode())
+    rng = random.Random(1)
+    # 会话列表和聊天中的头像访问集中在少数人身上，按 Zipf(s=1.1) 分布抽样
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(avatars)]
+    trace = rng.choices(urls, weights=weights, k=lookups)
+
+    def run(label, memory):
+        monkeypatch.setattr(memory_cache, "_cache", memory)
+        latencies = []
+        for url in trace:
+            start = time.perf_counter()
+            assert Api.GetCachedImage(url)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        total = sum(latencies)
+        stats = memory.get_stats()
+        print(f"{label}: {lookups} lookups in {total * 1000:.0f} ms, hit rate {stats['hit_rate']:.1%}, "
+              f"p50 {latencies[len(latencies) // 2] * 1e6:.1f} us, p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.1f} us")
+        return total, stats
+
+    # budget 为 0 时每次 put 后立即淘汰，相当于只用磁盘索引
+    disk_total, _ = run("disk index only", memory_cache.ImageMemoryCache(budget=0))
+    memory_total, stats = run("memory + disk", memory_cache.ImageMemoryCache())
+
+    assert stats["hits"] + stats["misses"] == lookups
+    # 冷启动时每个不同的头像各未命中一次
+    assert stats["misses"] == len(set(trace))
+    assert memory_total < disk_total
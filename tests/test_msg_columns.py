@@ -0,0 +1,142 @@
+import gc
+import os
+import random
+import time
+from array import array
+
+import pytest
+
+from modules import msg_columns
+from modules.msg_columns import decode_pages
+from modules.proto import msg_pb2
+
+np = pytest.importorskip("numpy")
+
+
+def _page(messages, by_seq=False) -> bytes:
+    page = msg_pb2.list_message_by_seq() if by_seq else msg_pb2.list_message()
+    page.status.code = 1
+    for msg_id, seq, sender, text in messages:
+        m = page.msg.add()
+        m.msg_id = msg_id
+        m.msg_seq = seq
+        m.send_time = 1700000000000 + seq * 1000
+        m.content_type = 1 if text else 2
+        m.sender.chat_id = sender
+        m.content.text = text
+    return page.SerializeToString()
+
+
+PAGES = [
+    _page([("m1", 1, "alice", "你好"), ("m2", 2, "bob", "hello"), ("m3", 3, "alice", "")]),
+    _page([("消息4", 4, "carol", "ab"), ("m5", 5, "bob", "cd")], by_seq=True),
+]
+
+
+def test_pages_decode_into_columns():
+    parsed = msg_pb2.list_message()
+    parsed.ParseFromString(PAGES[1])
+    cols = decode_pages([PAGES[0], parsed])
+
+    assert len(cols) == 5
+    assert isinstance(cols.send_time, np.ndarray)
+    assert cols.msg_seq.tolist() == [1, 2, 3, 4, 5]
+    assert cols.content_type.tolist() == [1, 1, 2, 1, 1]
+    assert cols.senders == ["alice", "bob", "carol"]
+    assert [cols.sender(i) for i in range(5)] == ["alice", "bob", "alice", "carol", "bob"]
+    assert [cols.msg_id(i) for i in range(5)] == ["m1", "m2", "m3", "消息4", "m5"]
+    assert [cols.text(i) for i in range(5)] == ["你好", "hello", "", "ab", "cd"]
+    assert cols.row(3) == {"msg_id": "消息4", "msg_seq": 4, "send_time": 1700000004000,
+                           "sender_chat_id": "carol", "content_type": 1, "text": "ab"}
+
+
+def test_filters():
+    cols = decode_pages(PAGES)
+    mask = cols.sender_mask("alice") & (cols.send_time >= 1700000002000)
+    assert [r["msg_id"] for r in cols.rows(np.nonzero(mask)[0])] == ["m3"]
+    assert not cols.sender_mask("nobody").any()
+
+    assert cols.find_text("你") == [0]
+    assert cols.find_text("l") == [1]
+    # "ab" + "cd" 在缓冲区中相邻，跨越两条消息的匹配不算
+    assert cols.find_text("bc") == []
+    assert cols.find_text("") == [0, 1, 2, 3, 4]
+
+
+def test_without_numpy_columns_are_arrays(monkeypatch):
+    cols = decode_pages(PAGES, use_numpy=False)
+    assert isinstance(cols.send_time, array)
+    assert cols.find_text("cd") == [4]
+    assert cols.nbytes() > 0
+
+    monkeypatch.setattr(msg_columns, "np", None)
+    with pytest.raises(Exception):
+        cols.sender_mask("alice")
+
+
+def _rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def test_1m_message_benchmark():
+    if not os.path.exists("/proc/self/statm"):
+        pytest.skip("需要 /proc 读取内存占用")
+    from google.protobuf import json_format
+
+    rng = random.Random(0)
+    words = ["你好", "收到", "图片", "明天见", "ok", "thanks", "开会", "发版了", "在吗", "哈哈哈"]
+    pages = []
+    seq = 0
+    for _ in range(1000):
+        batch = []
+        for _ in range(1000):
+            seq += 1
+            text = " ".join(rng.choice(words) for _ in range(rng.randrange(1, 8))) if rng.random() < 0.8 else ""
+            batch.append((f"{seq:032x}", seq, f"user{rng.randrange(500)}", text))
+        pages.append(_page(batch))
+    t0 = 1700000000000 + 500000 * 1000
+
+    gc.collect()
+    base = _rss()
+    start = time.perf_counter()
+    dicts = []
+    for payload in pages:
+        page = msg_pb2.list_message()
+        page.ParseFromString(payload)
+        dicts.extend(json_format.MessageToDict(page)["msg"])
+    dict_decode = time.perf_counter() - start
+    gc.collect()
+    dict_mem = _rss() - base
+
+    start = time.perf_counter()
+    dict_hits = [m for m in dicts if int(m.get("sendTime", 0)) >= t0 and m["sender"]["chatId"] == "user7"]
+    dict_filter = time.perf_counter() - start
+    start = time.perf_counter()
+    dict_text = sum(1 for m in dicts if "发版" in m.get("content", {}).get("text", ""))
+    dict_search = time.perf_counter() - start
+    del dicts
+    gc.collect()
+
+    base = _rss()
+    start = time.perf_counter()
+    cols = decode_pages(pages)
+    col_decode = time.perf_counter() - start
+    gc.collect()
+    col_mem = _rss() - base
+
+    start = time.perf_counter()
+    col_hits = np.nonzero((cols.send_time >= t0) & cols.sender_mask("user7"))[0]
+    col_filter = time.perf_counter() - start
+    start = time.perf_counter()
+    col_text = len(cols.find_text("发版"))
+    col_search = time.perf_counter() - start
+
+    print(f"1M messages: dicts decode {dict_decode:.1f}s, {dict_mem / 2 ** 20:.0f} MiB, "
+          f"filter {dict_filter * 1000:.0f} ms, text {dict_search * 1000:.0f} ms; "
+          f"columns decode {col_decode:.1f}s, {col_mem / 2 ** 20:.0f} MiB (nbytes {cols.nbytes() / 2 ** 20:.0f} MiB), "
+          f"filter {col_filter * 1000:.1f} ms, text {col_search * 1000:.0f} ms")
+    assert [m["msgId"] for m in dict_hits] == [cols.msg_id(i) for i in col_hits]
+    assert dict_text == col_text
+    assert col_mem * 5 < dict_mem
+    assert col_filter * 10 < dict_filter
@@ -0,0 +1,146 @@
+import time
+
+import pytest
+from google.protobuf import json_format
+
+from modules.proto import conversation_pb2, msg_pb2
+from modules.proto_view import ConversationView, MsgView, ProtoView, as_dict, wrap
+
+
+def _msg(i: int = 1, image: bool = False):
+    m = msg_pb2.Msg()
+    m.msg_id = f"m{i}"
+    m.msg_seq = i
+    m.send_time = 1700000000000 + i
+    m.direction = "left"
+    m.content_type = 2 if image else 1
+    m.sender.chat_id = f"u{i % 7}"
+    m.sender.name = f"用户{i % 7}"
+    m.sender.avatar_url = f"https://img/avatar{i % 7}.jpg"
+    tag = m.sender.tag.add()
+    tag.id = 3
+    tag.text = "管理员"
+    if image:
+        m.content.image_url = f"https://img/{i}.jpg"
+        m.content.width = 1600
+        m.content.height = 1200
+    else:
+        m.content.text = f"第 {i} 条消息"
+    return m
+
+
+def test_msg_view_reads_both_spellings():
+    view = wrap(_msg(5))
+    assert isinstance(view, MsgView)
+    assert view.get("msgId") == view.get("msg_id") == view["msgId"] == view.msg_id == "m5"
+    assert view.msg_seq == 5 and view.content_type == 1
+    assert view["sender"]["chatId"] == view.sender.chat_id == "u5"
+    assert view.get("content").get("text") == "第 5 条消息"
+    assert view["sender"]["tag"][0]["text"] == "管理员"
+
+
+def test_unset_fields_behave_like_message_to_dict():
+    view = wrap(_msg(5))
+    # 未设置的字段与 MessageToDict 一样不出现
+    assert "editTime" not in view and "quote_msg_id" not in view and "cmd" not in view
+    assert view.get("editTime", 0) == 0
+    assert view.get("cmd") is None
+    with pytest.raises(KeyError):
+        view["quoteMsgId"]
+    # 已知字段未设置时属性为 None，未知字段报错
+    assert view.quote_msg_id is None
+    with pytest.raises(AttributeError):
+        view.no_such_field
+    assert "no_such_field" not in view
+    # 与空字典一样为假
+    assert view and not wrap(msg_pb2.Msg())
+
+
+def test_keys_and_to_dict_match_message_to_dict():
+    pb = _msg(5, image=True)
+    view = wrap(pb)
+    expected = json_format.MessageToDict(pb)
+    assert list(view) == list(expected)
+    assert list(view["content"]) == list(expected["content"])
+    assert len(view) == len(expected)
+    assert view.to_dict() == as_dict(view) == expected
+    # 与 MessageToDict 的区别：64 位整数不转成字符串
+    assert expected["msgSeq"] == "5" and view["msgSeq"] == 5
+    plain = {"msgId": "m1"}
+    assert as_dict(plain) is plain
+
+
+def test_conversation_view():
+    page = conversation_pb2.ConversationList()
+    item = page.data.add()
+    item.chat_id = "g1"
+    item.chat_type = 2
+    item.name = "群聊"
+    item.timestamp_ms = 1700000000000
+    item.at_data.mentioned_name = "我"
+
+    view = wrap(page)
+    assert type(view) is ProtoView
+    conversation = view["data"][0]
+    assert isinstance(conversation, ConversationView)
+    assert conversation.chat_id == conversation.get("chatId") == "g1"
+    assert conversation.chat_type == 2 and conversation.timestamp_ms == 1700000000000
+    assert conversation["atData"]["mentionedName"] == "我"
+    assert conversation.get("unreadMessage") is None
+    # 子视图只包装一次
+    assert view["data"] is view["data"]
+
+
+def _render_fields(m):
+    """ChatPage 渲染一条消息时读取的字段"""
+    sender = m.get("sender") or {}
+    content = m.get("content") or {}
+    return (m.get("msgId") or m.get("msg_id"), m.get("msgSeq") or m.get("msg_seq"),
+            m.get("sendTime") or m.get("send_time"), m.get("contentType") or m.get("content_type"),
+            sender.get("name"), sender.get("avatarUrl") or sender.get("avatar_url"),
+            sender.get("chatId") or sender.get("chat_id"),
+            content.get("text"), content.get("imageUrl") or content.get("image_url"))
+
+
+def test_10k_message_decode_and_access_benchmark():
+    page = msg_pb2.list_message()
+    page.status.code = 1
+    for i in range(10000):
+        page.msg.append(_msg(i, image=i % 3 == 0))
+    payload = page.SerializeToString()
+
+    def with_dicts():
+        parsed = msg_pb2.list_message()
+        parsed.ParseFromString(payload)
+        data = json_format.MessageToDict(parsed)
+        return [_render_fields(m) for m in data["msg"]]
+
+    def with_views():
+        parsed = msg_pb2.list_message()
+        parsed.ParseFromString(payload)
+        data = wrap(parsed)
+        return [_render_fields(m) for m in data["msg"]]
+
+    def first_screen():
+        # 打开会话时只渲染屏幕上的几十条，其余字段不读取
+        parsed = msg_pb2.list_message()
+        parsed.ParseFromString(payload)
+        return [_render_fields(m) for m in wrap(parsed)["msg"][-30:]]
+
+    timings = {}
+    for name, run in (("MessageToDict", with_dicts), ("view", with_views), ("view_first_screen", first_screen)):
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            rows = run()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = (best, rows)
+
+    dict_time, dict_rows = timings["MessageToDict"]
+    view_time, view_rows = timings["view"]
+    print(f"10k messages decode+access: MessageToDict {dict_time * 1000:.0f} ms, "
+          f"view {view_time * 1000:.0f} ms ({dict_time / view_time:.1f}x), "
+          f"view reading only the last 30 {timings['view_first_screen'][0] * 1000:.0f} ms")
+    # 读到的值相同，只有 64 位整数的类型不同
+    assert [tuple(str(v) if isinstance(v, int) else v for v in row) for row in view_rows] == dict_rows
+    assert view_time < dict_time
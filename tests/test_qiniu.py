@@ -0,0 +1,262 @@
+import base64
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules.qiniu import MultipartUploader, UploadTokenCache
+
+PART = 1024 * 1024
+DATA = b"".join(bytes([i]) * PART for i in range(3))
+UPLOAD_TOKEN = "ak:sig:" + base64.urlsafe_b64encode(json.dumps({"scope": "bucket"}).encode()).decode()
+
+
+class _Resp:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.text = json.dumps(self.payload)
+
+    def json(self):
+        return self.payload
+
+
+class FakeQiniu:
+    """按请求路径模拟七牛分片上传接口，fail 中的分片号返回指定状态码"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = {}
+        self.inits = 0
+
+    def send(self, method, url, headers, body, timeout):
+        tail = url.split("/uploads", 1)[1]
+        self.calls.append((method, tail))
+        if method == "POST" and not tail:
+            self.inits += 1
+            return _Resp(200, {"uploadId": f"id{self.inits}", "expireAt": 4102444800})
+        if method == "PUT":
+            part_number = int(tail.rsplit("/", 1)[1])
+            if part_number in self.fail:
+                return _Resp(self.fail[part_number], {"error": "failed"})
+            return _Resp(200, {"etag": f"etag{part_number}"})
+        return _Resp(200, {"key": "k", "hash": "h"})
+
+    def parts_put(self):
+        return sorted(int(tail.rsplit("/", 1)[1]) for method, tail in self.calls if method == "PUT")
+
+
+@pytest.fixture
+def qiniu(tmp_path):
+    fake = FakeQiniu()
+    uploader = MultipartUploader(UPLOAD_TOKEN, host="http://upload", send=fake.send,
+                                 part_size=PART, concurrency=1, retries=1, journal_dir=tmp_path)
+    return fake, uploader
+
+
+def _journal_parts(tmp_path):
+    journals = list(tmp_path.glob("*.json"))
+    assert len(journals) == 1
+    return json.loads(journals[0].read_text(encoding="utf-8"))["parts"]
+
+
+def test_transient_failure_during_resume_keeps_done_parts(qiniu, tmp_path):
+    fake, uploader = qiniu
+    fake.fail = {3: 503}
+    with pytest.raises(Exception):
+        uploader.upload(DATA, "k")
+    assert sorted(_journal_parts(tmp_path)) == ["1", "2"]
+
+    # 续传时再次遇到临时错误，不丢弃已完成的分片，也不重新初始化
+    fake.calls.clear()
+    with pytest.raises(Exception):
+        uploader.upload(DATA, "k")
+    assert fake.inits == 1
+    assert fake.parts_put() == [3]
+    assert sorted(_journal_parts(tmp_path)) == ["1", "2"]
+
+    fake.calls.clear()
+    fake.fail = {}
+    assert uploader.upload(DATA, "k")["key"] == "k"
+    assert fake.inits == 1
+    assert fake.parts_put() == [3]
+    assert not list(tmp_path.glob("*.json"))
+
+
+def test_expired_upload_id_restarts_from_scratch(qiniu, tmp_path):
+    fake, uploader = qiniu
+    fake.fail = {3: 503}
+    with pytest.raises(Exception):
+        uploader.upload(DATA, "k")
+
+    # uploadId 已失效：丢弃进度，重新初始化后上传全部分片
+    fake.calls.clear()
+    fake.fail = {3: 612}
+    original_send = fake.send
+
+    def send(method, url, headers, body, timeout):
+        if fake.inits > 1:
+            fake.fail = {}
+        return original_send(method, url, headers, body, timeout)
+
+    uploader.send = send
+    assert uploader.upload(DATA, "k")["key"] == "k"
+    assert fake.inits == 2
+    assert fake.parts_put() == [1, 2, 3, 3]
+
+
+def _upload_token(deadline: float) -> str:
+    policy = {"scope": "bucket", "deadline": int(deadline)}
+    return "ak:sig:" + base64.urlsafe_b64encode(json.dumps(policy).encode()).decode()
+
+
+class _Fetcher:
+    def __init__(self, ttl=3600, delay=0.0, fail=False):
+        self.ttl = ttl
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, user_token):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise Exception("token endpoint unavailable")
+        return _upload_token(time.time() + self.ttl)
+
+
+def test_token_is_reused_until_it_expires():
+    cache = UploadTokenCache()
+    fetch = _Fetcher()
+    token = cache.get_token("user", fetch)
+    assert cache.get_token("user", fetch) == token
+    assert fetch.calls == 1
+
+    # 剩余不到 60 秒的凭证不够一次上传，重新同步获取
+    fetch.ttl = 30
+    cache.invalidate("user")
+    cache.get_token("user", fetch)
+    cache.get_token("user", fetch)
+    assert fetch.calls == 3
+
+
+def test_token_near_expiry_is_refreshed_in_background():
+    cache = UploadTokenCache(refresh_margin=300)
+    old = _Fetcher(ttl=200)
+    old_token = cache.get_token("user", old)
+
+    refresh = _Fetcher(delay=0.1)
+    start = time.perf_counter()
+    assert cache.get_token("user", refresh) == old_token
+    assert time.perf_counter() - start < 0.05
+    time.sleep(0.3)
+    new_token = cache.get_token("user", refresh)
+    assert new_token != old_token
+    assert refresh.calls == 1
+
+
+def test_concurrent_callers_on_a_cold_cache_fetch_once():
+    cache = UploadTokenCache()
+    fetch = _Fetcher(delay=0.1)
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        tokens = list(pool.map(lambda _: cache.get_token("user", fetch), range(50)))
+    assert fetch.calls == 1
+    assert len(set(tokens)) == 1
+
+    # 不同用户各自获取
+    cache.get_token("other", fetch)
+    assert fetch.calls == 2
+
+
+def test_failed_fetch_is_shared_then_retried():
+    cache = UploadTokenCache()
+    fetch = _Fetcher(delay=0.1, fail=True)
+
+    def get(_):
+        try:
+            return cache.get_token("user", fetch)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(get, range(20)))
+    assert all(isinstance(r, Exception) for r in results)
+    assert fetch.calls == 1
+
+    fetch.fail = False
+    assert cache.get_token("user", fetch)
+    assert fetch.calls == 2
+
+
+def test_last_failed_attempt_does_not_sleep():
+    calls = []
+
+    def send(method, url, headers, body, timeout):
+        calls.append(time.perf_counter())
+        return _Resp(503, {"error": "busy"})
+
+    uploader = MultipartUploader(UPLOAD_TOKEN, host="http://upload", send=send, retries=2)
+    start = time.perf_counter()
+    with pytest.raises(Exception):
+        uploader.upload(b"x" * 10, "k")
+    elapsed = time.perf_counter() - start
+    # 两次尝试之间等 0.5 秒，最后一次失败后直接报错
+    assert len(calls) == 2
+    assert elapsed < 0.8
+
+
+def test_upload_burst_benchmark(stub_server, tmp_path, monkeypatch):
+    from io import BytesIO
+
+    from PIL import Image
+
+    from modules import api, qiniu, upload_ledger
+    from tests.conftest import local_session
+
+    def handle(method, path, headers, body):
+        if path.startswith("/v1/misc/qiniu-token"):
+            time.sleep(0.1)
+            return 200, {"Content-Type": "application/json"}, json.dumps(
+                {"code": 1, "data": {"token": _upload_token(time.time() + 3600)}}).encode()
+        if path.startswith("/v4/query"):
+            return 200, {"Content-Type": "application/json"}, json.dumps(
+                {"hosts": [{"ttl": 86400, "up": {"domains": ["upload.local"]}}]}).encode()
+        time.sleep(0.02)
+        return 200, {"Content-Type": "application/json"}, json.dumps({"key": "k", "hash": "h"}).encode()
+
+    server = stub_server(handle)
+    session = local_session(server, max_thread=8)
+    ledger = upload_ledger.UploadLedger(tmp_path / "uploads.db")
+    monkeypatch.setattr(api, "session", session)
+    monkeypatch.setattr(qiniu, "_token_cache", UploadTokenCache())
+    monkeypatch.setattr(upload_ledger, "_ledger", ledger)
+
+    images = []
+    for i in range(50):
+        buf = BytesIO()
+        Image.new("RGB", (64, 64), (i, 255 - i, 128)).save(buf, format="PNG")
+        images.append(buf.getvalue())
+
+    def upload(image):
+        start = time.perf_counter()
+        api.Api.UploadImage("user-token", image, "pasted.png")
+        return time.perf_counter() - start
+
+    # 冷启动时 50 张图片同时上传，只请求一次上传凭证
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        latencies = sorted(pool.map(upload, images))
+    total = time.perf_counter() - start
+    token_requests = server.count("GET", "/v1/misc/qiniu-token")
+    print(f"50-image burst: {total * 1000:.0f} ms total, per upload p50 {latencies[25] * 1000:.0f} ms, "
+          f"p95 {latencies[47] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms, "
+          f"{token_requests} token request(s), {server.count('POST')} uploads")
+    session.shutdown()
+    ledger.close()
+
+    assert token_requests == 1
+    assert server.count("POST") == 50
@@ -0,0 +1,127 @@
+import time
+
+from modules.req import HTTPThreadingClient
+
+
+def test_wait_is_not_delayed_by_slow_request(stub_server):
+    def handle(method, path, headers, body):
+        if path == "/slow":
+            time.sleep(1.5)
+        return 200, {}, b"ok"
+
+    server = stub_server(handle)
+    client = HTTPThreadingClient(max_thread=4)
+    try:
+        slow_id = client.get(server.url + "/slow")
+        time.sleep(0.05)  # 确保慢请求先被工作线程取走
+
+        start = time.monotonic()
+        fast_id = client.get(server.url + "/fast")
+        result = client.wait(fast_id, timeout=5)
+        elapsed = time.monotonic() - start
+
+        assert result["success"]
+        assert result["response"].content == b"ok"
+        assert elapsed < 0.5
+        assert client.wait(slow_id, timeout=5)["success"]
+    finally:
+        client.shutdown()
+
+
+def test_soak_results_are_released_and_bounded(stub_server):
+    import gc
+
+    import httpx
+
+    def live_responses():
+        gc.collect()
+        return sum(1 for obj in gc.get_objects() if isinstance(obj, httpx.Response))
+
+    server = stub_server(lambda method, path, headers, body: (200, {}, b"x" * 1024))
+    client = HTTPThreadingClient(max_thread=4, max_results=100, max_result_bytes=64 * 1024)
+    served = 0
+    try:
+        for batch in range(200):
+            tasks = [client.get(f"{server.url}/{i}") for i in range(500)]
+            # 每 5 个请求中有 1 个没人等待，结果只进结果缓存
+            for i, task in enumerate(tasks):
+                if i % 5:
+                    assert client.wait(task, timeout=10)["success"]
+            assert len(client.results) <= 100
+            assert client.retained_bytes <= 64 * 1024
+            # 测试服务器自己的请求记录不计入
+            with server.lock:
+                served += len(server.requests)
+                server.requests.clear()
+            if batch == 20:
+                gc.collect()
+                baseline = len(gc.get_objects())
+        del tasks, task
+        client.wait_completion()
+        gc.collect()
+        current = len(gc.get_objects())
+
+        assert served == 100000
+        assert len(client.results) <= 100
+        assert client.retained_bytes <= 64 * 1024
+        assert client.retained_bytes == sum(client.result_sizes.values())
+        assert not client.futures
+        # 10 万次请求后存活对象数与 1 万次时基本持平，残留的响应不超过结果缓存上限
+        assert current - baseline < 1000
+        assert live_responses() <= 100 + client.max_thread
+    finally:
+        client.shutdown()
+
+
+def test_wait_returns_results_evicted_from_cache(stub_server):
+    server = stub_server(lambda method, path, headers, body: (200, {}, b"y" * (2 * 1024 * 1024)
+                                                              if path == "/big" else b"ok"))
+    client = HTTPThreadingClient(max_thread=4, max_results=10, max_result_bytes=1024 * 1024)
+    try:
+        big = client.get(server.url + "/big")
+        early = client.get(server.url + "/early")
+        # 先完成的任务在 wait 之前被大量后续结果挤出结果缓存
+        for task in [client.get(f"{server.url}/{i}") for i in range(50)]:
+            client.wait(task, timeout=10)
+        assert client.get_result(early) is None
+
+        assert client.wait(early, timeout=10)["response"].content == b"ok"
+        # 超过字节上限的单个响应也能拿到
+        assert len(client.wait(big, timeout=10)["response"].content) == 2 * 1024 * 1024
+    finally:
+        client.shutdown()
+
+
+def test_pooled_client_benchmark_over_https(stub_server, tls_cert):
+    import ssl
+
+    import httpx
+
+    server = stub_server(lambda method, path, headers, body: (200, {}, b"ok"), cert=tls_cert)
+    context = ssl.create_default_context(cafile=tls_cert[0])
+    n = 100
+
+    # 改动前：每个请求新建 httpx.Client，每次都要 TCP + TLS 握手
+    start = time.perf_counter()
+    for i in range(n):
+        with httpx.Client(verify=context) as c:
+            assert c.get(f"{server.url}/{i}").content == b"ok"
+    per_client = (time.perf_counter() - start) / n
+    handshakes_before = server.connections
+
+    client = HTTPThreadingClient(max_thread=4, verify=context)
+    try:
+        client.wait(client.get(server.url + "/warmup"), timeout=10)
+        start = time.perf_counter()
+        for i in range(n):
+            assert client.wait(client.get(f"{server.url}/{i}"), timeout=10)["success"]
+        pooled = (time.perf_counter() - start) / n
+    finally:
+        client.shutdown()
+    handshakes_after = server.connections - handshakes_before
+
+    print(f"\n{n} HTTPS requests: new client {per_client * 1000:.2f} ms/req, {handshakes_before} handshakes; "
+          f"pooled {pooled * 1000:.2f} ms/req, {handshakes_after} handshakes")
+    assert handshakes_before == n
+    assert handshakes_after == 1
+    assert pooled < per_client
@@ -0,0 +1,141 @@
+import threading
+import time
+
+import pytest
+
+from modules.send_pipeline import ImageSendPipeline, image_to_png_bytes
+
+
+class _Recorder:
+    """上传按数据中给定的延迟完成，记录发送顺序"""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def upload(self, data, filename):
+        name, delay = data
+        time.sleep(delay)
+        if name in self.fail:
+            raise Exception(f"upload {name} failed")
+        return {"file_key": name}
+
+    def send(self, chat_id, chat_type, img_meta):
+        with self.lock:
+            self.sent.append(img_meta["file_key"])
+        return img_meta["file_key"]
+
+
+def test_images_are_sent_in_paste_order():
+    recorder = _Recorder()
+    pipeline = ImageSendPipeline(max_parallel=3, upload=recorder.upload, send=recorder.send)
+    # 后粘贴的图片先上传完
+    futures = [pipeline.enqueue("chat", 1, (f"img{i}", 0.3 - i * 0.1)) for i in range(3)]
+
+    assert [f.result(timeout=5) for f in futures] == ["img0", "img1", "img2"]
+    assert recorder.sent == ["img0", "img1", "img2"]
+
+
+def test_failed_upload_does_not_block_later_images():
+    recorder = _Recorder(fail={"img1"})
+    pipeline = ImageSendPipeline(max_parallel=3, upload=recorder.upload, send=recorder.send)
+    futures = [pipeline.enqueue("chat", 1, (f"img{i}", 0.05)) for i in range(3)]
+
+    assert futures[0].result(timeout=5) == "img0"
+    with pytest.raises(Exception):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5) == "img2"
+    assert recorder.sent == ["img0", "img2"]
+
+
+def _sender_threads():
+    return {t for t in threading.enumerate() if t.name.startswith("ImageSender")}
+
+
+def test_no_sender_thread_waits_on_uploads():
+    # 其它测试创建的流水线可能还留着空闲的发送线程，只看这次新增的
+    existing = _sender_threads()
+    recorder = _Recorder()
+    pipeline = ImageSendPipeline(max_parallel=2, upload=recorder.upload, send=recorder.send)
+    futures = [pipeline.enqueue("chat", 1, (f"img{i}", 0.3)) for i in range(2)]
+
+    # 上传期间没有发送线程在等待
+    time.sleep(0.1)
+    assert not _sender_threads() - existing
+    assert [f.result(timeout=5) for f in futures] == ["img0", "img1"]
+
+
+def test_paste_20_large_pngs_benchmark(stub_server, tmp_path, monkeypatch):
+    import json
+    import os
+
+    from PIL import Image
+
+    from modules import api, qiniu, upload_ledger
+    from modules.api import Api
+    from modules.proto import msg_pb2
+    from tests.conftest import local_session
+    from tests.test_qiniu import _upload_token
+
+    sent = msg_pb2.send_message()
+    sent.status.code = 1
+
+    def handle(method, path, headers, body):
+        if path.startswith("/v1/misc/qiniu-token"):
+            time.sleep(0.1)
+            return 200, {"Content-Type": "application/json"}, json.dumps(
+                {"code": 1, "data": {"token": _upload_token(time.time() + 3600)}}).encode()
+        if path.startswith("/v4/query"):
+            return 200, {"Content-Type": "application/json"}, json.dumps(
+                {"hosts": [{"ttl": 86400, "up": {"domains": ["upload.local"]}}]}).encode()
+        if path.startswith("/v1/msg/send-message"):
+            time.sleep(0.03)
+            return 200, {"Content-Type": "application/x-protobuf"}, sent.SerializeToString()
+        # 七牛表单上传：按 20MB/s 的上行带宽模拟耗时
+        time.sleep(len(body) / (20 * 1024 * 1024))
+        return 200, {"Content-Type": "application/json"}, json.dumps({"key": "k", "hash": "h"}).encode()
+
+    server = stub_server(handle)
+    session = local_session(server, max_thread=8)
+    monkeypatch.setattr(api, "session", session)
+
+    # 截图类内容：大块纯色夹着噪点，单张 PNG 约 2-3MB
+    images = []
+    for i in range(20):
+        img = Image.new("RGB", (1600, 1000), (i * 10, 80, 160))
+        img.paste(Image.frombytes("RGB", (800, 1000), os.urandom(800 * 1000 * 3)), (i * 20, 0))
+        images.append(img)
+
+    def run(max_parallel):
+        monkeypatch.setattr(qiniu, "_token_cache", qiniu.UploadTokenCache())
+        ledger = upload_ledger.UploadLedger(tmp_path / f"uploads-{max_parallel}.db")
+        monkeypatch.setattr(upload_ledger, "_ledger", ledger)
+        pipeline = ImageSendPipeline(
+            max_parallel=max_parallel,
+            upload=lambda data, filename: Api.UploadImage("user-token", data, filename),
+            send=lambda chat_id, chat_type, meta: Api.SendImageMessage("user-token", chat_id, chat_type, meta),
+        )
+        server.requests.clear()
+        start = time.perf_counter()
+        done_at = []
+        # 与聊天页相同：粘贴时只入队，PNG 编码在上传线程中进行
+        futures = [pipeline.enqueue("chat", 1, lambda img=img: image_to_png_bytes(img)) for img in images]
+        for future in futures:
+            future.add_done_callback(lambda _: done_at.append(time.perf_counter() - start))
+        for future in futures:
+            assert future.result(timeout=120)["status"]["code"] == 1
+        total = time.perf_counter() - start
+        uploaded = sum(1 for m, p, _ in server.requests if m == "POST" and p == "/")
+        print(f"max_parallel={max_parallel}: 20 PNGs sent in {total:.2f}s, first after {done_at[0]:.2f}s, "
+              f"{uploaded} uploads, {server.count('GET', '/v1/misc/qiniu-token')} token request(s)")
+        pipeline.executor.shutdown()
+        pipeline.sender.shutdown()
+        ledger.close()
+        return total, uploaded
+
+    sequential, _ = run(1)
+    parallel, uploaded = run(3)
+    session.shutdown()
+    assert uploaded == 20
+    assert parallel < sequential * 1.2
@@ -0,0 +1,152 @@
+import pytest
+
+from modules import store
+from modules.api import Api
+
+
+def _page(*seqs, text="hello"):
+    return {"msg": [{"msgId": f"m{seq}", "msgSeq": str(seq), "content": {"text": f"{text} {seq}"}}
+                    for seq in sorted(seqs, reverse=True)]}
+
+
+@pytest.fixture
+def accounts(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "STORE_DIR", tmp_path / "messages")
+    yield
+    store.close_message_store()
+
+
+def test_accounts_with_the_same_peer_are_kept_apart(accounts):
+    # 私聊的 chat_id 是对方的用户ID：账号 A、B 与同一个人的私聊 chat_id 相同
+    store.use_message_store("user-a", "token-a")
+    Api._store_message_page("token-a", "peer", _page(*range(1, 101), text="secret"))
+    assert len(Api.CachedMessageList("peer")["msg"]) == 50
+    assert Api._cached_message_page("token-a", "peer", 10, "m50") is not None
+
+    store.use_message_store("user-b", "token-b")
+    assert Api.CachedMessageList("peer")["msg"] == []
+    assert Api._cached_message_page("token-b", "peer", 10, "m50") is None
+    assert Api.SearchMessages("secret") == []
+
+    # 切换账号前发出的请求返回晚了，不写进 B 的缓存
+    Api._store_message_page("token-a", "peer", _page(101, text="late"))
+    assert Api.CachedMessageList("peer")["msg"] == []
+
+    Api._store_message_page("token-b", "peer", _page(1, text="mine"))
+    assert [m["msgId"] for m in Api.CachedMessageList("peer")["msg"]] == ["m1"]
+
+    # 切回 A 时仍是 A 自己的历史
+    store.use_message_store("user-a", "token-a")
+    assert len(Api.CachedMessageList("peer")["msg"]) == 50
+    assert {r["msg_id"] for r in Api.SearchMessages("mine")} == set()
+
+
+def test_logout_closes_the_store(accounts):
+    store.use_message_store("user-a", "token-a")
+    Api._store_message_page("token-a", "peer", _page(1, 2, 3))
+    store.close_message_store()
+
+    assert Api.CachedMessageList("peer")["msg"] == []
+    assert Api.SearchMessages("hello") == []
+    with pytest.raises(Exception):
+        store.get_message_store()
+
+
+@pytest.fixture
+def search_store(tmp_path):
+    message_store = store.MessageStore(tmp_path / "messages.db")
+    texts = {
+        "m1": "今天天气很好",
+        "m2": "明天去北京开会",
+        "m3": "Hello World, weekly report",
+        "m4": "图片上传失败 upload failed",
+    }
+    message_store.put_messages("c1", [{"msgId": msg_id, "msgSeq": str(i), "content": {"text": text}}
+                                      for i, (msg_id, text) in enumerate(texts.items(), 1)])
+    message_store.put_messages("c2", [{"msgId": "m5", "msgSeq": "1", "content": {"text": "北京天气"}}])
+    yield message_store
+    message_store.close()
+
+
+def _hits(message_store, query, chat_id=None):
+    return sorted(r["msg_id"] for r in message_store.search(query, chat_id))
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("天气", ["m1", "m5"]),
+    ("天气很好", ["m1"]),
+    ("北京开会", ["m2"]),
+    ("京开", ["m2"]),
+    ("气很", ["m1"]),
+    ("天气 北京", ["m5"]),
+    ("上传失败", ["m4"]),
+    ("传失败upload", ["m4"]),
+    ("天晴", []),
+])
+def test_cjk_queries_match_substrings(search_store, query, expected):
+    assert _hits(search_store, query) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    # 一段开头、中间和末尾的单字
+    ("今", ["m1"]),
+    ("气", ["m1", "m5"]),
+    ("好", ["m1"]),
+    ("会", ["m2"]),
+    ("京", ["m2", "m5"]),
+    ("败", ["m4"]),
+    ("雨", []),
+])
+def test_single_character_queries(search_store, query, expected):
+    assert _hits(search_store, query) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("hello", ["m3"]),
+    ("WORLD", ["m3"]),
+    ("repo", ["m3"]),
+    ("weekly report", ["m3"]),
+    ("upload", ["m4"]),
+    ("fail", ["m4"]),
+    ("reports", []),
+])
+def test_latin_queries_match_words_and_prefixes(search_store, query, expected):
+    assert _hits(search_store, query) == expected
+
+
+def test_search_can_be_limited_to_one_chat(search_store):
+    assert _hits(search_store, "天气", "c2") == ["m5"]
+
+
+def test_search_index_benchmark(tmp_path):
+    import random
+    import time
+
+    count, page = 1_000_000, 50
+    rng = random.Random(1)
+    words = "今天 天气 很好 我们 明天 北京 开会 项目 进度 图片 上传 失败 服务器 消息 缓存 检索 测试 版本 发布 周末".split()
+    latin = "hello world report build deploy cache search image upload token server client".split()
+    message_store = store.MessageStore(tmp_path / "messages.db")
+
+    start = time.perf_counter()
+    for first in range(0, count, page):
+        msgs = [{"msgId": f"m{i}", "msgSeq": str(i), "sendTime": str(i),
+                 "content": {"text": "".join(rng.choice(words) for _ in range(rng.randint(3, 8)))
+                             + " " + " ".join(rng.choice(latin) for _ in range(rng.randint(1, 3)))}}
+                for i in range(first, first + page)]
+        message_store.put_messages(f"chat{first // page % 500}", msgs)
+    indexed = time.perf_counter() - start
+    size = (tmp_path / "messages.db").stat().st_size + (tmp_path / "messages.db-wal").stat().st_size
+    print(f"indexed {count} messages in {indexed:.1f}s ({count / indexed:.0f} msg/s), database {size / 1024 / 1024:.0f} MiB")
+
+    # 常见词命中几十万条，需要对全部命中排序；罕见组合和限定会话的查询只看少量命中
+    for query, chat_id in (("天气", None), ("好", None), ("deploy", None), ("北京开会 deploy", None),
+                           ("天气很好我们", None), ("天气", "chat7")):
+        start = time.perf_counter()
+        for _ in range(5):
+            hits = message_store.search(query, chat_id)
+        elapsed = (time.perf_counter() - start) / 5
+        print(f"  search {query!r}{' in ' + chat_id if chat_id else ''}: {len(hits)} hits, {elapsed * 1000:.1f} ms")
+        assert hits
+    message_store.close()
+    assert indexed < 600
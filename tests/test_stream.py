@@ -0,0 +1,108 @@
+import asyncio
+
+from modules.stream import StreamAssembler
+
+
+def test_updates_keep_frame_rate_while_chunks_arrive():
+    updates = []
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        assembler = StreamAssembler(lambda msg_id, chat_id, text: updates.append((loop.time(), text)),
+                                    frame_interval=1 / 15)
+        start = loop.time()
+        for i in range(100):  # 每 20ms 一个分片，共 2 秒
+            assembler.feed("m1", "c1", "r1", f"{i},")
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.2)
+        assembler.detach()
+        return start
+
+    start = asyncio.run(run())
+
+    # 约 15 帧/秒：2 秒内应有 ~30 次更新，而不是退化成每秒一次
+    assert len(updates) >= 20
+    assert len(updates) <= 35
+    times = [t for t, _ in updates]
+    assert times[0] - start < 0.15
+    assert max(b - a for a, b in zip(times, times[1:])) < 0.2
+    assert updates[-1][1].endswith("99,")
+
+
+def test_abandoned_stream_is_redispatched_but_not_stored(monkeypatch):
+    from modules import store, ws
+    from modules.ws import WsClient
+
+    writes = []
+    pushed = []
+
+    class RecordingStore:
+        def put_messages(self, chat_id, msgs):
+            writes.append((chat_id, msgs))
+
+    monkeypatch.setattr(store, "get_message_store", lambda token=None: RecordingStore())
+
+    async def run():
+        client = WsClient("token", "me")
+        client.subscribe("push_message", lambda event: ws._store_pushed(event, "me", "token"))
+        client.subscribe("push_message", pushed.append)
+        assembler = StreamAssembler(lambda msg_id, chat_id, text: None, frame_interval=0.01, idle_timeout=0.05)
+        assembler.attach(client)
+        assembler.feed("m1", "bot", "me", "partial answer")
+        await asyncio.sleep(1.2)
+        assembler.detach()
+
+    asyncio.run(run())
+    ws._store_executor.submit(lambda: None).result(timeout=5)
+
+    # 界面仍能收到已拼好的文本，但缺少发送者、会话类型和序号的消息不进入缓存
+    assert [event.msg.data.msg.content.text for event in pushed] == ["partial answer"]
+    assert pushed[0].synthetic
+    assert writes == []
+
+
+def test_50_concurrent_streams_benchmark():
+    import time
+    import tracemalloc
+
+    streams, rate, seconds = 50, 200, 2.0
+    chunk = "流式输出的一小段文本，"
+
+    async def run():
+        updates = {}
+        assembler = StreamAssembler(lambda msg_id, chat_id, text: updates.__setitem__(msg_id, updates.get(msg_id, 0) + 1))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tick = 0
+        # 每个流 200 分片/秒：每 5ms 给所有流各追加一个分片，按绝对时间对齐，不累积误差
+        while loop.time() - start < seconds:
+            for i in range(streams):
+                assembler.feed(f"m{i}", f"c{i}", "me", chunk)
+            tick += 1
+            await asyncio.sleep(max(0.0, start + tick / rate - loop.time()))
+        buffered = sum(stream.size for stream in assembler.streams.values())
+        assembler.detach()
+        return tick, updates, buffered
+
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    ticks, updates, buffered = asyncio.run(run())
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+
+    tracemalloc.start()
+    asyncio.run(run())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    chunks = ticks * streams
+    print(f"{streams} streams x {rate} chunks/s for {seconds:.0f}s: {chunks} chunks, "
+          f"CPU {cpu:.2f}s / wall {wall:.2f}s ({cpu / wall:.0%} of one core), "
+          f"{chunks / cpu / 1000:.0f}k chunks per CPU second, "
+          f"{sum(updates.values()) / streams / wall:.1f} updates/s per stream, "
+          f"buffered {buffered / 1024:.0f}k chars, peak traced memory {peak / 1024 / 1024:.1f} MiB")
+    # 按帧合并回调：每个流约 15 次/秒，与分片速率无关
+    assert len(updates) == streams
+    assert all(n <= 15 * wall * 1.2 + 2 for n in updates.values())
+    assert chunks >= streams * rate * seconds * 0.5
+    assert cpu / wall < 0.8
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from modules.async_api import AsyncApi, aio_session
+from modules.proto import msg_pb2
+from modules.store import get_message_store
+from modules.sync import HistorySync
+
+LAST_SEQ = 1000
+PAGE_SIZE = 50
+
+
+def _chat_server(stub_server, delay: float = 0.0):
+    """合成的会话：msg_seq 1..LAST_SEQ，by-seq 接口每页返回从请求的 seq 开始的 PAGE_SIZE 条"""
+    def handle(method, path, headers, body):
+        req = msg_pb2.list_message_by_seq_send()
+        req.ParseFromString(body)
+        if delay:
+            import time
+            time.sleep(delay)
+        resp = msg_pb2.list_message_by_seq()
+        resp.status.code = 1
+        for seq in range(req.msg_seq, min(req.msg_seq + PAGE_SIZE, LAST_SEQ + 1)):
+            m = resp.msg.add()
+            m.msg_id = f"{req.chat_id}-{seq}"
+            m.msg_seq = seq
+            m.content.text = f"message {seq}"
+        return 200, {"Content-Type": "application/x-protobuf"}, resp.SerializeToString()
+    return stub_server(handle)
+
+
+def _route_to(server, monkeypatch):
+    request = AsyncApi._request
+
+    async def local_request(method, url, **kwargs):
+        return await request(method, url.replace("https://chat-go.jwzhd.com", server.url), **kwargs)
+
+    monkeypatch.setattr(AsyncApi, "_request", staticmethod(local_request))
+    return server
+
+
+@pytest.fixture
+def chat_server(stub_server, monkeypatch, message_store):
+    return _route_to(_chat_server(stub_server), monkeypatch)
+
+
+def _seed(chat_id: str, *ranges):
+    msgs = [{"msgId": f"{chat_id}-{seq}", "msgSeq": str(seq)}
+            for lo, hi in ranges for seq in range(lo, hi + 1)]
+    get_message_store().put_messages(chat_id, msgs)
+
+
+def test_fills_only_missing_ranges(chat_server):
+    _seed("gap-chat", (1, 100), (301, 400), (900, 1000))
+
+    sync = HistorySync(window=LAST_SEQ, max_messages=10000)
+    aio_session.run(sync.sync("gap-chat", 2, token="t"), timeout=10)
+
+    assert get_message_store().seq_ranges("gap-chat") == [(1, 1000)]
+    # [101, 300] 需要 4 页，[401, 899] 需要 10 页；已缓存的区间不再请求
+    assert chat_server.count("POST") == 14
+
+
+def test_sync_is_bounded_and_starts_near_latest(chat_server):
+    _seed("old-chat", (1, 10), (991, 1000))
+
+    sync = HistorySync(window=300, max_messages=100)
+    fetched = aio_session.run(sync.sync("old-chat", 2, token="t"), timeout=10)
+
+    assert fetched == 100
+    assert chat_server.count("POST") == 2
+    # 只补最新 300 条以内、紧挨着已有最新消息的一段
+    assert get_message_store().seq_ranges("old-chat") == [(1, 10), (891, 1000)]
+
+
+def test_concurrent_sync_of_same_chat_is_skipped(stub_server, monkeypatch, message_store):
+    server = _route_to(_chat_server(stub_server, delay=0.2), monkeypatch)
+    _seed("busy-chat", (1, 10), (61, 70))
+
+    async def both():
+        sync = HistorySync(window=LAST_SEQ)
+        return await asyncio.gather(sync.sync("busy-chat", 2, token="t"), sync.sync("busy-chat", 2, token="t"))
+
+    first, second = aio_session.run(both(), timeout=10)
+    assert first == 50
+    assert second == 0
+    assert server.count("POST") == 1
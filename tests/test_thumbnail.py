@@ -0,0 +1,172 @@
+import random
+import threading
+from io import BytesIO
+from urllib.parse import unquote
+
+import pytest
+
+from modules import config as config_mod
+from modules import media_cache, memory_cache, thumbnail
+from modules.api import Api
+
+
+def test_size_is_rounded_up_to_a_bucket_and_scaled():
+    assert thumbnail.thumbnail_url("https://img/a.jpg", 300, scale=1.0) == "https://img/a.jpg?imageView2/2/w/384"
+    assert thumbnail.thumbnail_url("https://img/a.jpg", 300, scale=1.5) == "https://img/a.jpg?imageView2/2/w/512"
+    assert thumbnail.thumbnail_url("https://img/a.jpg?v=1", 36, 36, scale=1.0) == \
+        "https://img/a.jpg?v=1&imageView2/2/w/48/h/48"
+    # 超过最大档位时取最大档位
+    assert thumbnail.thumbnail_url("https://img/a.jpg", 5000, scale=1.0).endswith("/w/2048")
+
+
+def test_existing_processing_is_replaced():
+    assert thumbnail.original_url("https://img/a.jpg?imageView2/2/w/80/h/80") == "https://img/a.jpg"
+    assert thumbnail.original_url("https://img/a.jpg?v=1&imageView2/2/w/80") == "https://img/a.jpg?v=1"
+    assert thumbnail.thumbnail_url("https://img/a.jpg?imageView2/2/w/60/h/60", 32, 32, scale=1.0) == \
+        "https://img/a.jpg?imageView2/2/w/48/h/48"
+
+
+def test_avatar_slots_share_one_variant():
+    # 会话列表、消息和首页的头像在 1x 下落在同一档位，只缓存一份
+    urls = {thumbnail.thumbnail_url("https://img/a.jpg", size, size, scale=1.0)
+            for size in (thumbnail.CONVERSATION_AVATAR, thumbnail.MESSAGE_AVATAR, thumbnail.HOME_AVATAR)}
+    assert urls == {"https://img/a.jpg?imageView2/2/w/48/h/48"}
+
+
+def test_small_originals_are_not_upscaled(monkeypatch):
+    monkeypatch.setattr(thumbnail, "_scale", 1.0)
+    url = "https://img/sticker.png?imageView2/2/w/400"
+    assert thumbnail.message_image_url(url, {"width": 240, "height": 180}) == "https://img/sticker.png"
+    assert thumbnail.message_image_url(url, {"width": 1600, "height": 1200}) == \
+        "https://img/sticker.png?imageView2/2/w/384"
+    # 尺寸缺失或不是数字时按显示宽度请求
+    assert thumbnail.message_image_url(url, {"width": "?"}).endswith("/w/384")
+    assert thumbnail.message_image_url(url).endswith("/w/384")
+    assert thumbnail.thumbnail_url("", 300) == ""
+
+
+def test_display_scale_comes_from_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_mod, "CONFIG_FILE", tmp_path / "config.json")
+    monkeypatch.setattr(config_mod, "_snapshot", None)
+    monkeypatch.setattr(config_mod, "_snapshot_mtime", None)
+    monkeypatch.setattr(config_mod, "_checked_at", 0.0)
+    monkeypatch.setattr(config_mod, "_dirty", False)
+    monkeypatch.setattr(config_mod, "_initialized", False)
+    (tmp_path / "config.json").write_text('{"display_scale": 2}', encoding="utf-8")
+    monkeypatch.setattr(thumbnail, "_scale", None)
+
+    assert thumbnail.display_scale() == 2.0
+    assert thumbnail.avatar_url("https://img/a.jpg", thumbnail.MESSAGE_AVATAR).endswith("/w/64/h/64")
+
+
+def _image(size, seed, fmt="JPEG") -> bytes:
+    """低分辨率噪声放大得到的平滑图片，压缩率接近照片"""
+    from PIL import Image
+    rng = random.Random(seed)
+    small = Image.new("RGB", (16, 12))
+    small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(16 * 12)])
+    buf = BytesIO()
+    small.resize(size, Image.BICUBIC).save(buf, format=fmt, quality=85)
+    return buf.getvalue()
+
+
+class _QiniuStub:
+    """按 imageView2/2 参数等比缩小（不放大）后返回，统计传输的字节数"""
+
+    def __init__(self, sources):
+        self.sources = sources
+        self.sent = 0
+        self.lock = threading.Lock()
+        self.variants = {}
+
+    def __call__(self, method, path, headers, body):
+        from PIL import Image
+        name, _, query = unquote(path).lstrip("/").partition("?")
+        payload = self.variants.get(path)
+        if payload is None:
+            payload = self.sources[name]
+            op = next((p for p in query.split("&") if p.startswith("imageView2/2/")), "")
+            if op:
+                args = op.split("/")[2:]
+                box = dict(zip(args[::2], map(int, args[1::2])))
+                img = Image.open(BytesIO(payload))
+                img.thumbnail((box.get("w", img.width), box.get("h", img.height)))
+                buf = BytesIO()
+                img.convert("RGB").save(buf, format="JPEG", quality=85)
+                payload = buf.getvalue()
+            self.variants[path] = payload
+        with self.lock:
+            self.sent += len(payload)
+        return 200, {"Content-Type": "image/jpeg"}, payload
+
+
+@pytest.fixture
+def qiniu_images(stub_server):
+    sources, messages = {}, []
+    for i in range(20):
+        sources[f"avatar{i}.jpg"] = _image((640, 640), i)
+    # 三种常见消息图片：照片、手机截图和小表情
+    shapes = [(1600, 1200), (1080, 2400), (240, 180)]
+    for i, shape in enumerate(shapes):
+        sources[f"shape{i}.jpg"] = _image(shape, 100 + i)
+    rng = random.Random(0)
+    for i in range(500):
+        message = {"sender": f"avatar{rng.randrange(20)}.jpg"}
+        if rng.random() < 0.6:
+            shape = rng.choice([0, 0, 1, 2])
+            # 每张消息图片地址不同，内容来自对应的样图
+            sources[f"img{i}.jpg"] = sources[f"shape{shape}.jpg"]
+            message["image"] = f"img{i}.jpg"
+            message["content"] = {"width": shapes[shape][0], "height": shapes[shape][1]}
+        messages.append(message)
+    stub = _QiniuStub(sources)
+    return stub_server(stub), stub, messages
+
+
+def _render(server, stub, messages, urls, root, monkeypatch):
+    """用全新的缓存加载首页头像、会话列表和 500 条消息用到的所有图片，返回传输的字节数和请求数"""
+    cache = media_cache.MediaCache(root=root)
+    monkeypatch.setattr(media_cache, "_cache", cache)
+    monkeypatch.setattr(memory_cache, "_cache", memory_cache.ImageMemoryCache())
+    base = server.url + "/"
+    before_bytes, before_requests = stub.sent, server.count("GET")
+    for url in urls(base, messages):
+        assert Api.GetCachedImage(url)
+    cache.close()
+    return stub.sent - before_bytes, server.count("GET") - before_requests
+
+
+def _old_urls(base, messages):
+    yield base + "avatar0.jpg"  # 首页下载原图头像
+    for i in range(20):
+        yield base + f"avatar{i}.jpg?imageView2/2/w/80/h/80"
+    for m in messages:
+        yield base + m["sender"] + "?imageView2/2/w/60/h/60"
+        if "image" in m:
+            yield base + m["image"] + "?imageView2/2/w/400"
+
+
+def _new_urls(base, messages):
+    yield thumbnail.avatar_url(base + "avatar0.jpg", thumbnail.HOME_AVATAR)
+    for i in range(20):
+        yield thumbnail.avatar_url(base + f"avatar{i}.jpg", thumbnail.CONVERSATION_AVATAR)
+    for m in messages:
+        yield thumbnail.avatar_url(base + m["sender"], thumbnail.MESSAGE_AVATAR)
+        if "image" in m:
+            yield thumbnail.message_image_url(base + m["image"], m["content"])
+
+
+def test_image_heavy_chat_bytes_benchmark(qiniu_images, tmp_path, monkeypatch):
+    server, stub, messages = qiniu_images
+
+    old_bytes, old_requests = _render(server, stub, messages, _old_urls, tmp_path / "old", monkeypatch)
+    results = {}
+    for scale in (1.0, 1.5):
+        monkeypatch.setattr(thumbnail, "_scale", scale)
+        results[scale] = _render(server, stub, messages, _new_urls, tmp_path / f"new{scale}", monkeypatch)
+
+    print(f"500-message chat: before {old_bytes / 1024:.0f} KiB in {old_requests} requests, "
+          + ", ".join(f"after @{scale}x {b / 1024:.0f} KiB in {n} requests" for scale, (b, n) in results.items()))
+    # 头像在各位置共用一个档位，请求数减少；1x 下消息图片按 384 宽请求，小图直接用原图
+    assert results[1.0][1] < old_requests
+    assert results[1.0][0] < old_bytes
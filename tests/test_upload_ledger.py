@@ -0,0 +1,131 @@
+import hashlib
+import time
+
+import pytest
+
+from modules import api, upload_ledger
+from modules.api import Api
+from modules.upload_ledger import UploadLedger
+
+META = {"file_key": "k.png", "file_hash": "h", "file_size": 3, "file_type": "image/png",
+        "image_width": 1, "image_height": 1, "file_suffix": "png"}
+
+
+def test_put_then_get_reuses_meta(tmp_path):
+    ledger = UploadLedger(tmp_path / "uploads.db")
+    assert ledger.get("k.png") is None
+    ledger.put("k.png", META)
+    assert ledger.get("k.png") == META
+    ledger.discard("k.png")
+    assert ledger.get("k.png") is None
+    ledger.close()
+
+
+def test_records_expire_after_ttl(tmp_path):
+    ledger = UploadLedger(tmp_path / "uploads.db", ttl=0.05)
+    ledger.put("k.png", META)
+    time.sleep(0.1)
+    assert ledger.get("k.png") is None
+    ledger.close()
+
+    # 重新打开时清理过期记录
+    reopened = UploadLedger(tmp_path / "uploads.db", ttl=0.05)
+    assert reopened.conn.execute("SELECT COUNT(*) FROM uploads").fetchone()[0] == 0
+    reopened.close()
+
+
+def test_records_survive_restart(tmp_path):
+    ledger = UploadLedger(tmp_path / "uploads.db")
+    ledger.put("k.png", META)
+    ledger.close()
+
+    reopened = UploadLedger(tmp_path / "uploads.db")
+    assert reopened.get("k.png") == META
+    reopened.close()
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    ledger = UploadLedger(tmp_path / "uploads.db")
+    monkeypatch.setattr(upload_ledger, "_ledger", ledger)
+    yield ledger
+    ledger.close()
+
+
+def test_upload_of_known_content_skips_qiniu(ledger, monkeypatch):
+    image = b"png"
+    key = hashlib.md5(image).hexdigest() + ".png"
+    ledger.put(key, dict(META, file_key=key))
+
+    token_requests = []
+
+    def no_network(token):
+        token_requests.append(token)
+        raise Exception("offline")
+
+    # 命中记录时既不上传，也不请求上传凭证
+    monkeypatch.setattr(Api, "_cached_qiniu_upload_token", staticmethod(no_network))
+    monkeypatch.setattr(api, "session", None)
+    assert Api.UploadImage("token", image, "a.png")["file_key"] == key
+    time.sleep(0.1)
+    assert token_requests == []
+
+
+class _SendSession:
+    """post 时按 result 调用回调：Exception 走 error_callback，其余作为响应"""
+
+    def __init__(self, result):
+        self.result = result
+
+    def post(self, url, headers=None, data=None, callback=None, error_callback=None):
+        if isinstance(self.result, Exception):
+            error_callback(str(self.result))
+        else:
+            callback(self.result)
+        return "task"
+
+    def wait(self, task_id):
+        return None
+
+
+class _SendResp:
+    def __init__(self, status_code, code=1, msg=""):
+        from modules.proto import msg_pb2
+        resp = msg_pb2.send_message()
+        resp.status.code = code
+        resp.status.msg = msg
+        self.status_code = status_code
+        self.content = resp.SerializeToString()
+
+
+def test_successful_send_keeps_ledger_record(ledger, monkeypatch):
+    ledger.put("k.png", META)
+    monkeypatch.setattr(api, "session", _SendSession(_SendResp(200)))
+    assert Api.SendImageMessage("token", "chat", 1, META)["status"]["code"] == 1
+    assert ledger.get("k.png") == META
+
+
+@pytest.mark.parametrize("result", [
+    Exception("connection reset"),
+    _SendResp(503),
+    _SendResp(401),
+], ids=["network-error", "server-error", "unauthorized"])
+def test_failed_send_keeps_ledger_record(ledger, monkeypatch, result):
+    # 与文件无关的失败，重试时仍可直接复用上传结果
+    ledger.put("k.png", META)
+    monkeypatch.setattr(api, "session", _SendSession(result))
+    with pytest.raises(Exception):
+        Api.SendImageMessage("token", "chat", 1, META)
+    assert ledger.get("k.png") == META
+
+
+@pytest.mark.parametrize("result", [
+    _SendResp(200, code=0, msg="file not found"),
+    _SendResp(404),
+], ids=["status-code", "http-404"])
+def test_rejected_send_discards_ledger_record(ledger, monkeypatch, result):
+    ledger.put("k.png", META)
+    monkeypatch.setattr(api, "session", _SendSession(result))
+    with pytest.raises(Exception):
+        Api.SendImageMessage("token", "chat", 1, META)
+    assert ledger.get("k.png") is None
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from modules import store, ws
+from modules.async_api import AsyncApi, aio_session
+
+
+@pytest.fixture
+def fake_account(monkeypatch):
+    state = {"token": "token-a", "user_info_calls": 0}
+
+    async def user_info(token):
+        state["user_info_calls"] += 1
+        await asyncio.sleep(0.05)
+        return {"data": {"id": "user-" + token}}
+
+    async def run_once(self):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(AsyncApi, "UserInfo", staticmethod(user_info))
+    monkeypatch.setattr(AsyncApi, "_token_from_config", staticmethod(lambda: state["token"]))
+    monkeypatch.setattr(ws.WsClient, "_run_once", run_once)
+    yield state
+    aio_session.run(_call(ws._disconnect))
+    store.close_message_store()
+
+
+async def _call(fn):
+    fn()
+
+
+def test_concurrent_connects_share_one_client(fake_account):
+    async def connect_twice():
+        return await asyncio.gather(ws.connect_from_config(), ws.connect_from_config())
+
+    a, b = aio_session.run(connect_twice(), timeout=5)
+    assert a is b
+    assert fake_account["user_info_calls"] == 1
+    assert aio_session.run(ws.connect_from_config(), timeout=5) is a
+
+
+def test_account_switch_replaces_client(fake_account):
+    first = aio_session.run(ws.connect_from_config(), timeout=5)
+    fake_account["token"] = "token-b"
+    second = aio_session.run(ws.connect_from_config(), timeout=5)
+
+    assert second is not first
+    assert second.user_id == "user-token-b"
+    assert not first._running
+
+
+def test_disconnect_shared_stops_client(fake_account):
+    client = aio_session.run(ws.connect_from_config(), timeout=5)
+    ws.disconnect_shared()
+    time.sleep(0.1)
+
+    assert not client._running
+    assert ws._shared_client is None
+
+
+def _private_msg(sender_id, recv_id):
+    from modules.proto import chat_ws_go_pb2
+    msg = chat_ws_go_pb2.WsMsg(msg_id="m1", recv_id=recv_id, chat_id=recv_id, chat_type=1)
+    msg.sender.chat_id = sender_id
+    return msg
+
+
+def test_private_message_chat_id_follows_the_other_side():
+    incoming = ws.ws_msg_to_dict(_private_msg("friend", "me"), "me")
+    outgoing = ws.ws_msg_to_dict(_private_msg("me", "friend"), "me")
+
+    assert ws.ws_msg_chat_id(incoming, "me") == "friend"
+    assert ws.ws_msg_chat_id(outgoing, "me") == "friend"
+
+
+def test_pushed_messages_are_stored_off_the_event_loop(monkeypatch):
+    from modules.proto import chat_ws_go_pb2
+
+    writes = []
+
+    class RecordingStore:
+        def put_messages(self, chat_id, msgs):
+            import threading
+            time.sleep(0.05)
+            writes.append((threading.current_thread().name, chat_id, msgs[0]["msgId"]))
+
+    monkeypatch.setattr(store, "get_message_store", lambda token=None: RecordingStore())
+
+    async def push_and_edit():
+        started = time.perf_counter()
+        for msg_id in ("m1", "m1", "m2"):
+            push = chat_ws_go_pb2.push_message()
+            push.data.msg.CopyFrom(_private_msg("friend", "me"))
+            push.data.msg.msg_id = msg_id
+            ws._store_pushed(ws.WsEvent(cmd="push_message", seq="", msg=push), "me", "token")
+        return time.perf_counter() - started
+
+    # 回调立即返回，写库在单独的线程中按到达顺序执行
+    assert aio_session.run(push_and_edit(), timeout=5) < 0.05
+    ws._store_executor.submit(lambda: None).result(timeout=5)
+    assert [(chat_id, msg_id) for _, chat_id, msg_id in writes] == [("friend", "m1"), ("friend", "m1"), ("friend", "m2")]
+    assert all(name.startswith("WsStore") for name, _, _ in writes)